@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Costo de DB por movimiento al archivar lo aplicado en FASE 3:
+archive_and_delete_movement (INSERT + DELETE por movimiento) vs.
+archive_movements (INSERT ... SELECT + DELETE por lote).
+
+    python benchmarks/bench_archive_movements.py --movements 100000 --batch-size 200
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sync.database import DB  # noqa: E402
+
+
+def fill(db, conn, n):
+    conn.executemany(
+        """
+        INSERT INTO movements (
+            op_type, init_hash, rel_path, new_rel_path, content_hash,
+            size_bytes, last_op_time, machine_name
+        )
+        VALUES ('CREATE', ?, ?, NULL, ?, 1000, 1700000000, 'pc1')
+        """,
+        ((f"h{i:064d}", f"dir{i % 500}/file{i}.txt", f"c{i:064d}") for i in range(n)),
+    )
+    conn.commit()
+    return db.iter_movements(conn, batch_size=10_000)
+
+
+def per_row(db, conn, n, batch_size):
+    done = 0
+    for mov in fill(db, conn, n):
+        db.archive_and_delete_movement(conn, mov)
+        done += 1
+        if done % batch_size == 0:
+            conn.commit()
+    conn.commit()
+
+
+def set_based(db, conn, n, batch_size):
+    ids = []
+    for mov in fill(db, conn, n):
+        ids.append(mov["id"])
+        if len(ids) == batch_size:
+            db.archive_movements(conn, ids)
+            conn.commit()
+            ids = []
+    if ids:
+        db.archive_movements(conn, ids)
+    conn.commit()
+
+
+def run(fn, n, batch_size):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        db = DB(root, root, "bench.db")
+        conn = sqlite3.connect(str(db.pc_path))
+        conn.row_factory = sqlite3.Row
+        db.create_schema(conn)
+
+        # Solo se mide el archivado; el llenado de la tabla se descuenta aparte
+        start = time.perf_counter()
+        for _ in fill(db, conn, n):
+            pass
+        fill_time = time.perf_counter() - start
+        conn.execute("DELETE FROM movements")
+        conn.commit()
+
+        start = time.perf_counter()
+        fn(db, conn, n, batch_size)
+        elapsed = time.perf_counter() - start - fill_time
+
+        assert conn.execute("SELECT COUNT(*) FROM movements").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM movements_history").fetchone()[0] == n
+        conn.close()
+        return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movements", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    n = args.movements
+    before = run(per_row, n, args.batch_size)
+    after = run(set_based, n, args.batch_size)
+
+    print(f"{n} movimientos, lotes de {args.batch_size}")
+    print(f"por movimiento : {before:7.2f} s  {before / n * 1e6:7.1f} µs/mov")
+    print(f"por lote       : {after:7.2f} s  {after / n * 1e6:7.1f} µs/mov  x{before / after:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Costo simulado de FASE 1/3 en un disco mecánico según el orden de las copias:
+orden de hash-set (FASE 1 actual), orden por rel_path y orden de IOScheduler.
+
+Modelo: cada archivo ocupa una posición física (la del inodo, asignada en orden
+de creación, que no coincide con el orden de nombres). Leer un archivo cuesta
+un seek proporcional a la distancia desde la lectura anterior (con tope) más
+latencia rotacional y transferencia.
+
+    python benchmarks/bench_io_ordering.py --files 20000
+"""
+
+import argparse
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sync.scheduler import IOScheduler  # noqa: E402
+
+SEEK_MAX_MS = 12.0
+TRACK_TO_TRACK_MS = 0.5
+ROTATION_MS = 4.2
+MB_PER_S = 120.0
+NEAR = 4  # posiciones (MiB) que se leen sin seek (mismo cilindro)
+
+
+class SimulatedScheduler(IOScheduler):
+    """IOScheduler con los inodos del disco simulado en lugar de os.stat."""
+
+    def __init__(self, inodes):
+        super().__init__()
+        self.inodes = inodes
+
+    def _inode(self, rel_path):
+        return self.inodes[rel_path]
+
+
+def build_workload(n_files, n_dirs, seed):
+    rng = random.Random(seed)
+    ops, inodes = [], {}
+    for i in range(n_files):
+        d = rng.randrange(n_dirs)
+        rel_path = f"dir{d:04d}/file{rng.randrange(10**6):06d}_{i}.dat"
+        # Mayoría de archivos chicos, algunos grandes
+        size = rng.choice([2_000, 8_000, 40_000, 300_000]) if rng.random() < 0.99 else 20 * 1024**2
+        ops.append(
+            {
+                "op_type": "CREATE",
+                "init_hash": f"h{i}",
+                "rel_path": rel_path,
+                "new_rel_path": None,
+                "size_bytes": size,
+            }
+        )
+    # Cada carpeta se escribió en rachas: los inodos siguen la creación por carpeta,
+    # pero no el nombre del archivo
+    by_creation = sorted(ops, key=lambda op: (op["rel_path"].split("/")[0], rng.random()))
+    position = 0
+    for op in by_creation:
+        inodes[op["rel_path"]] = position
+        position += 1 + op["size_bytes"] // (1024 * 1024)
+    return ops, inodes, position
+
+
+def simulated_cost(ops, inodes, span):
+    total_ms = 0.0
+    head = 0
+    for op in ops:
+        pos = inodes[op["rel_path"]]
+        distance = abs(pos - head)
+        if distance > NEAR:
+            total_ms += TRACK_TO_TRACK_MS + SEEK_MAX_MS * (distance / span) ** 0.5 + ROTATION_MS
+        total_ms += op["size_bytes"] / (MB_PER_S * 1024**2) * 1000
+        head = pos + op["size_bytes"] // (1024 * 1024)
+    return total_ms / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=20_000)
+    parser.add_argument("--dirs", type=int, default=400)
+    parser.add_argument("--window", type=int, default=200, help="Igual a --batch-size de FASE 3")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    ops, inodes, span = build_workload(args.files, args.dirs, args.seed)
+
+    hash_order = list({op["init_hash"]: op for op in ops}.values())
+    random.Random(args.seed).shuffle(hash_order)
+    path_order = sorted(ops, key=lambda op: op["rel_path"])
+
+    scheduler = SimulatedScheduler(inodes)
+    windowed = list(scheduler.stream(path_order, window=args.window))
+    full = scheduler.order(path_order)
+
+    results = [
+        ("hash-set (FASE 1)", simulated_cost(hash_order, inodes, span)),
+        ("rel_path", simulated_cost(path_order, inodes, span)),
+        (f"IOScheduler ventana={args.window}", simulated_cost(windowed, inodes, span)),
+        ("IOScheduler completo", simulated_cost(full, inodes, span)),
+    ]
+
+    base = results[0][1]
+    print(f"{args.files} archivos en {args.dirs} carpetas")
+    for name, seconds in results:
+        print(f"{name:<28} {seconds:9.1f} s   x{base / seconds:5.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Escritura de archivos chicos en el USB: un archivo suelto por movimiento
+(UsbStorage.put → shutil.copy2) vs. empaquetado en <db>.pack (un BLOB por
+archivo, un commit por lote).
+
+    python benchmarks/bench_pack_store.py --files 20000 --size 2048 --target /media/usb/bench
+
+Para ver el efecto real hay que apuntar --target a un pendrive FAT/exFAT; en
+ext4/tmpfs la diferencia es mucho menor (el costo por archivo es bajo).
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sync.pack_store import PackStore  # noqa: E402
+from sync.storage import UsbStorage  # noqa: E402
+
+
+def make_sources(root, n, size):
+    paths = []
+    for i in range(n):
+        path = root / f"d{i % 100}" / f"f{i}.txt"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(os.urandom(size // 2).hex().encode()[:size])
+        paths.append(path)
+    return paths
+
+
+def loose(sources, target, batch_size):
+    storage = UsbStorage()
+    for src in sources:
+        storage.put(src, target / src.parent.name / src.name)
+
+
+def packed(sources, target, batch_size):
+    storage = UsbStorage(pack=PackStore(target / "metadata.db.pack"), pack_threshold=1 << 20)
+    for i, src in enumerate(sources, start=1):
+        storage.pack_small(src, target / src.parent.name / src.name, f"h{i}")
+        if i % batch_size == 0:
+            storage.flush()
+    storage.close()
+
+
+def run(fn, sources, target, batch_size):
+    if target.exists():
+        shutil.rmtree(target)
+    target.mkdir(parents=True)
+    start = time.perf_counter()
+    fn(sources, target, batch_size)
+    os.sync()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=20_000)
+    parser.add_argument("--size", type=int, default=2048)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--target", type=Path, help="Carpeta en el USB (default: temporal)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = make_sources(Path(tmp) / "src", args.files, args.size)
+        target = args.target or Path(tmp) / "usb"
+
+        before = run(loose, sources, target / "loose", args.batch_size)
+        after = run(packed, sources, target / "packed", args.batch_size)
+
+    n = args.files
+    print(f"{n} archivos de {args.size} bytes, lotes de {args.batch_size}")
+    print(f"sueltos      : {before:7.2f} s  {n / before:9.0f} archivos/s")
+    print(f"empaquetados : {after:7.2f} s  {n / after:9.0f} archivos/s  x{before / after:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Escaneo de la PC (walk_directory_metadata) con 1 hilo vs. N hilos, sobre un
+árbol ancho y con latencia simulada por carpeta (como un disco de red, donde
+cada scandir/stat es un viaje de ida y vuelta).
+
+    python benchmarks/bench_parallel_walk.py --dirs 400 --files 20 --latency-ms 2 --workers 8
+    python benchmarks/bench_parallel_walk.py --target /mnt/red/bench --latency-ms 0
+
+Con --latency-ms 0 mide el sistema de archivos real de --target.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sync import meta_util  # noqa: E402
+from sync.meta_util import walk_directory_metadata  # noqa: E402
+
+
+def make_tree(root, dirs, files):
+    for d in range(dirs):
+        sub = root / f"a{d % 20}" / f"b{d}"
+        sub.mkdir(parents=True, exist_ok=True)
+        for i in range(files):
+            (sub / f"f{i}.txt").write_bytes(b"x")
+
+
+def with_latency(latency):
+    real_scandir = os.scandir
+
+    def slow_scandir(path):
+        time.sleep(latency)
+        return real_scandir(path)
+
+    meta_util.os.scandir = slow_scandir
+
+
+def timed(root, workers):
+    start = time.perf_counter()
+    snapshot = walk_directory_metadata(root, workers)
+    return time.perf_counter() - start, snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dirs", type=int, default=400)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--target", type=Path, help="Carpeta donde generar el árbol (default: temporal)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = (args.target or Path(tmp)) / "arbol"
+        if root.exists():
+            shutil.rmtree(root)
+        make_tree(root, args.dirs, args.files)
+        if args.latency_ms:
+            with_latency(args.latency_ms / 1000)
+
+        base, expected = timed(root, 1)
+        print(f"{len(expected)} archivos, {args.dirs} carpetas, latencia {args.latency_ms} ms/carpeta")
+        print(f"1 hilo   : {base:6.2f} s")
+        for workers in args.workers:
+            elapsed, snapshot = timed(root, workers)
+            assert list(snapshot.items()) == list(expected.items())
+            print(f"{workers:2d} hilos : {elapsed:6.2f} s  x{base / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    main()
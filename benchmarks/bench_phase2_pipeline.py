@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+FASE 2 en serie (escaneo, después hash uno por uno, después DB) vs. el pipeline
+asyncio (escaneo, N hashers y escritor de DB solapados).
+
+    python benchmarks/bench_phase2_pipeline.py --files 2000 --size 262144 --hash-workers 4
+    python benchmarks/bench_phase2_pipeline.py --target /mnt/red/bench   # disco de red
+
+Con los archivos en la caché de páginas mide sobre todo el hashing en paralelo
+(hashlib libera el GIL); contra un disco frío o de red suma la latencia de stat.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sync.engine import EngineSync  # noqa: E402
+
+
+def make_tree(root, n, size):
+    for i in range(n):
+        path = root / f"d{i % 50}" / f"s{i % 7}" / f"f{i}.bin"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(os.urandom(size))
+
+
+def run(root, work, pipeline, hash_workers):
+    if work.exists():
+        shutil.rmtree(work)
+    # Maestro con una sola fila: todos los archivos son nuevos y se hashean
+    engine = EngineSync(root, work / "usb", "bench.db", pipeline=pipeline, hash_workers=hash_workers)
+    with engine.db.get_db_connection(engine.db.pc_path) as conn:
+        conn.execute(
+            "INSERT INTO master_states VALUES ('x', 'no-existe', 'x', 0, 0, 'bench')"
+        )
+        conn.commit()
+    start = time.perf_counter()
+    engine.get_movements()
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(root / ".sync", ignore_errors=True)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=256 * 1024)
+    parser.add_argument("--hash-workers", type=int, default=4)
+    parser.add_argument("--target", type=Path, help="Carpeta donde generar el árbol (default: temporal)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = (args.target or Path(tmp)) / "pc"
+        if root.exists():
+            shutil.rmtree(root)
+        make_tree(root, args.files, args.size)
+        work = Path(tmp) / "work"
+
+        serial = run(root, work, False, 1)
+        piped = run(root, work, True, args.hash_workers)
+
+    print(f"serie            : {serial:7.2f} s")
+    print(f"pipeline ({args.hash_workers} hilos): {piped:7.2f} s  x{serial / piped:.2f}")
+
+
+if __name__ == "__main__":
+    main()
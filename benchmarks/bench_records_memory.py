@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Mide memoria pico de Fase 1/2 (lectura de master_states + índices) con filas
+como dict vs. StateRecord.
+
+    python benchmarks/bench_records_memory.py --rows 1000000
+"""
+
+import argparse
+import hashlib
+import sqlite3
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sync.records import StateRecord  # noqa: E402
+
+
+def build_db(n):
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        "CREATE TABLE master_states (init_hash, rel_path, content_hash, "
+        "size_bytes, last_op_time, machine_name)"
+    )
+    rows = (
+        (
+            h := hashlib.sha256(str(i).encode()).hexdigest(),
+            f"dir{i % 1000}/sub{i % 7}/file_{i}.txt",
+            h if i % 10 else h[::-1],
+            i * 10,
+            1_700_000_000 + i,
+            "machine-01",
+        )
+        for i in range(n)
+    )
+    conn.executemany("INSERT INTO master_states VALUES (?, ?, ?, ?, ?, ?)", rows)
+    return conn
+
+
+def measure(label, build, n):
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = build()
+    # Mismos índices que arma el engine en Fase 1/2
+    paths_index = {m["rel_path"]: m for m in rows}
+    hash_index = {m["content_hash"]: m for m in rows}
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows, paths_index, hash_index
+    print(f"{label:<8} peak={peak / 1e6:8.1f} MB  {peak / n:6.0f} B/fila  {elapsed:.2f}s")
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    conn = build_db(args.rows)
+    query = "SELECT * FROM master_states"
+
+    dict_peak = measure("dict", lambda: [dict(r) for r in conn.execute(query)], args.rows)
+    rec_peak = measure(
+        "record",
+        lambda: [StateRecord.from_row(r) for r in conn.execute(query)],
+        args.rows,
+    )
+    print(f"reducción: x{dict_peak / rec_peak:.2f}")
+
+
+if __name__ == "__main__":
+    main()
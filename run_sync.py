@@ -5,7 +5,6 @@ Este script permite ejecutar main.py con tus argumentos actuales de manera segur
 """
 
 import sys
-import subprocess
 from pathlib import Path
 import argparse
 
@@ -16,7 +15,11 @@ parser = argparse.ArgumentParser(description="Lanzador multiplataforma para sync
 
 parser.add_argument("--pc-root", required=True, type=Path, help="Directorio raíz local")
 parser.add_argument(
-    "--usb-root", required=True, type=Path, help="Directorio raíz de archivos en el USB"
+    "--usb-root",
+    required=True,
+    type=Path,
+    action="append",
+    help="Directorio raíz de archivos en el USB (repetible para varios destinos)",
 )
 parser.add_argument(
     "--db-name", default="metadata.db", type=str, help="Nombre DB SQL Maestro"
@@ -30,25 +33,18 @@ parser.add_argument(
 args, extra = parser.parse_known_args()
 
 # ====================================
-# Construir comando para main.py
+# Construir argumentos para main.py
 # ====================================
-python_cmd = sys.executable  # usa el mismo intérprete que este script
-
 # Verificar que existe el directorio sync
 sync_dir = Path(__file__).parent / "sync"
 if not sync_dir.exists():
     print(f"Error: no se encontró {sync_dir}")
     sys.exit(1)
 
-# Ejecutar como módulo para resolver problemas de importación
-cmd = [
-    python_cmd,
-    "-m",
-    "sync.main",
-    "--pc-root",
-    str(args.pc_root),
-    "--usb-root",
-    str(args.usb_root),
+argv = ["--pc-root", str(args.pc_root)]
+for usb_root in args.usb_root:
+    argv += ["--usb-root", str(usb_root)]
+argv += [
     "--db-name",
     args.db_name,
     "--log",
@@ -56,21 +52,22 @@ cmd = [
 ]
 
 if args.dry_run:
-    cmd.append("--dry-run")
+    argv.append("--dry-run")
 
 # Añadir cualquier argumento extra que el usuario pase
-cmd += extra
+argv += extra
 
 # ====================================
-# Ejecutar main.py
+# Ejecutar main.py en este mismo proceso
 # ====================================
-# Añadir el directorio padre al PYTHONPATH para resolver importaciones
-env = dict(subprocess.os.environ)
-env["PYTHONPATH"] = str(Path(__file__).parent) + ":" + env.get("PYTHONPATH", "")
+# Añadir el directorio del proyecto al sys.path para resolver importaciones,
+# sin lanzar un segundo intérprete
+sys.path.insert(0, str(Path(__file__).parent))
 
-print(f"Ejecutando comando:\n{' '.join(cmd)}\n")
+print(f"Ejecutando sync.main:\n{' '.join(argv)}\n")
 
-result = subprocess.run(cmd, env=env)
+from sync.main import main  # noqa: E402
 
-# Retornar mismo código de salida que main.py
-sys.exit(result.returncode)
+# main() termina con sys.exit(1) si falla; si retorna, el código de salida es 0
+main(argv)
+sys.exit(0)
@@ -0,0 +1,25 @@
+"""
+Paquete sync. Los símbolos públicos se importan bajo demanda (PEP 562) para que
+`import sync` no arrastre sqlite3, hashlib, shutil, etc. en el arranque.
+"""
+
+_LAZY_ATTRS = {
+    "EngineSync": "sync.engine",
+    "DB": "sync.database",
+    "FSOps": "sync.fs_util",
+    "dry_run": "sync.dry_run",
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'sync' has no attribute {name!r}")
+
+    import importlib
+
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
@@ -7,20 +7,32 @@ Idempotencia
 Saber qué hay que hacer, no cómo
 """
 
+import os
 import sqlite3
 from pathlib import Path
 import time
 import logging
+from sync.domain import MovementCoalescer, dir_range, is_dir_op
 from sync.fs_util import FSOps
+from sync.records import MovementRecord, StateRecord, TombstoneRecord
 
 
 class DB:
-    def __init__(self, pc_root: Path, usb_root: Path, db_name: str):
+    def __init__(
+        self, pc_root: Path, usb_root: Path, db_name: str, pc_db_name: str | None = None
+    ):
         self.pc_root = pc_root.resolve()
         self.usb_root = usb_root.resolve()
-        self.pc_path = self.pc_root / ".sync" / db_name
-        self.temp_path = self.pc_root / ".sync" / f"{db_name}.tmp"
+        # Con varios USB, cada destino tiene su propia DB (y checkpoint) en la PC
+        pc_db_name = pc_db_name or db_name
+        self.pc_path = self.pc_root / ".sync" / pc_db_name
+        self.temp_path = self.pc_root / ".sync" / f"{pc_db_name}.tmp"
         self.usb_path = self.usb_root / db_name
+        # Copia local de la DB del USB: se consulta y se escribe acá, y se publica
+        # al USB de una sola vez al final (ver usb_connection / publish_usb)
+        self.usb_work_path = self.pc_root / ".sync" / f"{pc_db_name}.usb"
+        self._usb_checked_out = False
+        self._usb_change_counter = None
         self.logger = logging.getLogger(__name__)
 
         # Asegurar carpeta oculta en PC
@@ -53,6 +65,31 @@ class DB:
             self.logger.exception("Error SQLite al crear esquema")
             raise
 
+    # <======================================= IDENTIDAD DEL DESTINO =======================================>
+    def get_target_id(self, conn) -> str:
+        """Id estable del USB, guardado en su propia DB (no depende del punto de montaje)."""
+        row = conn.execute("SELECT value FROM sync_meta WHERE key = 'target_id'").fetchone()
+        if row:
+            return row["value"]
+
+        import uuid
+
+        target_id = uuid.uuid4().hex[:12]
+        conn.execute(
+            "INSERT INTO sync_meta (key, value) VALUES ('target_id', ?)", (target_id,)
+        )
+        conn.commit()
+        return target_id
+
+    def get_meta(self, conn, key: str, default=None):
+        row = conn.execute("SELECT value FROM sync_meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, conn, key: str, value):
+        conn.execute(
+            "INSERT OR REPLACE INTO sync_meta (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
     # <======================================= VERIFICA TABLA VACIA =======================================>
     def table_is_empty(self, conn, table):
         cur = conn.execute(f"SELECT 1 FROM {table} LIMIT 1")
@@ -83,9 +120,8 @@ class DB:
             ORDER BY rel_path ASC
             """
         )
-        rows = cursor.fetchall()
-        self.logger.debug("read_states → %d registros", len(rows))
-        master_states = [dict(row) for row in rows]
+        master_states = [StateRecord.from_row(row) for row in cursor]
+        self.logger.debug("read_states → %d registros", len(master_states))
 
         return master_states
 
@@ -107,28 +143,82 @@ class DB:
             """
         )
 
-        rows = cursor.fetchall()
-        self.logger.debug("read_movements → %d registros", len(rows))
-        movements = [dict(row) for row in rows]
+        movements = [MovementRecord.from_row(row) for row in cursor]
+        self.logger.debug("read_movements → %d registros", len(movements))
 
         return movements
 
-    def read_tombstones(self, conn):
+    def iter_movements(self, conn, batch_size: int = 500):
+        """
+        Recorre movements en orden de id (orden de detección) sin cargar la tabla
+        completa: pagina por id con LIMIT, así se puede archivar/borrar lo ya
+        aplicado mientras se itera y la memoria queda acotada a un lote.
+        """
+        last_id = 0
+        total = 0
+        while True:
+            rows = conn.execute(
+                """
+                SELECT
+                    id,
+                    op_type,
+                    init_hash,
+                    rel_path,
+                    new_rel_path,
+                    content_hash,
+                    size_bytes,
+                    last_op_time,
+                    machine_name
+                FROM movements
+                WHERE id > ?
+                ORDER BY id ASC
+                LIMIT ?
+                """,
+                (last_id, batch_size),
+            ).fetchall()
+
+            if not rows:
+                break
+
+            for row in rows:
+                total += 1
+                yield MovementRecord.from_row(row)
+
+            last_id = rows[-1]["id"]
+
+        self.logger.debug("iter_movements → %d registros", total)
+
+    def find_paths_by_content(self, conn, content_hash: str) -> list:
+        """Rutas del maestro que hoy tienen ese contenido (candidatas a dedup)."""
         cursor = conn.execute(
-            """
+            "SELECT rel_path FROM master_states WHERE content_hash = ? ORDER BY rel_path",
+            (content_hash,),
+        )
+        return [row["rel_path"] for row in cursor]
+
+    def read_tombstones(self, conn, since=None):
+        """
+        Tombstones del maestro. Con `since` (un seq), solo los que llegaron
+        después de esa marca (lo que esta PC todavía no procesó).
+        """
+        query = """
             SELECT
                 init_hash,
                 content_hash,
                 deleted_at,
-                machine_name
+                machine_name,
+                seq
             FROM tombstones
+            {where}
             ORDER BY init_hash ASC
             """
-        )
+        if since is None:
+            cursor = conn.execute(query.format(where=""))
+        else:
+            cursor = conn.execute(query.format(where="WHERE seq > ?"), (since,))
 
-        rows = cursor.fetchall()
-        self.logger.debug("read_tombstones → %d registros", len(rows))
-        tombstones = [dict(row) for row in rows]
+        tombstones = [TombstoneRecord.from_row(row) for row in cursor]
+        self.logger.debug("read_tombstones → %d registros | since=%s", len(tombstones), since)
 
         return tombstones
 
@@ -136,14 +226,17 @@ class DB:
     def update_state(self, conn, mov: dict):
         op = mov["op_type"]
 
-        self.logger.info(
+        self.logger.debug(
             "Aplicando %s | path=%s | init_hash=%s",
             op,
             mov.get("rel_path"),
             mov.get("init_hash"),
         )
 
-        if op == "CREATE":
+        if is_dir_op(mov):
+            self._update_state_dir(conn, mov)
+
+        elif op == "CREATE":
             conn.execute(
                 """
                 INSERT INTO master_states (
@@ -230,6 +323,55 @@ class DB:
         else:
             self.logger.warning("Operación desconocida: %s", op)
 
+    def init_hashes_under(self, conn, rel_dir: str) -> list:
+        """init_hash de todos los archivos del maestro bajo la carpeta `rel_dir` ("x/")."""
+        low, high = dir_range(rel_dir)
+        cursor = conn.execute(
+            "SELECT init_hash FROM master_states WHERE rel_path >= ? AND rel_path < ?",
+            (low, high),
+        )
+        return [row[0] for row in cursor]
+
+    def _update_state_dir(self, conn, mov: dict):
+        """MOVE/DELETE de carpeta: una sentencia por rango sobre todas las rutas bajo ella."""
+        low, high = dir_range(mov["rel_path"])
+
+        if mov["op_type"] == "MOVE":
+            cursor = conn.execute(
+                """
+                UPDATE master_states
+                SET rel_path = ? || substr(rel_path, ?)
+                WHERE rel_path >= ? AND rel_path < ?
+                """,
+                (mov["new_rel_path"], len(mov["rel_path"]) + 1, low, high),
+            )
+            self.logger.debug(
+                "MOVE carpeta %s → %s | %d filas", mov["rel_path"], mov["new_rel_path"], cursor.rowcount
+            )
+
+        elif mov["op_type"] == "DELETE":
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO tombstones (
+                    init_hash,
+                    content_hash,
+                    deleted_at,
+                    machine_name
+                )
+                SELECT init_hash, content_hash, ?, ?
+                FROM master_states
+                WHERE rel_path >= ? AND rel_path < ?
+                """,
+                (mov["last_op_time"], mov["machine_name"], low, high),
+            )
+            cursor = conn.execute(
+                "DELETE FROM master_states WHERE rel_path >= ? AND rel_path < ?", (low, high)
+            )
+            self.logger.debug("DELETE carpeta %s | %d filas", mov["rel_path"], cursor.rowcount)
+
+        else:
+            raise ValueError(f"Operación de carpeta no soportada: {mov['op_type']}")
+
     def upsert_movement(self, conn, mov: dict):
         # Si se proporciona id, hacer INSERT OR REPLACE, si no, dejar que AUTOINCREMENT lo genere
         if "id" in mov and mov["id"] is not None:
@@ -300,9 +442,347 @@ class DB:
                 mov["init_hash"],
             )
 
+    # <======================================= COMPACTA =======================================>
+    def compact_movements(self, conn):
+        """
+        Pliega las cadenas de movements con el mismo init_hash (CREATE+MODIFY→CREATE,
+        CREATE+DELETE→nada, MOVE+MOVE→MOVE, ...). Solo se cargan en memoria las
+        cadenas de más de un movimiento. Devuelve (ops_ahorradas, bytes_ahorrados).
+        """
+        chains = [
+            row[0]
+            for row in conn.execute(
+                """
+                SELECT init_hash
+                FROM movements
+                WHERE init_hash IS NOT NULL
+                GROUP BY init_hash
+                HAVING COUNT(*) > 1
+                """
+            )
+        ]
+
+        saved_ops = 0
+        saved_bytes = 0
+
+        for init_hash in chains:
+            chain = [
+                MovementRecord.from_row(row)
+                for row in conn.execute(
+                    """
+                    SELECT
+                        id,
+                        op_type,
+                        init_hash,
+                        rel_path,
+                        new_rel_path,
+                        content_hash,
+                        size_bytes,
+                        last_op_time,
+                        machine_name
+                    FROM movements
+                    WHERE init_hash = ?
+                    ORDER BY id ASC
+                    """,
+                    (init_hash,),
+                )
+            ]
+
+            folded, ops, nbytes = MovementCoalescer.coalesce(chain)
+            if not ops:
+                continue
+
+            conn.executemany(
+                "DELETE FROM movements WHERE id = ?", [(m["id"],) for m in chain]
+            )
+            for mov in folded:
+                self.upsert_movement(conn, mov)
+
+            saved_ops += ops
+            saved_bytes += nbytes
+
+        self.logger.debug(
+            "compact_movements → cadenas=%d | ops ahorradas=%d | bytes ahorrados=%d",
+            len(chains),
+            saved_ops,
+            saved_bytes,
+        )
+        return saved_ops, saved_bytes
+
+    # <======================================= TOMBSTONES =======================================>
+    def merge_tombstones(self, conn, tombstones):
+        """
+        Agrega/actualiza tombstones sin reescribir la tabla completa. Cada DB
+        numera (seq) lo que recibe: el seq del USB no se copia.
+        """
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO tombstones (
+                init_hash,
+                content_hash,
+                deleted_at,
+                machine_name
+            )
+            VALUES (?, ?, ?, ?)
+            """,
+            (
+                (t["init_hash"], t["content_hash"], t["deleted_at"], t["machine_name"])
+                for t in tombstones
+            ),
+        )
+
+    def ack_tombstones(self, conn, machine_name: str, last_seen):
+        """
+        Registra hasta qué seq procesó `machine_name`. Nunca retrocede y,
+        si la marca no avanza, no reescribe la fila (la DB del USB no cambia).
+        """
+        conn.execute(
+            """
+            INSERT INTO tombstone_acks (machine_name, last_seen, acked_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(machine_name) DO UPDATE SET
+                last_seen = excluded.last_seen,
+                acked_at  = excluded.acked_at
+            WHERE excluded.last_seen > tombstone_acks.last_seen
+            """,
+            (machine_name, last_seen, int(time.time())),
+        )
+
+    def gc_tombstones(self, conn, retention_seconds: float, now: float | None = None) -> int:
+        """
+        Borra los tombstones que ya procesaron todas las máquinas conocidas y los
+        más viejos que el horizonte de retención. Una máquina que no sincroniza
+        hace más tiempo que el horizonte debe reconciliar en lugar de confiar
+        en los tombstones. Devuelve la cantidad borrada.
+        """
+        now = time.time() if now is None else now
+        cursor = conn.execute(
+            """
+            DELETE FROM tombstones
+            WHERE deleted_at < ?
+               OR seq <= (SELECT MIN(last_seen) FROM tombstone_acks)
+            """,
+            (now - retention_seconds,),
+        )
+        if cursor.rowcount:
+            self.logger.info("Tombstones compactados: %d", cursor.rowcount)
+        return cursor.rowcount
+
+    # <======================================= CHECKPOINTS =======================================>
+    def read_checkpoint(self, conn, name: str):
+        return conn.execute(
+            """
+            SELECT name, last_movement_id, applied, updated_at
+            FROM sync_checkpoints
+            WHERE name = ?
+            """,
+            (name,),
+        ).fetchone()
+
+    def save_checkpoint(self, conn, name: str, last_movement_id, applied: int):
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO sync_checkpoints (
+                name,
+                last_movement_id,
+                applied,
+                updated_at
+            )
+            VALUES (?, ?, ?, ?)
+            """,
+            (name, last_movement_id, applied, int(time.time())),
+        )
+
+    def clear_checkpoint(self, conn, name: str):
+        conn.execute("DELETE FROM sync_checkpoints WHERE name = ?", (name,))
+
+    # <======================================= STAGING =======================================>
+    def stage_movements(self, conn, staging_path: Path) -> int:
+        """
+        Pasa a esta DB los movimientos registrados en `staging_path` (la DB
+        temporal donde escribe la FASE 2) con un INSERT ... SELECT y un DELETE en
+        la misma transacción: si se corta, quedan de un lado o del otro, nunca en
+        ambos. Conservan el orden de detección. Devuelve la cantidad pasada.
+        """
+        if not staging_path.exists():
+            return 0
+
+        conn.commit()  # ATTACH no puede ir dentro de una transacción
+        conn.execute("ATTACH DATABASE ? AS staging", (str(staging_path),))
+        try:
+            conn.execute("BEGIN")
+            staged = conn.execute(
+                """
+                INSERT INTO main.movements (
+                    op_type,
+                    init_hash,
+                    rel_path,
+                    new_rel_path,
+                    content_hash,
+                    size_bytes,
+                    last_op_time,
+                    machine_name
+                )
+                SELECT
+                    op_type,
+                    init_hash,
+                    rel_path,
+                    new_rel_path,
+                    content_hash,
+                    size_bytes,
+                    last_op_time,
+                    machine_name
+                FROM staging.movements
+                ORDER BY id
+                """
+            ).rowcount
+            conn.execute("DELETE FROM staging.movements")
+            # Las versiones anteriores copiaban acá todo el maestro en cada FASE 3
+            conn.execute("DELETE FROM staging.master_states")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE staging")
+
+        self.logger.debug("Movimientos pasados desde staging: %d", staged)
+        return staged
+
+    # <======================================= COPIA LOCAL DEL USB =======================================>
+    # En FAT/exFAT cada commit de SQLite sobre el USB es un journal creado,
+    # escrito, sincronizado y borrado, y las consultas leen páginas del pendrive.
+    # La DB del USB se copia una vez a la PC, se trabaja sobre la copia y, si
+    # cambió, se publica con VACUUM INTO a un temporal del USB + os.replace: una
+    # escritura secuencial por ejecución y nunca una DB a medio escribir.
+
+    def usb_connection(self):
+        """Conexión a la copia local de la DB del USB (la toma en el primer uso)."""
+        if not self._usb_checked_out:
+            self.checkout_usb()
+        return self.get_db_connection(self.usb_work_path)
+
+    def checkout_usb(self):
+        """Copia la DB del USB a usb_work_path con la API de backup de SQLite."""
+        self.usb_work_path.unlink(missing_ok=True)
+        if self.usb_path.exists():
+            # Conexión de escritura: si quedó un journal de una corrida cortada,
+            # SQLite lo recupera antes de copiar
+            src = sqlite3.connect(str(self.usb_path))
+            dst = sqlite3.connect(str(self.usb_work_path))
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+                src.close()
+            self.logger.info("DB del USB copiada a %s", self.usb_work_path)
+
+        self._usb_checked_out = True
+        self._usb_change_counter = self._change_counter(self.usb_work_path)
+
+    def publish_usb(self) -> bool:
+        """
+        Publica la copia local en el USB si cambió desde checkout_usb. El archivo
+        del USB se reemplaza entero de forma atómica: quien lo lea ve la versión
+        anterior o la nueva. Devuelve True si publicó.
+        """
+        if not self._usb_checked_out:
+            return False
+        counter = self._change_counter(self.usb_work_path)
+        if counter == self._usb_change_counter:
+            self.logger.debug("DB del USB sin cambios: no se publica")
+            return False
+
+        tmp = self.usb_path.with_name(self.usb_path.name + ".partial")
+        tmp.unlink(missing_ok=True)
+        conn = sqlite3.connect(str(self.usb_work_path))
+        try:
+            conn.execute("VACUUM INTO ?", (str(tmp),))
+        finally:
+            conn.close()
+
+        try:
+            with open(tmp, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, self.usb_path)
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            raise
+
+        self._usb_change_counter = counter
+        self.logger.info("DB publicada en el USB: %s", self.usb_path)
+        return True
+
+    @staticmethod
+    def _change_counter(db_path: Path):
+        """
+        Contador de cambios del encabezado SQLite (bytes 24-27): lo incrementa
+        cada transacción que modifica el archivo (journal clásico, no WAL).
+        """
+        try:
+            with open(db_path, "rb") as f:
+                header = f.read(28)
+        except FileNotFoundError:
+            return None
+        return header[24:28] if len(header) == 28 else None
+
     # <======================================= ARCHIVA =======================================>
+    # Límite conservador de parámetros por sentencia (SQLITE_MAX_VARIABLE_NUMBER
+    # era 999 antes de SQLite 3.32)
+    ARCHIVE_CHUNK = 900
+
+    def archive_movements(self, conn, ids, applied_time: int | None = None) -> int:
+        """
+        Mueve a movements_history los movimientos `ids` con un INSERT ... SELECT y
+        un DELETE por bloque. Corre dentro de la transacción del llamador.
+        Devuelve la cantidad archivada.
+        """
+        applied_time = int(time.time()) if applied_time is None else applied_time
+        ids = list(ids)
+
+        archived = 0
+        for start in range(0, len(ids), self.ARCHIVE_CHUNK):
+            chunk = ids[start : start + self.ARCHIVE_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            conn.execute(
+                f"""
+                INSERT INTO movements_history (
+                    id,
+                    op_type,
+                    init_hash,
+                    rel_path,
+                    new_rel_path,
+                    content_hash,
+                    size_bytes,
+                    last_op_time,
+                    machine_name,
+                    applied_time
+                )
+                SELECT
+                    id,
+                    op_type,
+                    init_hash,
+                    rel_path,
+                    new_rel_path,
+                    content_hash,
+                    size_bytes,
+                    last_op_time,
+                    machine_name,
+                    ?
+                FROM movements
+                WHERE id IN ({marks})
+                """,
+                (applied_time, *chunk),
+            )
+            archived += conn.execute(
+                f"DELETE FROM movements WHERE id IN ({marks})", chunk
+            ).rowcount
+
+        self.logger.debug("Archivados %d movements", archived)
+        return archived
+
     def archive_and_delete_movement(self, conn, mov: dict):
-        self.logger.info("Archivando movement id=%s | op=%s", mov["id"], mov["op_type"])
+        self.logger.debug("Archivando movement id=%s | op=%s", mov["id"], mov["op_type"])
 
         conn.execute(
             """
@@ -1,13 +1,44 @@
+import hashlib
 import logging
+from collections import Counter, defaultdict
 
 logger = logging.getLogger(__name__)
 
+# Un rel_path terminado en "/" es una operación sobre una carpeta completa
+DIR_SUFFIX = "/"
+
+
+def is_dir_op(mov) -> bool:
+    return bool(mov["rel_path"]) and mov["rel_path"].endswith(DIR_SUFFIX)
+
+
+def dir_range(prefix: str):
+    """
+    Rango [desde, hasta) que cubre toda ruta bajo `prefix` ("a/b/"): '0' es el
+    carácter siguiente a '/', así la consulta usa el índice (a diferencia de LIKE).
+    """
+    return prefix, prefix[:-1] + "0"
+
 
 class MovementRules:
+    @staticmethod
+    def _has_prefix(paths, prefix):
+        return any(p.startswith(prefix) for p in paths)
+
     @staticmethod
     def can_apply(mov: dict, current_state_in_master: set):
         op = mov["op_type"]
 
+        if is_dir_op(mov):
+            has = MovementRules._has_prefix
+            if op == "MOVE":
+                return has(current_state_in_master, mov["rel_path"]) and not has(
+                    current_state_in_master, mov["new_rel_path"]
+                )
+            if op == "DELETE":
+                return has(current_state_in_master, mov["rel_path"])
+            return False
+
         logger.debug(
             "Evaluando movimiento: op=%s rel=%s new_rel=%s",
             op,
@@ -35,35 +66,280 @@ class MovementRules:
         return False
 
 
+class MovementCoalescer:
+    """
+    Pliega cadenas de movimientos del mismo init_hash en el mínimo equivalente
+    antes de la FASE 3, para no copiar los mismos bytes varias veces ni copiar
+    un archivo que después se borra.
+    """
+
+    COPY_OPS = {"CREATE", "MODIFY"}
+
+    @staticmethod
+    def fold_pair(prev: dict, nxt: dict):
+        """
+        Devuelve la lista de movimientos equivalente a prev seguido de nxt,
+        o None si no se pueden plegar. El resultado conserva el id de prev
+        para no adelantar ni atrasar la operación respecto del resto.
+        """
+        a, b = prev["op_type"], nxt["op_type"]
+
+        def merged(op, **overrides):
+            mov = dict(nxt)
+            mov["id"] = prev.get("id")
+            mov["op_type"] = op
+            mov.update(overrides)
+            return mov
+
+        # La segunda operación parte de donde dejó la primera
+        prev_end = prev["new_rel_path"] if a == "MOVE" else prev["rel_path"]
+        chained = nxt["rel_path"] == prev_end
+
+        if a == "CREATE":
+            if b == "MODIFY" and chained:
+                return [merged("CREATE", rel_path=prev["rel_path"], new_rel_path=None)]
+            if b == "MOVE" and chained:
+                return [merged("CREATE", rel_path=nxt["new_rel_path"], new_rel_path=None)]
+            if b == "DELETE" and chained:
+                return []
+            if b == "CREATE" and nxt["rel_path"] == prev["rel_path"]:
+                return [merged("CREATE")]
+
+        elif a == "MODIFY":
+            if b == "MODIFY" and chained:
+                return [merged("MODIFY")]
+            if b == "DELETE" and chained:
+                return [merged("DELETE")]
+
+        elif a == "MOVE":
+            if b == "MOVE" and chained:
+                if prev["rel_path"] == nxt["new_rel_path"]:
+                    return []
+                return [merged("MOVE", rel_path=prev["rel_path"])]
+            if b == "MOVE" and nxt["rel_path"] == prev["rel_path"]:
+                # Misma entrada del maestro detectada otra vez con otro destino
+                return [merged("MOVE")]
+            if b == "DELETE" and (chained or nxt["rel_path"] == prev["rel_path"]):
+                return [merged("DELETE", rel_path=prev["rel_path"])]
+
+        elif a == "DELETE":
+            if b == "DELETE" and nxt["rel_path"] == prev["rel_path"]:
+                return [merged("DELETE")]
+
+        return None
+
+    @staticmethod
+    def coalesce(chain):
+        """
+        Pliega una cadena ordenada por id. Devuelve (movimientos, ops_ahorradas,
+        bytes_ahorrados); los bytes son los de copias que ya no se harán.
+        """
+        result = []
+        saved_bytes = 0
+
+        for mov in chain:
+            folded = MovementCoalescer.fold_pair(result[-1], mov) if result else None
+            if folded is None:
+                result.append(mov)
+                continue
+
+            prev = result.pop()
+            copies_before = [m for m in (prev, mov) if m["op_type"] in MovementCoalescer.COPY_OPS]
+            copies_after = [m for m in folded if m["op_type"] in MovementCoalescer.COPY_OPS]
+            saved_bytes += sum(m["size_bytes"] or 0 for m in copies_before)
+            saved_bytes -= sum(m["size_bytes"] or 0 for m in copies_after)
+            result.extend(folded)
+
+            logger.debug(
+                "Coalesce | %s + %s → %s | init_hash=%s",
+                prev["op_type"],
+                mov["op_type"],
+                [m["op_type"] for m in folded] or "nada",
+                mov["init_hash"],
+            )
+
+        return result, len(chain) - len(result), saved_bytes
+
+
+class DirectoryCollapser:
+    """
+    Reemplaza los MOVE/DELETE por archivo de una carpeta completa por una sola
+    operación de carpeta (rel_path terminado en "/"): un rename/rmtree en el USB
+    y un UPDATE/DELETE por rango en la DB, en lugar de uno por archivo.
+    """
+
+    MIN_FILES = 2
+
+    @staticmethod
+    def _parents(rel_path):
+        """'a/b/c.txt' → ['a/', 'a/b/']"""
+        parts = rel_path.split("/")[:-1]
+        return ["/".join(parts[: i + 1]) + DIR_SUFFIX for i in range(len(parts))]
+
+    @staticmethod
+    def _rename_candidates(old, new):
+        """Pares (carpeta origen, carpeta destino) que explican old → new, de mayor a menor."""
+        o, n = old.split("/"), new.split("/")
+        k = 0
+        while k < min(len(o), len(n)) and o[-1 - k] == n[-1 - k]:
+            k += 1
+        for common in range(k, 0, -1):
+            old_dir, new_dir = "/".join(o[:-common]), "/".join(n[:-common])
+            if old_dir and new_dir:
+                yield old_dir + DIR_SUFFIX, new_dir + DIR_SUFFIX
+
+    @staticmethod
+    def _dir_op(op, members, rel_path, new_rel_path=None):
+        key = f"dir:{op}:{rel_path}:{new_rel_path}".encode("utf-8")
+        return {
+            "op_type": op,
+            "init_hash": hashlib.sha256(key).hexdigest(),
+            "rel_path": rel_path,
+            "new_rel_path": new_rel_path,
+            "content_hash": None,
+            "size_bytes": 0,
+            "last_op_time": max(m["last_op_time"] for m in members),
+            "machine_name": members[0]["machine_name"],
+        }
+
+    @staticmethod
+    def _topmost(candidates):
+        chosen = []
+        for prefix in sorted(candidates, key=len):
+            if not any(prefix.startswith(c) for c in chosen):
+                chosen.append(prefix)
+        return chosen
+
+    @staticmethod
+    def collapse(movements, master_paths, tree_paths, min_files=None):
+        """
+        Devuelve (movimientos, ops_ahorradas). Una carpeta se colapsa si todos sus
+        archivos del maestro se mueven (a la misma carpeta destino, que no existe
+        en el maestro) o se borran, y ya no queda nada bajo ella en la PC. Las
+        operaciones de carpeta van primero, antes de cualquier CREATE/MOVE que
+        pueda crear la carpeta destino.
+        """
+        min_files = min_files or DirectoryCollapser.MIN_FILES
+        parents = DirectoryCollapser._parents
+
+        master_count = Counter(d for p in master_paths for d in parents(p))
+        tree_dirs = {d for p in tree_paths for d in parents(p)}
+
+        def vacated(prefix, count):
+            return (
+                count >= min_files
+                and count == master_count[prefix]
+                and prefix not in tree_dirs
+            )
+
+        moves = [m for m in movements if m["op_type"] == "MOVE" and not is_dir_op(m)]
+        deletes = [m for m in movements if m["op_type"] == "DELETE" and not is_dir_op(m)]
+
+        # ---------- carpetas renombradas ----------
+        pair_count = Counter()
+        for m in moves:
+            pair_count.update(
+                DirectoryCollapser._rename_candidates(m["rel_path"], m["new_rel_path"])
+            )
+        renames = {}
+        for (old_dir, new_dir), count in pair_count.items():
+            if (
+                vacated(old_dir, count)
+                and master_count[new_dir] == 0
+                and not old_dir.startswith(new_dir)
+                and not new_dir.startswith(old_dir)
+            ):
+                renames.setdefault(old_dir, new_dir)
+        renames = {d: renames[d] for d in DirectoryCollapser._topmost(renames)}
+
+        # ---------- carpetas borradas ----------
+        delete_count = Counter(d for m in deletes for d in parents(m["rel_path"]))
+        removed = DirectoryCollapser._topmost(
+            d for d, count in delete_count.items() if vacated(d, count)
+        )
+
+        if not renames and not removed:
+            return movements, 0
+
+        move_ids, delete_ids = {id(m) for m in moves}, {id(m) for m in deletes}
+        dir_ops, members = [], defaultdict(list)
+        result = []
+        for m in movements:
+            target = None
+            if id(m) in move_ids:
+                target = next(
+                    (
+                        ("MOVE", old_dir)
+                        for old_dir, new_dir in renames.items()
+                        if m["rel_path"].startswith(old_dir)
+                        and m["new_rel_path"] == new_dir + m["rel_path"][len(old_dir) :]
+                    ),
+                    None,
+                )
+            elif id(m) in delete_ids:
+                target = next(
+                    (("DELETE", d) for d in removed if m["rel_path"].startswith(d)), None
+                )
+
+            if target is None:
+                result.append(m)
+            else:
+                members[target].append(m)
+
+        for (op, prefix), group in members.items():
+            new_prefix = renames[prefix] if op == "MOVE" else None
+            dir_ops.append(DirectoryCollapser._dir_op(op, group, prefix, new_prefix))
+            logger.debug(
+                "Carpeta | %s %s%s | %d archivos",
+                op,
+                prefix,
+                f" → {new_prefix}" if new_prefix else "",
+                len(group),
+            )
+
+        saved = sum(len(g) for g in members.values()) - len(dir_ops)
+        return dir_ops + result, saved
+
+
 class CurrentState:
+    """
+    Rutas presentes en el maestro mientras se aplican los movimientos de la FASE 3.
+    Se actualiza con cada movimiento confirmado, así un CREATE sobre una ruta que
+    liberó un MOVE (o un DELETE) anterior se valida contra el estado real.
+    """
+
     def __init__(self, paths):
         self._paths = set(paths)
 
     def exists(self, rel_path):
         return rel_path in self._paths
 
-
-""" 
-    # Transformar en una estructura auxiliar para validar el cambio FS, para confirmar modif de DB
     def apply(self, mov: dict):
         op = mov["op_type"]
 
         logger.debug("Aplicando movimiento a estado actual: %s", mov)
 
+        if is_dir_op(mov):
+            prefix = mov["rel_path"]
+            inside = {p for p in self._paths if p.startswith(prefix)}
+            self._paths -= inside
+            if op == "MOVE":
+                new_prefix = mov["new_rel_path"]
+                self._paths |= {new_prefix + p[len(prefix):] for p in inside}
+            return
+
         if op == "CREATE":
-            self._paths.add(mov["new_rel_path"])
+            self._paths.add(mov["rel_path"])
 
         elif op == "MODIFY":
             pass
 
         elif op == "MOVE":
-            self._paths.remove(mov["rel_path"])
+            self._paths.discard(mov["rel_path"])
             self._paths.add(mov["new_rel_path"])
 
         elif op == "DELETE":
-            self._paths.remove(mov["rel_path"])
+            self._paths.discard(mov["rel_path"])
 
         else:
             logger.warning("Movimiento con op desconocida: %s", op)
-
- """
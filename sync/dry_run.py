@@ -1,138 +1,110 @@
 import logging
-from pathlib import Path
 from collections import Counter
 from sync.engine import EngineSync
-from sync.database import DB
-
-
-def dry_run(engine: EngineSync, log_fn=logging.info):
+from sync.domain import CurrentState, MovementRules
+from sync.meta_util import walk_directory_metadata
+from sync.plan import (
+    ADOPT_PC,
+    COPY_TO_PC,
+    DELETE_PC,
+    MODE_INITIAL_COPY,
+    MOVE_PC,
+    SyncPlan,
+    UPDATE_PC,
+)
+
+
+def dry_run(engine: EngineSync, log_fn=logging.info, plan: SyncPlan | None = None):
     """
     Simula el proceso de sincronización sin aplicar cambios reales.
-    Usa el engine existente para detectar cambios sin ejecutar operaciones FS.
+    Renderiza el SyncPlan del engine (el mismo que luego puede ejecutar
+    engine.apply), así los MODIFY se detectan por hash igual que en el sync real.
     """
     stats = Counter()
 
     log_fn("===== DRY RUN =====")
 
+    if plan is None:
+        try:
+            plan = engine.plan(tree=walk_directory_metadata(engine.pc_root, engine.scan_workers))
+        except Exception as e:
+            log_fn(f"Error calculando el plan: {e}")
+            return stats
+
     # =========================
     # FASE 1 (USB → LOCAL)
     # =========================
     log_fn("DRY-RUN FASE 1: USB → LOCAL")
 
-    try:
-        primary_master, primary_tombstones = engine._read_usb_master()
-        if not primary_master:
-            log_fn("USB sin master_states - se iniciaría desde cero")
-        else:
-            secundary_master = engine._read_pc_master()
-            if not secundary_master:
-                log_fn("PC sin master_states - se copiaría todo desde USB")
-                stats["initial_copy"] = len(primary_master)
-            else:
-                pc_index = {m["init_hash"]: m for m in secundary_master}
-                usb_index = {m["init_hash"]: m for m in primary_master}
-                tombstone_index = {m["init_hash"]: m for m in primary_tombstones}
-
-                for h in pc_index.keys() | usb_index.keys():
-                    pc = pc_index.get(h)
-                    usb = usb_index.get(h)
-
-                    if usb and not pc:
-                        log_fn(f"[WOULD COPY NEW FROM USB] {usb['rel_path']}")
-                        stats["new_from_usb"] += 1
-                    elif pc and not usb:
-                        if pc["init_hash"] in tombstone_index:
-                            log_fn(f"[WOULD DELETE FROM PC (tombstone)] {pc['rel_path']}")
-                            stats["delete_pc_tombstone"] += 1
-                    else:
-                        # Conflicto o cambio
-                        if usb["rel_path"] != pc["rel_path"]:
-                            log_fn(f"[WOULD MOVE LOCAL] {pc['rel_path']} → {usb['rel_path']}")
-                            stats["move_local"] += 1
-                        elif usb["content_hash"] != pc["content_hash"]:
-                            log_fn(f"[WOULD UPDATE LOCAL] {usb['rel_path']}")
-                            stats["update_local"] += 1
-    except Exception as e:
-        log_fn(f"Error en FASE 1: {e}")
+    if plan.mode == MODE_INITIAL_COPY:
+        adopted = sum(1 for op in plan.replication if op["op_type"] == ADOPT_PC)
+        log_fn("PC sin master_states - se copiaría todo desde USB")
+        if adopted:
+            log_fn(f"[WOULD ADOPT] {adopted} archivos ya iguales en la PC (no se copian)")
+            stats["adopt_pc"] = adopted
+        stats["initial_copy"] = len(plan.replication) - adopted
+    else:
+        for op in plan.replication:
+            if op["op_type"] == COPY_TO_PC:
+                log_fn(f"[WOULD COPY NEW FROM USB] {op['rel_path']}")
+                stats["new_from_usb"] += 1
+            elif op["op_type"] == DELETE_PC:
+                log_fn(f"[WOULD DELETE FROM PC (tombstone)] {op['rel_path']}")
+                stats["delete_pc_tombstone"] += 1
+            elif op["op_type"] == MOVE_PC:
+                log_fn(f"[WOULD MOVE LOCAL] {op['rel_path']} → {op['new_rel_path']}")
+                stats["move_local"] += 1
+            elif op["op_type"] == UPDATE_PC:
+                log_fn(f"[WOULD UPDATE LOCAL] {op['rel_path']}")
+                stats["update_local"] += 1
 
     # =========================
     # FASE 2 (DETECTAR CAMBIOS LOCALES)
     # =========================
     log_fn("DRY-RUN FASE 2: DETECTAR CAMBIOS LOCALES")
 
-    try:
-        from sync.meta_util import walk_directory_metadata
-
-        directory_tree = walk_directory_metadata(engine.pc_root)
-
-        with engine.db.get_db_connection(engine.db.pc_path) as conn:
-            if engine.db.table_is_empty(conn, "master_states"):
-                log_fn("No hay master_states - se escanearía todo como nuevo")
-            else:
-                master = engine.db.read_states(conn)
-                paths_index = {m["rel_path"]: m for m in master}
-                hash_index = {m["content_hash"]: m for m in master}
-
-                # Detectar nuevos y modificados
-                for rel_path, (size, mtime, _) in directory_tree.items():
-                    db_entry = paths_index.get(rel_path)
-
-                    if not db_entry:
-                        log_fn(f"[WOULD DETECT CREATE] {rel_path}")
-                        stats["create_local"] += 1
-                    else:
-                        if (
-                            db_entry["size_bytes"] != size
-                            or abs(db_entry["last_op_time"] - mtime) > 2
-                        ):
-                            log_fn(f"[WOULD DETECT MODIFY] {rel_path}")
-                            stats["modify_local"] += 1
-
-                # Detectar borrados
-                for rel_path in paths_index.keys() - directory_tree.keys():
-                    log_fn(f"[WOULD DETECT DELETE] {rel_path}")
-                    stats["delete_local"] += 1
-    except Exception as e:
-        log_fn(f"Error en FASE 2: {e}")
+    for mov in plan.movements:
+        op = mov["op_type"]
+        if op == "MOVE":
+            log_fn(f"[WOULD DETECT MOVE] {mov['rel_path']} → {mov['new_rel_path']}")
+        else:
+            log_fn(f"[WOULD DETECT {op}] {mov['rel_path']}")
+        stats[f"{op.lower()}_local"] += 1
 
     # =========================
     # FASE 3 (LOCAL → USB)
     # =========================
     log_fn("DRY-RUN FASE 3: LOCAL → USB")
 
-    try:
-        with engine.db.get_db_connection(engine.db.temp_path) as conn:
-            if engine.db.table_is_empty(conn, "movements"):
-                log_fn("No hay movimientos pendientes")
-            else:
-                movements = engine.db.read_movements(conn)
-                master = engine.db.read_states(conn)
-                from sync.domain import CurrentState
-                current = CurrentState({m["rel_path"] for m in master})
-
-                for mov in movements:
-                    op = mov["op_type"]
-
-                    from sync.domain import MovementRules
-                    if not MovementRules.can_apply(mov, current._paths):
-                        log_fn(f"[WOULD SKIP] {op} {mov['rel_path']} (no se puede aplicar)")
-                        stats["skipped"] += 1
-                        continue
-
-                    if op == "CREATE":
-                        log_fn(f"[WOULD CREATE ON USB] {mov['rel_path']}")
-                        stats["create_usb"] += 1
-                    elif op == "MODIFY":
-                        log_fn(f"[WOULD MODIFY ON USB] {mov['rel_path']}")
-                        stats["modify_usb"] += 1
-                    elif op == "MOVE":
-                        log_fn(f"[WOULD MOVE ON USB] {mov['rel_path']} → {mov['new_rel_path']}")
-                        stats["move_usb"] += 1
-                    elif op == "DELETE":
-                        log_fn(f"[WOULD DELETE ON USB] {mov['rel_path']}")
-                        stats["delete_usb"] += 1
-    except Exception as e:
-        log_fn(f"Error en FASE 3: {e}")
+    to_apply = [*plan.pending, *plan.movements]
+    if not to_apply:
+        log_fn("No hay movimientos pendientes")
+
+    current = CurrentState(engine.planned_master_paths(plan))
+    for mov in to_apply:
+        op = mov["op_type"]
+
+        if not MovementRules.can_apply(mov, current._paths):
+            log_fn(f"[WOULD SKIP] {op} {mov['rel_path']} (no se puede aplicar)")
+            stats["skipped"] += 1
+            continue
+
+        if op == "CREATE":
+            log_fn(f"[WOULD CREATE ON USB] {mov['rel_path']}")
+            stats["create_usb"] += 1
+        elif op == "MODIFY":
+            log_fn(f"[WOULD MODIFY ON USB] {mov['rel_path']}")
+            stats["modify_usb"] += 1
+        elif op == "MOVE":
+            log_fn(f"[WOULD MOVE ON USB] {mov['rel_path']} → {mov['new_rel_path']}")
+            stats["move_usb"] += 1
+        elif op == "DELETE":
+            log_fn(f"[WOULD DELETE ON USB] {mov['rel_path']}")
+            stats["delete_usb"] += 1
+
+    summary = plan.summary()
+    stats["bytes_usb_to_pc"] = summary["bytes_usb_to_pc"]
+    stats["bytes_pc_to_usb"] = summary["bytes_pc_to_usb"]
 
     # =========================
     # RESUMEN
@@ -1,25 +1,106 @@
-import socket
+import os
 import time
 import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from sync.database import DB
-from sync.domain import MovementRules, CurrentState
+from sync.domain import CurrentState, DirectoryCollapser, MovementRules, is_dir_op
 from sync.fs_util import FSOps
-from sync.meta_util import walk_directory_metadata, sha256_file
-
-
-MTIME_TOLERANCE = 2  # segundos
+from sync.log_util import ProgressLogger
+from sync.pack_store import PackStore, pack_path
+from sync.pipeline import Phase2Pipeline
+from sync.meta_util import HashCache, walk_directory_metadata, sha256_file
+from sync.plan import (
+    ADOPT_PC,
+    COPY_TO_PC,
+    DELETE_PC,
+    MODE_INITIAL_COPY,
+    MODE_INITIALIZE,
+    MODE_SKIP,
+    MODE_SYNC,
+    MOVE_PC,
+    UPDATE_PC,
+    StalePlanError,
+    SyncPlan,
+)
+from sync.scheduler import IOScheduler
+from sync.storage import UsbStorage
+from sync.time_util import mtime_granularity_ns, same_mtime, to_ns
 
 
 class EngineSync:
+    CHECKPOINT_NAME = "phase3"
+    # Último seq de tombstones del USB ya procesado por esta PC (sync_meta de la DB de PC)
+    TOMBSTONES_SEEN_KEY = "tombstones_seen"
+
     # <======================================= INIT =======================================>
-    def __init__(self, pc_root: Path, usb_root: Path, db_name: str):
+    def __init__(
+        self,
+        pc_root: Path,
+        usb_root: Path,
+        db_name: str,
+        progress_interval: float = 5.0,
+        batch_size: int = 200,
+        pc_db_name: str | None = None,
+        hash_cache: HashCache | None = None,
+        compress: bool = False,
+        dedup: bool = False,
+        tombstone_retention_days: float = 90,
+        workers: int = 1,
+        pack_threshold: int = 0,
+        reconcile: bool = False,
+        pipeline: bool = False,
+        hash_workers: int = 4,
+        scan_workers: int = 1,
+    ):
+        import socket
+
         self.machine_name = socket.gethostname()
         self.pc_root = pc_root.resolve()
         self.usb_root = usb_root.resolve()
-        self.db = DB(self.pc_root, self.usb_root, db_name)
+        self.db = DB(self.pc_root, self.usb_root, db_name, pc_db_name)
         self.logger = logging.getLogger(__name__)
+        self.progress_interval = progress_interval
+        # Movimientos aplicados por commit en FASE 3: más grande = menos overhead
+        # de commit, más trabajo rehecho si se corta la ejecución
+        self.batch_size = max(1, batch_size)
+        # Resumen de la ejecución (operaciones/bytes ahorrados, etc.)
+        self.stats = Counter()
+        # Hashes calculados en esta ejecución (plan y ejecución comparten el pase)
+        # (compartida entre destinos cuando se sincronizan varios USB)
+        self.hash_cache = hash_cache if hash_cache is not None else HashCache()
+        self._progress = self._new_progress("SYNC")
+        # Cómo se guardan los archivos en el USB (copia directa, comprimidos o,
+        # por debajo de pack_threshold bytes, empaquetados en <db>.pack)
+        self.storage = UsbStorage(
+            compress=compress,
+            pack=PackStore(pack_path(self.db.usb_path)),
+            pack_threshold=pack_threshold,
+        )
+        # Si el contenido ya está en el USB bajo otra ruta, se clona allí
+        # (hardlink o copia local) en lugar de traerlo de la PC
+        self.dedup = dedup
+        # Tombstones más viejos que esto se compactan aunque alguna máquina no
+        # los haya confirmado (esa máquina tendrá que reconciliar)
+        self.tombstone_retention = tombstone_retention_days * 86400
+        # Resolución de mtime del sistema de archivos de la PC (FAT 2 s, ext4 1 ns...)
+        self.mtime_granularity_ns = mtime_granularity_ns(self.pc_root)
+        # Orden de E/S por localidad: FASE 1 lee del USB, FASE 3 lee de la PC
+        self.usb_scheduler = IOScheduler(self.usb_root)
+        self.pc_scheduler = IOScheduler(self.pc_root, content_dependencies=dedup)
+        # Hilos para las operaciones de FS de la FASE 3 (1 = estrictamente en serie)
+        self.workers = max(1, workers)
+        # Al reconstruir una DB perdida, los archivos que ya están iguales en el
+        # otro lado (mismo tamaño y hash) se adoptan sin copiarlos
+        self.reconcile = reconcile
+        # FASE 2 como pipeline asyncio: escaneo, hashing (hash_workers hilos) y
+        # escritura en la DB solapados, con colas acotadas entre etapas
+        self.pipeline = pipeline
+        self.hash_workers = max(1, hash_workers)
+        # Hilos para listar carpetas al escanear la PC (discos de red, árboles anchos)
+        self.scan_workers = max(1, scan_workers)
 
         self.logger.info(
             "EngineSync iniciado | machine=%s | pc_root=%s | usb_root=%s",
@@ -28,34 +109,319 @@ class EngineSync:
             self.usb_root,
         )
 
+    def _new_progress(self, label):
+        return ProgressLogger(self.logger, label, self.progress_interval)
+
+    # <======================================= PLAN =======================================>
+    def plan(self, tree=None) -> SyncPlan:
+        """
+        Calcula las operaciones exactas de las 3 fases sin modificar nada: un solo
+        escaneo y un solo pase de hashing (los hashes quedan en self.hash_cache).
+        `tree` permite reutilizar un escaneo ya hecho.
+        """
+        self.logger.info("PLAN | Calculando operaciones de sincronización")
+
+        usb_master, tombstones = self._read_usb_master()
+        pc_master = self._read_pc_master()
+        if tree is None:
+            tree = walk_directory_metadata(self.pc_root, self.scan_workers)
+
+        mode, replication = self._plan_replication(usb_master, pc_master, tombstones)
+
+        if mode == MODE_INITIALIZE:
+            movements = self._plan_initial_creates(tree)
+            movements_db = "pc"
+        else:
+            master, skip_paths, tree = self._master_after_replication(
+                mode, replication, usb_master, pc_master, tree
+            )
+            movements = self._plan_movements(tree, master, skip_paths) if master else []
+            movements_db = "temp"
+
+        plan = SyncPlan(
+            mode=mode,
+            replication=replication,
+            movements=movements,
+            movements_db=movements_db,
+            pending=self._read_pending_movements(),
+            machine_name=self.machine_name,
+            pc_root=str(self.pc_root),
+            usb_root=str(self.usb_root),
+        )
+        plan.fingerprint = self._fingerprint(usb_master, tombstones, pc_master, plan.pending, tree)
+
+        self.logger.info(
+            "PLAN | modo=%s | fase1=%d | movimientos=%d | pendientes=%d",
+            mode,
+            len(replication),
+            len(movements),
+            len(plan.pending),
+        )
+        return plan
+
+    def apply(self, plan: SyncPlan):
+        """Ejecuta un plan ya calculado, si el estado no cambió desde entonces."""
+        usb_master, tombstones = self._check_plan_fresh(plan)
+
+        # FASE 1 según el plan, sin volver a decidir
+        self.logger.info("FASE 1: aplicando plan (modo=%s)", plan.mode)
+        self._progress = self._new_progress("FASE 1")
+        try:
+            # Al inicializar, la FASE 1 registra los CREATE del plan en la DB de PC
+            self._execute_replication(
+                plan.mode, plan.replication, usb_master, tombstones, plan.movements
+            )
+        finally:
+            self._progress.summary()
+
+        # FASE 2: los movimientos ya están detectados y hasheados
+        if plan.mode != MODE_INITIALIZE:
+            self.logger.info("FASE 2: registrando %d movimientos del plan", len(plan.movements))
+            with self.db.get_db_connection(self.db.temp_path) as conn:
+                for mov in plan.movements:
+                    self.db.upsert_movement(conn, {**mov, "id": None})
+                conn.commit()
+
+        # FASE 3
+        self.apply_movements()
+
+    def _check_plan_fresh(self, plan: SyncPlan):
+        if Path(plan.pc_root) != self.pc_root or Path(plan.usb_root) != self.usb_root:
+            raise StalePlanError("El plan corresponde a otras rutas PC/USB")
+
+        # Copia nueva del USB: la del plan puede ser vieja si otra máquina sincronizó
+        self.db.checkout_usb()
+        usb_master, tombstones = self._read_usb_master()
+        pc_master = self._read_pc_master()
+        tree = walk_directory_metadata(self.pc_root, self.scan_workers)
+        current = self._fingerprint(
+            usb_master, tombstones, pc_master, self._read_pending_movements(), tree
+        )
+
+        changed = [k for k in current if current[k] != plan.fingerprint.get(k)]
+        if changed:
+            raise StalePlanError(f"El estado cambió desde el plan: {', '.join(changed)}")
+
+        return usb_master, tombstones
+
+    @staticmethod
+    def _fingerprint(usb_master, tombstones, pc_master, pending, tree) -> dict:
+        """Huella barata (sin hashear archivos) del estado del que depende el plan."""
+        import hashlib
+
+        def digest(rows):
+            h = hashlib.sha256()
+            for row in rows:
+                h.update(repr(row).encode("utf-8"))
+                h.update(b"\n")
+            return h.hexdigest()
+
+        def as_rows(entries, keys):
+            return sorted(tuple(e.get(k) for k in keys) for e in entries)
+
+        state_keys = ("init_hash", "rel_path", "content_hash", "size_bytes", "last_op_time")
+        return {
+            "usb_master": digest(as_rows(usb_master, state_keys)),
+            "tombstones": digest(as_rows(tombstones, ("init_hash", "deleted_at"))),
+            "pc_master": digest(as_rows(pc_master, state_keys)),
+            "pending": digest(as_rows(pending, ("id", "op_type", "rel_path"))),
+            "pc_tree": digest(sorted((p, s, m) for p, (s, m, _) in tree.items())),
+        }
+
+    def planned_master_paths(self, plan: SyncPlan) -> set:
+        """Rutas del maestro contra el que la FASE 3 validará los movimientos del plan."""
+        if plan.mode == MODE_INITIALIZE:
+            return set()
+        if plan.mode == MODE_SKIP:
+            master = self._read_pc_master()
+        else:
+            master, _ = self._read_usb_master()
+        return {m["rel_path"] for m in master}
+
+    def _read_pending_movements(self):
+        pending = []
+        for path in (self.db.pc_path, self.db.temp_path):
+            with self.db.get_db_connection(path) as conn:
+                if not self.db.table_is_empty(conn, "movements"):
+                    pending.extend(self.db.read_movements(conn))
+        return pending
+
     # <======================================= FASE 1 =======================================>
     def replicate_master(self):
         self.logger.info("FASE 1: replicando estado desde USB")
+        self._progress = self._new_progress("FASE 1")
+        try:
+            self._replicate_master()
+            self.db.publish_usb()
+        finally:
+            self.storage.close()
+            self._progress.summary()
 
+    def _replicate_master(self):
         primary_master, primary_tombstones = self._read_usb_master()
         secundary_master = self._read_pc_master()
 
-        if not primary_master and not secundary_master:
-            self.logger.info("Sin master_states en ninguna parte, inicializando desde PC")
-            self._initialize_from_pc()
-            return
+        mode, ops = self._plan_replication(primary_master, secundary_master, primary_tombstones)
+        self._execute_replication(mode, ops, primary_master, primary_tombstones)
 
-        if not primary_master:
-            self.logger.info("USB sin master_states, salto replicación")
-            return
+    def _plan_replication(self, usb_master, pc_master, tombstones):
+        """Decide el modo de FASE 1 y las operaciones USB → PC, sin ejecutarlas."""
+        if not usb_master and not pc_master:
+            return MODE_INITIALIZE, []
 
-        if not secundary_master:
-            self.logger.warning("PC sin master_states, posible primera ejecución")
-            self._initial_usb_copy(primary_master)
-            return
+        if not usb_master:
+            return MODE_SKIP, []
+
+        if not pc_master:
+            ops = [self._initial_copy_op(usb) for usb in usb_master]
+            return MODE_INITIAL_COPY, self._order_replication(ops)
 
-        self._sync_usb_to_pc(primary_master, secundary_master, primary_tombstones)
+        pc_index = {m["init_hash"]: m for m in pc_master}
+        usb_index = {m["init_hash"]: m for m in usb_master}
+        tombstone_index = {m["init_hash"]: m for m in tombstones}
+
+        ops = []
+        for h in pc_index.keys() | usb_index.keys():
+            pc = pc_index.get(h)
+            usb = usb_index.get(h)
+
+            if usb and not pc:
+                ops.append(self._replication_op(COPY_TO_PC, usb))
+            elif pc and not usb:
+                if pc["init_hash"] in tombstone_index:
+                    ops.append(self._replication_op(DELETE_PC, pc))
+            elif usb["rel_path"] != pc["rel_path"] and to_ns(usb["last_op_time"]) == to_ns(pc["last_op_time"]):
+                ops.append(self._replication_op(MOVE_PC, usb, rel_path=pc["rel_path"], new_rel_path=usb["rel_path"]))
+            elif to_ns(usb["last_op_time"]) > to_ns(pc["last_op_time"]) and usb["content_hash"] != pc["content_hash"]:
+                ops.append(self._replication_op(UPDATE_PC, usb))
+
+        return MODE_SYNC, self._order_replication(ops)
+
+    # Primero se liberan rutas (DELETE, MOVE) y después se copian archivos
+    _REPLICATION_RANK = {DELETE_PC: 0, MOVE_PC: 1, ADOPT_PC: 1, COPY_TO_PC: 2, UPDATE_PC: 2}
+
+    def _initial_copy_op(self, usb):
+        """COPY_TO_PC, o ADOPT_PC si al reconciliar la PC ya tiene ese contenido."""
+        if self.reconcile and self._pc_has_content(usb):
+            return self._replication_op(ADOPT_PC, usb)
+        return self._replication_op(COPY_TO_PC, usb)
+
+    def _pc_has_content(self, entry) -> bool:
+        # Primero el tamaño (un stat); solo si coincide se hashea (con la caché)
+        path = self.pc_root / entry["rel_path"]
+        try:
+            st = path.stat()
+        except OSError:
+            return False
+        if not path.is_file() or st.st_size != entry["size_bytes"]:
+            return False
+        return self._hash_file(entry["rel_path"], st.st_size, st.st_mtime_ns) == entry["content_hash"]
+
+    def _order_replication(self, ops):
+        """Orden estable y por localidad de las operaciones USB → PC."""
+        ops.sort(key=lambda op: (self._REPLICATION_RANK[op["op_type"]], op["rel_path"]))
+        return self.usb_scheduler.order(ops)
+
+    @staticmethod
+    def _replication_op(op_type, entry, **overrides):
+        op = {
+            "op_type": op_type,
+            "init_hash": entry.get("init_hash"),
+            "rel_path": entry.get("rel_path"),
+            "new_rel_path": None,
+            "content_hash": entry.get("content_hash"),
+            "size_bytes": entry.get("size_bytes"),
+            "last_op_time": entry.get("last_op_time"),
+        }
+        op.update(overrides)
+        return op
+
+    def _execute_replication(self, mode, ops, usb_master, tombstones, movements=None):
+        if mode == MODE_INITIALIZE:
+            self.logger.info("Sin master_states en ninguna parte, inicializando desde PC")
+            self._initialize_from_pc(movements)
+        elif mode == MODE_SKIP:
+            self.logger.info("USB sin master_states, salto replicación")
+        elif mode == MODE_INITIAL_COPY:
+            self.logger.warning("PC sin master_states, posible primera ejecución")
+            self._initial_usb_copy(usb_master, tombstones, ops)
+        else:
+            self._sync_usb_to_pc(usb_master, tombstones, ops)
+
+        # Toda máquina que sincroniza queda registrada en el USB, aunque todavía
+        # no haya visto ningún tombstone: así frena la compactación
+        self._ack_tombstones()
+
+    def _apply_replication_op(self, op):
+        op_type = op["op_type"]
+        if op_type in {COPY_TO_PC, UPDATE_PC}:
+            self.logger.debug("%s | %s", op_type, op["rel_path"])
+            dst = self.pc_root / op["rel_path"]
+            self.storage.get(self.usb_root / op["rel_path"], dst, op.get("init_hash"))
+            # El USB (FAT/exFAT) redondea el mtime; en la PC se deja el del maestro
+            # con precisión completa para que la FASE 2 no lo vuelva a hashear
+            mtime_ns = to_ns(op.get("last_op_time"))
+            if mtime_ns is not None and dst.exists():
+                os.utime(dst, ns=(mtime_ns, mtime_ns))
+            self._progress.tick(op_type.lower(), nbytes=op.get("size_bytes") or 0)
+        elif op_type == ADOPT_PC:
+            self.logger.debug("ADOPT | %s ya está en la PC", op["rel_path"])
+            # Con el mtime del maestro la FASE 2 no lo vuelve a hashear
+            mtime_ns = to_ns(op.get("last_op_time"))
+            if mtime_ns is not None:
+                os.utime(self.pc_root / op["rel_path"], ns=(mtime_ns, mtime_ns))
+            self.stats["adopted_files"] += 1
+            self.stats["adopted_bytes"] += op.get("size_bytes") or 0
+            self._progress.tick("adopt_pc")
+        elif op_type == MOVE_PC:
+            self.logger.debug("MOVE detectado | %s → %s", op["rel_path"], op["new_rel_path"])
+            FSOps.move_file(self.pc_root / op["rel_path"], self.pc_root / op["new_rel_path"])
+            self._progress.tick("move_pc")
+        elif op_type == DELETE_PC:
+            self.logger.debug("DELETE en PC (tombstone) | %s", op["rel_path"])
+            FSOps.delete_file(self.pc_root / op["rel_path"])
+            self._progress.tick("delete_pc")
+        else:
+            raise ValueError(f"Operación de FASE 1 desconocida: {op_type}")
 
     def _read_usb_master(self):
-        with self.db.get_db_connection(self.db.usb_path) as conn:
+        with self.db.usb_connection() as conn:
             if self.db.table_is_empty(conn, "master_states"):
                 return [], []
-            return self.db.read_states(conn), self.db.read_tombstones(conn)
+            since = self._tombstones_seen()
+            return self.db.read_states(conn), self.db.read_tombstones(conn, since=since)
+
+    def _tombstones_seen(self):
+        """Marca de tombstones ya procesados; None si la PC no tiene estado (lectura completa)."""
+        with self.db.get_db_connection(self.db.pc_path) as conn:
+            if self.db.table_is_empty(conn, "master_states"):
+                return None
+            seen = self.db.get_meta(conn, self.TOMBSTONES_SEEN_KEY)
+            return int(seen) if seen is not None else None
+
+    def _record_tombstones(self, pc_conn, tombstones):
+        """Guarda en la PC los tombstones recibidos y avanza la marca."""
+        self.db.merge_tombstones(pc_conn, tombstones)
+        self.db.gc_tombstones(pc_conn, self.tombstone_retention)
+
+        seen = self.db.get_meta(pc_conn, self.TOMBSTONES_SEEN_KEY)
+        marks = [int(seen)] if seen is not None else []
+        marks.extend(t["seq"] for t in tombstones)
+        if marks:
+            self.db.set_meta(pc_conn, self.TOMBSTONES_SEEN_KEY, max(marks))
+
+    def _ack_tombstones(self):
+        """
+        Confirma en el USB hasta dónde procesó esta máquina (0 si todavía no vio
+        ninguno) y compacta lo que ya procesaron todas las máquinas conocidas.
+        """
+        with self.db.get_db_connection(self.db.pc_path) as conn:
+            seen = self.db.get_meta(conn, self.TOMBSTONES_SEEN_KEY)
+        last_seen = int(seen) if seen is not None else 0
+        with self.db.usb_connection() as conn:
+            self.db.ack_tombstones(conn, self.machine_name, last_seen)
+            self.db.gc_tombstones(conn, self.tombstone_retention)
+            conn.commit()
 
     def _read_pc_master(self):
         with self.db.get_db_connection(self.db.pc_path) as conn:
@@ -63,11 +429,9 @@ class EngineSync:
                 return []
             return self.db.read_states(conn)
 
-    def _initial_usb_copy(self, usb_master):
-        for entry in usb_master:
-            src = self.usb_root / entry["rel_path"]
-            dst = self.pc_root / entry["rel_path"]
-            FSOps.copy_file(src, dst)
+    def _initial_usb_copy(self, usb_master, tombstones, ops):
+        for op in ops:
+            self._apply_replication_op(op)
         
         # Inicializar master_states en PC después de copiar archivos
         with self.db.get_db_connection(self.db.pc_path) as conn:
@@ -86,60 +450,53 @@ class EngineSync:
                         entry["machine_name"],
                     )
                 )
+            self._record_tombstones(conn, tombstones)
             conn.commit()
             self.logger.info("Inicializados %d registros en master_states de PC", len(usb_master))
 
-    def _initialize_from_pc(self):
+
+    def _initialize_from_pc(self, movements=None):
         """Inicializa master_states desde el estado actual del PC cuando no hay datos previos"""
-        from sync.meta_util import walk_directory_metadata, sha256_file
-        import hashlib
-        
-        directory_tree = walk_directory_metadata(self.pc_root)
-        
+        if movements is None:
+            movements = self._plan_initial_creates(walk_directory_metadata(self.pc_root, self.scan_workers))
+
         # Generar movimientos de CREATE para todos los archivos en PC
         # NO crear master_states directamente, dejar que la FASE 3 los cree al aplicar los movimientos
         with self.db.get_db_connection(self.db.pc_path) as conn:
-            for rel_path, (size, mtime, _) in directory_tree.items():
-                file_path = self.pc_root / rel_path
-                content_hash = sha256_file(file_path)
-                
-                # Generar init_hash único combinando content_hash y rel_path
-                # Esto evita conflictos cuando hay archivos con el mismo contenido
-                init_hash_input = f"{content_hash}:{rel_path}".encode('utf-8')
-                init_hash = hashlib.sha256(init_hash_input).hexdigest()
-                
-                # Crear movimiento de CREATE
-                self.db.upsert_movement(
-                    conn,
-                    {
-                        "op_type": "CREATE",
-                        "init_hash": init_hash,
-                        "rel_path": rel_path,
-                        "new_rel_path": None,
-                        "content_hash": content_hash,
-                        "size_bytes": size,
-                        "last_op_time": mtime,
-                        "machine_name": self.machine_name,
-                    },
-                )
+            for mov in movements:
+                self.db.upsert_movement(conn, mov)
             conn.commit()
-            self.logger.info("Generados %d movimientos CREATE desde PC", len(directory_tree))
+            self.logger.info("Generados %d movimientos CREATE desde PC", len(movements))
 
-    def _sync_usb_to_pc(self, usb_master, pc_master, tombstones):
-        pc_index = {m["init_hash"]: m for m in pc_master}
-        usb_index = {m["init_hash"]: m for m in usb_master}
-        tombstone_index = {m["init_hash"]: m for m in tombstones}
+    def _plan_initial_creates(self, tree):
+        import hashlib
 
-        for h in pc_index.keys() | usb_index.keys():
-            pc = pc_index.get(h)
-            usb = usb_index.get(h)
+        movements = []
+        for rel_path, (size, mtime, _) in tree.items():
+            content_hash = self._hash_file(rel_path, size, mtime)
 
-            if usb and not pc:
-                self._copy_usb_to_pc(usb)
-            elif pc and not usb:
-                self._delete_pc_if_tombstone(pc, tombstone_index)
-            else:
-                self._resolve_conflict(pc, usb)
+            # Generar init_hash único combinando content_hash y rel_path
+            # Esto evita conflictos cuando hay archivos con el mismo contenido
+            init_hash_input = f"{content_hash}:{rel_path}".encode('utf-8')
+            init_hash = hashlib.sha256(init_hash_input).hexdigest()
+
+            movements.append(
+                {
+                    "op_type": "CREATE",
+                    "init_hash": init_hash,
+                    "rel_path": rel_path,
+                    "new_rel_path": None,
+                    "content_hash": content_hash,
+                    "size_bytes": size,
+                    "last_op_time": mtime,
+                    "machine_name": self.machine_name,
+                }
+            )
+        return movements
+
+    def _sync_usb_to_pc(self, usb_master, tombstones, ops):
+        for op in ops:
+            self._apply_replication_op(op)
         
         # Actualizar master_states en PC después de sincizar
         with self.db.get_db_connection(self.db.pc_path) as conn:
@@ -163,56 +520,50 @@ class EngineSync:
                     )
                 )
             
-            # También actualizar tombstones
-            conn.execute("DELETE FROM tombstones")
-            for tomb in tombstones:
-                conn.execute(
-                    """
-                    INSERT INTO tombstones 
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (
-                        tomb["init_hash"],
-                        tomb["content_hash"],
-                        tomb["deleted_at"],
-                        tomb["machine_name"],
-                    )
-                )
-            
+            # Tombstones: solo llegan los nuevos desde la última ejecución; se
+            # agregan a los existentes en lugar de reescribir la tabla
+            self._record_tombstones(conn, tombstones)
+
             conn.commit()
             self.logger.info("Actualizados master_states en PC desde USB")
 
-    def _copy_usb_to_pc(self, usb):
-        self.logger.info("COPY USB → PC | %s", usb["rel_path"])
-        src = self.usb_root / usb["rel_path"]
-        dst = self.pc_root / usb["rel_path"]
-        FSOps.copy_file(src, dst)
 
-    def _delete_pc_if_tombstone(self, pc, tombstones):
-        if pc["init_hash"] in tombstones:
-            self.logger.info("DELETE en PC (tombstone) | %s", pc["rel_path"])
-            FSOps.delete_file(self.pc_root / pc["rel_path"])
-
-    def _resolve_conflict(self, pc, usb):
-        src_usb = self.usb_root / usb["rel_path"]
-        dst_pc = self.pc_root / usb["rel_path"]
-
-        if usb["rel_path"] != pc["rel_path"] and usb["last_op_time"] == pc["last_op_time"]:
-            self.logger.info(
-                "MOVE detectado | %s → %s", pc["rel_path"], usb["rel_path"]
-            )
-            FSOps.move_file(self.pc_root / pc["rel_path"], dst_pc)
-            return
-
-        if usb["last_op_time"] > pc["last_op_time"] and usb["content_hash"] != pc["content_hash"]:
-            self.logger.info("UPDATE desde USB | %s", usb["rel_path"])
-            FSOps.copy_file(src_usb, dst_pc)
+    def _master_after_replication(self, mode, ops, usb_master, pc_master, tree):
+        """
+        Predice el maestro y el árbol de la PC tal como quedarán tras la FASE 1,
+        para planificar la FASE 2 sin ejecutar la FASE 1. Las rutas que la FASE 1
+        deja iguales al maestro se devuelven en skip_paths.
+        """
+        if mode == MODE_SKIP:
+            return pc_master, set(), tree
+
+        tree = dict(tree)
+        skip_paths = set()
+        for op in ops:
+            if op["op_type"] in {COPY_TO_PC, UPDATE_PC}:
+                skip_paths.add(op["rel_path"])
+            elif op["op_type"] == MOVE_PC:
+                tree.pop(op["rel_path"], None)
+                skip_paths.add(op["new_rel_path"])
+            elif op["op_type"] == DELETE_PC:
+                tree.pop(op["rel_path"], None)
+
+        return usb_master, skip_paths, tree
 
     # <======================================= FASE 2 =======================================>
-    def get_movements(self):
+    def get_movements(self, tree=None):
+        """`tree` permite reutilizar un escaneo ya hecho (p. ej. compartido entre USB)."""
         self.logger.info("FASE 2 | Escaneando filesystem para detectar cambios")
+        self._progress = self._new_progress("FASE 2")
+        try:
+            self._get_movements(tree)
+        finally:
+            self._progress.summary()
 
-        directory_tree = walk_directory_metadata(self.pc_root)
+    def _get_movements(self, tree=None):
+        if tree is None and not self.pipeline:
+            tree = walk_directory_metadata(self.pc_root, self.scan_workers)
+        directory_tree = tree
 
         with self.db.get_db_connection(self.db.pc_path) as conn:
             if self.db.table_is_empty(conn, "master_states"):
@@ -220,82 +571,130 @@ class EngineSync:
                 return
             master = self.db.read_states(conn)
 
+        if directory_tree is None:
+            # El escaneo lo hace el pipeline, a la par del hashing
+            written = Phase2Pipeline(self, self.hash_workers).run(master)
+            self.logger.info("FASE 2 | pipeline | movimientos=%d", written)
+            return
+
+        movements = self._plan_movements(directory_tree, master)
+
+        with self.db.get_db_connection(self.db.temp_path) as temp_conn:
+            for mov in movements:
+                self.db.upsert_movement(temp_conn, mov)
+
+    def _plan_movements(self, tree, master, skip_paths=frozenset()):
+        """Detecta CREATE/MODIFY/MOVE/DELETE comparando el árbol con el maestro."""
         paths_index = {m["rel_path"]: m for m in master}
         hash_index = {m["content_hash"]: m for m in master}
+        taken_init_hashes = {m["init_hash"] for m in master}
 
-        with self.db.get_db_connection(self.db.temp_path) as temp_conn:
-            self._detect_fs_changes(directory_tree, paths_index, hash_index, temp_conn)
-            self._detect_deletes(directory_tree, paths_index, temp_conn)
+        movements = []
+        moved_from = set()
 
-    def _detect_fs_changes(self, tree, paths_index, hash_index, conn):
         for rel_path, (size, mtime, _) in tree.items():
-            db_entry = paths_index.get(rel_path)
+            if rel_path in skip_paths:
+                continue
 
+            db_entry = paths_index.get(rel_path)
             if not db_entry:
-                self._handle_new_entry(rel_path, size, mtime, hash_index, conn)
+                mov = self._handle_new_entry(
+                    rel_path, size, mtime, hash_index, tree, moved_from, taken_init_hashes
+                )
             else:
-                self._handle_existing_entry(rel_path, size, mtime, db_entry, conn)
+                mov = self._handle_existing_entry(rel_path, size, mtime, db_entry)
+
+            if mov:
+                movements.append(mov)
+
+        movements.extend(self._detect_deletes(tree, paths_index, moved_from | set(skip_paths)))
+
+        # Carpetas renombradas/borradas completas: una operación en lugar de una por archivo
+        movements, saved = DirectoryCollapser.collapse(movements, paths_index.keys(), tree.keys())
+        if saved:
+            self.stats["dir_ops_saved"] += saved
+            self.logger.info("FASE 2 | Operaciones de carpeta | ahorradas=%d", saved)
+        return movements
 
-    def _handle_new_entry(self, rel_path, size, mtime, hash_index, conn):
-        current_hash = sha256_file(self.pc_root / rel_path)
+    def _hash_file(self, rel_path, size, mtime):
+        digest = self.hash_cache.get(rel_path, size, mtime)
+        if digest is None:
+            digest = sha256_file(self.pc_root / rel_path)
+            self.hash_cache.put(rel_path, size, mtime, digest)
+        return digest
+
+    def _handle_new_entry(self, rel_path, size, mtime, hash_index, tree, moved_from, taken):
+        current_hash = self._hash_file(rel_path, size, mtime)
         previous = hash_index.get(current_hash)
 
-        if not previous:
-            op = "CREATE"
-            rel_old = None
-            init_hash = current_hash
-        else:
+        # Solo es MOVE si el origen ya no existe (si existe, es una copia nueva)
+        # y ningún otro archivo reclamó ese mismo origen
+        if (
+            previous
+            and previous["rel_path"] not in tree
+            and previous["rel_path"] not in moved_from
+        ):
             op = "MOVE"
             rel_old = previous["rel_path"]
             init_hash = previous["init_hash"]
-
-        self.logger.info("FASE 2 | %s detectado | %s", op, rel_path)
-
-        self.db.upsert_movement(
-            conn,
-            {
-                "op_type": op,
-                "init_hash": init_hash,
-                "rel_path": rel_old or rel_path,
-                "new_rel_path": rel_path if op == "MOVE" else None,
-                "content_hash": current_hash,
-                "size_bytes": size,
-                "last_op_time": mtime,
-                "machine_name": self.machine_name,
-            },
-        )
-
-    def _handle_existing_entry(self, rel_path, size, mtime, db_entry, conn):
-        if (
-            db_entry["size_bytes"] == size
-            and abs(db_entry["last_op_time"] - mtime) <= MTIME_TOLERANCE
+            moved_from.add(rel_old)
+        else:
+            op = "CREATE"
+            rel_old = None
+            init_hash = current_hash
+            if init_hash in taken:
+                # Mismo contenido que otro archivo: identidad única por ruta
+                import hashlib
+
+                init_hash = hashlib.sha256(f"{current_hash}:{rel_path}".encode("utf-8")).hexdigest()
+            taken.add(init_hash)
+
+        self.logger.debug("FASE 2 | %s detectado | %s", op, rel_path)
+        self._progress.tick(op.lower(), nbytes=size)
+
+        return {
+            "op_type": op,
+            "init_hash": init_hash,
+            "rel_path": rel_old or rel_path,
+            "new_rel_path": rel_path if op == "MOVE" else None,
+            "content_hash": current_hash,
+            "size_bytes": size,
+            "last_op_time": mtime,
+            "machine_name": self.machine_name,
+        }
+
+    def _handle_existing_entry(self, rel_path, size, mtime, db_entry):
+        # Mismo tamaño y mismo mtime (a la resolución del FS de la PC): sin cambios
+        if db_entry["size_bytes"] == size and same_mtime(
+            db_entry["last_op_time"], mtime, self.mtime_granularity_ns
         ):
-            return
-
-        current_hash = sha256_file(self.pc_root / rel_path)
-        if current_hash != db_entry["content_hash"]:
-            self.logger.info("FASE 2 | MODIFY detectado | %s", rel_path)
-            self.db.upsert_movement(
-                conn,
-                {
-                    "op_type": "MODIFY",
-                    "init_hash": db_entry["init_hash"],
-                    "rel_path": rel_path,
-                    "new_rel_path": None,
-                    "content_hash": current_hash,
-                    "size_bytes": size,
-                    "last_op_time": mtime,
-                    "machine_name": self.machine_name,
-                },
-            )
-
-    def _detect_deletes(self, tree, paths_index, conn):
-        for rel_path in paths_index.keys() - tree.keys():
+            return None
+
+        current_hash = self._hash_file(rel_path, size, mtime)
+        if current_hash == db_entry["content_hash"]:
+            return None
+
+        self.logger.debug("FASE 2 | MODIFY detectado | %s", rel_path)
+        self._progress.tick("modify", nbytes=size)
+        return {
+            "op_type": "MODIFY",
+            "init_hash": db_entry["init_hash"],
+            "rel_path": rel_path,
+            "new_rel_path": None,
+            "content_hash": current_hash,
+            "size_bytes": size,
+            "last_op_time": mtime,
+            "machine_name": self.machine_name,
+        }
+
+    def _detect_deletes(self, tree, paths_index, keep_paths):
+        deletes = []
+        for rel_path in paths_index.keys() - tree.keys() - keep_paths:
             entry = paths_index[rel_path]
-            self.logger.info("FASE 2 | DELETE detectado | %s", rel_path)
+            self.logger.debug("FASE 2 | DELETE detectado | %s", rel_path)
+            self._progress.tick("delete")
 
-            self.db.upsert_movement(
-                conn,
+            deletes.append(
                 {
                     "op_type": "DELETE",
                     "init_hash": entry["init_hash"],
@@ -305,109 +704,285 @@ class EngineSync:
                     "size_bytes": entry["size_bytes"],
                     "last_op_time": time.time(),
                     "machine_name": self.machine_name,
-                },
+                }
             )
+        return deletes
 
     # <======================================= FASE 3 =======================================>
     def apply_movements(self):
         self.logger.info("FASE 3 | Aplicando movimientos y sincronizando USB")
+        self._progress = self._new_progress("FASE 3")
+        try:
+            self._apply_movements()
+            self.db.publish_usb()
+        finally:
+            self.storage.close()
+            self._progress.summary()
+
+    def _apply_movements(self):
+        # Los movimientos se validan y se aplican contra el maestro de la PC, en
+        # su lugar: la DB temporal es solo el staging donde escribe la FASE 2
+        with self.db.get_db_connection(self.db.pc_path) as conn:
+            staged = self.db.stage_movements(conn, self.db.temp_path)
+            if staged:
+                self.logger.info("FASE 3 | %d movimientos tomados de staging", staged)
 
-        # Sincronizar master_states desde PC a temp DB
-        self._sync_master_to_temp()
-
-        # Verificar si hay movimientos en PC DB (caso de inicialización)
-        with self.db.get_db_connection(self.db.pc_path) as pc_conn:
-            if not self.db.table_is_empty(pc_conn, "movements"):
-                self.logger.info("FASE 3 | Procesando movimientos desde PC DB (inicialización)")
-                self._process_movements_from_db(pc_conn)
-                return
-
-        # Procesar movimientos desde temp DB (caso normal)
-        with self.db.get_db_connection(self.db.temp_path) as conn:
             if self.db.table_is_empty(conn, "movements"):
                 self.logger.info("FASE 3 | No hay movimientos pendientes")
                 return
 
-            movements = self.db.read_movements(conn)
+            self._compact_movements(conn)
+
+            # Sin master_states (inicialización) el estado actual está vacío
             master = self.db.read_states(conn)
             current = CurrentState({m["rel_path"] for m in master})
+            del master
 
-            for mov in movements:
-                self._apply_single_movement(mov, current, conn)
+            self._apply_stream(conn, current)
+            self._rotate_history(conn, self.db.pc_path)
 
-    def _process_movements_from_db(self, conn):
-        """Procesa movimientos desde una conexión de base de datos específica"""
-        movements = self.db.read_movements(conn)
-        
-        # Como no hay master_states en caso de inicialización, current_state está vacío
-        current = CurrentState(set())
-        
-        for mov in movements:
-            self._apply_single_movement(mov, current, conn)
-
-    def _sync_master_to_temp(self):
-        """Copia master_states desde PC DB a temp DB"""
-        with self.db.get_db_connection(self.db.pc_path) as pc_conn:
-            if self.db.table_is_empty(pc_conn, "master_states"):
-                self.logger.debug("No hay master_states en PC para sincronizar a temp DB")
-                return
-                
-            master = self.db.read_states(pc_conn)
-            
-        with self.db.get_db_connection(self.db.temp_path) as temp_conn:
-            # Limpiar master_states existentes
-            temp_conn.execute("DELETE FROM master_states")
-            
-            # Copiar desde PC
-            for entry in master:
-                temp_conn.execute(
-                    """
-                    INSERT INTO master_states 
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        entry["init_hash"],
-                        entry["rel_path"],
-                        entry["content_hash"],
-                        entry["size_bytes"],
-                        entry["last_op_time"],
-                        entry["machine_name"],
-                    )
-                )
-            temp_conn.commit()
-            self.logger.debug("Sincronizados %d registros a temp DB", len(master))
-
-    def _apply_single_movement(self, mov, current, conn):
-        if not MovementRules.can_apply(mov, current._paths):
-            self.logger.warning(
-                "FASE 3 | Movimiento omitido | op=%s path=%s",
-                mov["op_type"],
-                mov["rel_path"],
-            )
-            return
+    def _rotate_history(self, conn, db_path):
+        """Mueve los meses cerrados de movements_history a DBs de archivo."""
+        from sync import history
 
         try:
-            self._apply_fs_operation(mov)
-            self.db.update_state(conn, mov)
-            self.db.archive_and_delete_movement(conn, mov)
+            moved = history.rotate(conn, db_path)
+        except Exception:
+            # Es mantenimiento: si falla, el sync igual terminó bien
+            self.logger.warning("No se pudo rotar movements_history de %s", db_path, exc_info=True)
+            return
+        self.stats["history_rotated"] += sum(moved.values())
+
+    def _compact_movements(self, conn):
+        saved_ops, saved_bytes = self.db.compact_movements(conn)
+        conn.commit()
+
+        self.stats["coalesced_ops"] += saved_ops
+        self.stats["coalesced_bytes"] += saved_bytes
+        if saved_ops:
+            self.logger.info(
+                "FASE 3 | Compactación | operaciones ahorradas=%d | bytes ahorrados=%d",
+                saved_ops,
+                saved_bytes,
+            )
 
+    def _apply_stream(self, conn, current):
+        """
+        Aplica los movimientos a medida que salen del cursor (memoria constante, la
+        primera copia empieza sin esperar a leer toda la tabla) y hace commit cada
+        `batch_size` movimientos aplicados, guardando un checkpoint. Si la ejecución
+        se corta, lo ya confirmado quedó archivado y la siguiente ejecución sigue
+        con lo pendiente.
+        """
+        checkpoint = self.db.read_checkpoint(conn, self.CHECKPOINT_NAME)
+        applied_total = 0
+        if checkpoint:
+            applied_total = checkpoint["applied"]
             self.logger.info(
-                "FASE 3 | Movimiento aplicado | op=%s path=%s",
-                mov["op_type"],
-                mov["rel_path"],
+                "FASE 3 | Reanudando | último id confirmado=%s | aplicados=%d",
+                checkpoint["last_movement_id"],
+                applied_total,
             )
+
+        # Ids aplicados del lote en curso: se archivan juntos al confirmarlo
+        applied_ids = []
+
+        # Cada lote se reordena por localidad y se parte en olas de movimientos
+        # independientes; el checkpoint sigue siendo válido porque lo aplicado se
+        # archiva al confirmar el lote
+        waves = self.pc_scheduler.stream_waves(
+            self.db.iter_movements(conn, batch_size=self.batch_size), window=self.batch_size
+        )
+        pool = ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+        try:
+            for wave in waves:
+                for mov in self._apply_wave(wave, current, conn, pool):
+                    applied_ids.append(mov["id"])
+
+                    if len(applied_ids) >= self.batch_size:
+                        applied_total += len(applied_ids)
+                        self._commit_batch(conn, applied_ids, applied_total)
+                        applied_ids = []
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        if applied_ids:
+            applied_total += len(applied_ids)
+            self._commit_batch(conn, applied_ids, applied_total)
+
+        # Fase completa: el checkpoint ya no hace falta
+        self.db.clear_checkpoint(conn, self.CHECKPOINT_NAME)
+        conn.commit()
+
+    def _commit_batch(self, conn, applied_ids, applied_total):
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        # El paquete se confirma antes: lo que la DB da por aplicado ya está en el USB
+        self.storage.flush()
+        # Un INSERT ... SELECT y un DELETE por lote en lugar de dos sentencias por movimiento
+        self.db.archive_movements(conn, applied_ids)
+        self.db.save_checkpoint(conn, self.CHECKPOINT_NAME, applied_ids[-1], applied_total)
+        conn.commit()
+        self.logger.debug(
+            "FASE 3 | Lote confirmado | último id=%s | aplicados=%d", applied_ids[-1], applied_total
+        )
+
+    def _apply_wave(self, wave, current, conn, pool):
+        """
+        Aplica una ola de movimientos independientes (ninguno comparte ruta ni
+        init_hash con otro). Las decisiones y la DB van en orden serial en este
+        hilo; solo las operaciones de FS corren en el pool. Devuelve, en orden,
+        los movimientos aplicados.
+        """
+        accepted = []
+        # Rutas que cambian en esta ola: un MODIFY del origen no comparte
+        # content_hash con el clon (trae el contenido nuevo)
+        touched = {p for mov in wave for p in (mov["rel_path"], mov.get("new_rel_path")) if p}
+        for mov in wave:
+            if not MovementRules.can_apply(mov, current._paths):
+                self.logger.warning(
+                    "FASE 3 | Movimiento omitido | op=%s path=%s",
+                    mov["op_type"],
+                    mov["rel_path"],
+                )
+                self._progress.tick("skipped")
+                continue
+            # La conexión SQLite no sale de este hilo: el origen del dedup se busca acá
+            source = self._dedup_source(mov, conn, exclude=touched) if self.dedup else None
+            accepted.append((mov, source))
+
+        # map() perezoso en serie: cada operación de FS va seguida de su update
+        run = pool.map if pool is not None else map
+        results = run(self._run_fs_operation, accepted)
+
+        applied = []
+        for (mov, _), (stats, error) in zip(accepted, results):
+            if error is None and self._commit_movement(mov, conn, stats):
+                current.apply(mov)
+                applied.append(mov)
+                continue
+            if error is not None:
+                self.logger.error("Error aplicando movimiento %s: %s", mov, error)
+            self._progress.tick("errors")
+        return applied
+
+    def _run_fs_operation(self, item):
+        """Corre en un hilo del pool: devuelve (stats, excepción o None)."""
+        mov, source = item
+        try:
+            return self._apply_fs_operation(mov, source), None
         except Exception as e:
-            self.logger.error("Error aplicando movimiento %s: %s", mov, e)
+            return Counter(), e
+
+    def _commit_movement(self, mov, conn, stats):
+        """Registra en la DB un movimiento ya aplicado en el FS, dentro de un SAVEPOINT."""
+        # La transacción del lote queda abierta hasta _commit_batch; cada
+        # movimiento es un SAVEPOINT para poder deshacerlo solo a él si falla
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        conn.execute("SAVEPOINT movement")
+
+        # DELETE de carpeta: los archivos empaquetados que contenía se descartan
+        # por init_hash. Solo lo que borra este destino: el paquete es compartido
+        packed = []
+        if mov["op_type"] == "DELETE" and is_dir_op(mov) and self.storage.has_packs():
+            packed = self.db.init_hashes_under(conn, mov["rel_path"])
 
-    def _apply_fs_operation(self, mov):
+        try:
+            self.db.update_state(conn, mov)
+            conn.execute("RELEASE SAVEPOINT movement")
+        except Exception as e:
+            conn.execute("ROLLBACK TO SAVEPOINT movement")
+            conn.execute("RELEASE SAVEPOINT movement")
+            self.logger.error("Error aplicando movimiento %s: %s", mov, e)
+            return False
+
+        self.stats.update(stats)
+        if packed:
+            self.stats["pack_discarded"] += self.storage.discard_many(packed)
+        self.logger.debug(
+            "FASE 3 | Movimiento aplicado | op=%s path=%s",
+            mov["op_type"],
+            mov["rel_path"],
+        )
+        copied = mov.get("size_bytes") if mov["op_type"] in {"CREATE", "MODIFY"} else 0
+        self._progress.tick(mov["op_type"].lower(), nbytes=copied or 0)
+        return True
+
+    def _apply_fs_operation(self, mov, dedup_source=None) -> Counter:
+        """
+        Aplica el movimiento en el USB. No toca la DB ni self.stats (puede correr
+        en un hilo del pool): devuelve los contadores para sumarlos al confirmar.
+        """
+        stats = Counter()
         src = self.pc_root / mov["rel_path"]
         dst = self.usb_root / mov["rel_path"]
 
         if mov["op_type"] in {"CREATE", "MODIFY"}:
-            FSOps.copy_file(src, dst)
+            if mov["op_type"] == "CREATE" and self.reconcile and self._usb_has_content(mov, dst):
+                self.logger.debug("ADOPT | %s ya está en el USB", mov["rel_path"])
+                stats["adopted_files"] += 1
+                stats["adopted_bytes"] += mov.get("size_bytes") or 0
+                return stats
+            if dedup_source is not None:
+                how = self.storage.clone(dedup_source, dst, mov["init_hash"])
+                self.logger.debug("DEDUP (%s) | %s ← %s", how, mov["rel_path"], dedup_source)
+                stats["dedup_files"] += 1
+                stats["dedup_bytes"] += mov.get("size_bytes") or 0
+                return stats
+            if self.storage.pack_small(src, dst, mov["init_hash"]):
+                stats["packed_files"] += 1
+                return stats
+            saved = self.storage.put(src, dst, mov["init_hash"])
+            if saved:
+                stats["compressed_files"] += 1
+                stats["compressed_saved_bytes"] += saved
         elif mov["op_type"] == "MOVE":
-            FSOps.move_file(src, self.usb_root / mov["new_rel_path"])
+            new_dst = self.usb_root / mov["new_rel_path"]
+            # El MOVE se hace dentro del USB. Si ya se aplicó en una ejecución
+            # cortada antes del commit del lote, no hay nada que mover; un archivo
+            # empaquetado tampoco se mueve (el paquete se indexa por init_hash)
+            if not dst.exists() and (
+                new_dst.exists()
+                or self.storage.is_packed(mov["init_hash"])
+                or (is_dir_op(mov) and self.storage.has_packs())
+            ):
+                return stats
+            FSOps.move_file(dst, new_dst)
         elif mov["op_type"] == "DELETE":
-            FSOps.delete_file(dst)
+            if is_dir_op(mov):
+                FSOps.delete_tree(dst)
+            else:
+                FSOps.delete_file(dst)
+                self.storage.discard(mov["init_hash"])
         else:
             raise ValueError(f"Operación desconocida: {mov['op_type']}")
+
+        return stats
+
+    def _usb_has_content(self, mov, dst) -> bool:
+        """Al reconciliar: True si el USB ya tiene el contenido del CREATE (tamaño, luego hash)."""
+        size = mov.get("size_bytes") or 0
+        if not self.storage.holds_content(dst, size) and not self.storage.is_packed(mov["init_hash"]):
+            return False
+        return self.storage.logical_hash(dst, mov["init_hash"]) == mov["content_hash"]
+
+    def _dedup_source(self, mov, conn, exclude=frozenset()):
+        """
+        Busca en el maestro (incluye lo ya aplicado en este lote) otra ruta con el
+        mismo content_hash cuyo contenido esté en el USB. Devuelve su Path o None.
+        Las rutas de `exclude` (las que cambian en la misma ola) no sirven de origen.
+        """
+        if mov["op_type"] not in {"CREATE", "MODIFY"}:
+            return None
+
+        size = mov.get("size_bytes") or 0
+        for rel_path in self.db.find_paths_by_content(conn, mov["content_hash"]):
+            if rel_path == mov["rel_path"] or rel_path in exclude:
+                continue
+            existing = self.usb_root / rel_path
+            if self.storage.holds_content(existing, size):
+                return existing
+
+        return None
@@ -0,0 +1,97 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from sync.database import DB
+from sync.engine import EngineSync
+from sync.meta_util import HashCache, walk_directory_metadata
+
+"""
+Sincronización de una PC contra varios USB en una sola ejecución.
+
+- FASE 1 por destino (en serie: todas escriben sobre el mismo árbol de la PC).
+- Un solo escaneo del árbol de la PC y un solo pase de hashing (HashCache
+  compartida); la detección de FASE 2 se hace contra el maestro de cada destino.
+- FASE 3 en paralelo, un carril de copia por dispositivo.
+
+Cada destino conserva su metadata.db en el USB y su propia DB + checkpoint en la
+PC (`.sync/<db>.<target_id>.db`, con target_id guardado en la DB del USB).
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class FanOutSync:
+    def __init__(
+        self,
+        pc_root: Path,
+        usb_roots: list,
+        db_name: str,
+        lanes: int | None = None,
+        **engine_kwargs,
+    ):
+        self.pc_root = pc_root.resolve()
+        self.hash_cache = HashCache()
+        self.lanes = lanes or len(usb_roots)
+        self.scan_workers = engine_kwargs.get("scan_workers", 1)
+        self.engines = []
+
+        for usb_root in usb_roots:
+            probe = DB(self.pc_root, usb_root, db_name)
+            with probe.usb_connection() as conn:
+                target_id = probe.get_target_id(conn)
+            probe.publish_usb()
+
+            stem, dot, suffix = db_name.rpartition(".")
+            pc_db_name = f"{stem}.{target_id}.{suffix}" if dot else f"{db_name}.{target_id}"
+
+            self.engines.append(
+                EngineSync(
+                    self.pc_root,
+                    usb_root,
+                    db_name,
+                    pc_db_name=pc_db_name,
+                    hash_cache=self.hash_cache,
+                    **engine_kwargs,
+                )
+            )
+
+        logger.info(
+            "FanOutSync | destinos=%d | carriles=%d",
+            len(self.engines),
+            self.lanes,
+        )
+
+    def run(self):
+        # FASE 1: en serie, cada una puede traer archivos nuevos a la PC
+        for engine in self.engines:
+            logger.info("FASE 1 | destino=%s", engine.usb_root)
+            engine.replicate_master()
+
+        # FASE 2: un escaneo compartido; los hashes se calculan una vez por archivo
+        tree = walk_directory_metadata(self.pc_root, self.scan_workers)
+        for engine in self.engines:
+            logger.info("FASE 2 | destino=%s", engine.usb_root)
+            engine.get_movements(tree=tree)
+
+        # FASE 3: un carril de copia por dispositivo
+        with ThreadPoolExecutor(max_workers=self.lanes, thread_name_prefix="usb-lane") as pool:
+            futures = {pool.submit(engine.apply_movements): engine for engine in self.engines}
+            errors = []
+            for future, engine in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error("FASE 3 fallida | destino=%s | %s", engine.usb_root, e)
+                    errors.append(engine.usb_root)
+
+        if errors:
+            raise RuntimeError(f"FASE 3 fallida en: {', '.join(map(str, errors))}")
+
+    @property
+    def stats(self):
+        total = {}
+        for engine in self.engines:
+            for k, v in engine.stats.items():
+                total[k] = total.get(k, 0) + v
+        return total
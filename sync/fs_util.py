@@ -1,3 +1,6 @@
+import hashlib
+import json
+import os
 import shutil
 import logging
 from pathlib import Path
@@ -16,6 +19,10 @@ logger = logging.getLogger("fs")
 
 
 class FSOps:
+    # Archivos a partir de este tamaño se copian en bloques reanudables
+    LARGE_FILE_THRESHOLD = 256 * 1024 * 1024
+    RESUME_CHUNK_SIZE = 8 * 1024 * 1024
+
     @staticmethod
     def ensure_parent(path: Path):
         try:
@@ -25,6 +32,15 @@ class FSOps:
             logger.exception("Error creando carpeta padre: %s", path.parent)
             raise
 
+    @staticmethod
+    def temp_path(dst: Path, suffix: str = ".partial") -> Path:
+        """
+        Temporal junto a `dst` con nombre oculto (`.<nombre><suffix>`): si una
+        copia se corta, lo que queda no aparece como archivo nuevo en el
+        escaneo de la PC (que ignora lo oculto) ni viaja al USB.
+        """
+        return dst.with_name(f".{dst.name}{suffix}")
+
     @staticmethod
     def create_file(path: Path, content: bytes):
         logger.debug("CREATE_FILE | %s (%d bytes)", path, len(content))
@@ -55,12 +71,95 @@ class FSOps:
     def copy_file(src: Path, dst: Path):
         logger.debug("COPY_FILE | %s → %s", src, dst)
         try:
+            if src.stat().st_size >= FSOps.LARGE_FILE_THRESHOLD:
+                FSOps.copy_file_resumable(src, dst)
+                return
             FSOps.ensure_parent(dst)
             shutil.copy2(src, dst)
         except Exception:
             logger.exception("Error copiando archivo: %s → %s", src, dst)
             raise
 
+    @staticmethod
+    def copy_file_resumable(src: Path, dst: Path, chunk_size: int | None = None):
+        """
+        Copia en bloques sobre `.<dst>.partial` guardando en `.<dst>.partial.json` el
+        offset y el hash SHA256 de cada bloque ya escrito. Si la copia se corta, la
+        siguiente llamada verifica los bloques que llegaron y sigue desde el último
+        bueno en lugar de reescribir el archivo entero.
+        """
+        chunk_size = chunk_size or FSOps.RESUME_CHUNK_SIZE
+        partial = FSOps.temp_path(dst)
+        progress_path = FSOps.temp_path(dst, ".partial.json")
+
+        st = src.stat()
+        source = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "chunk_size": chunk_size}
+
+        FSOps.ensure_parent(dst)
+
+        chunks = FSOps._resume_point(partial, progress_path, source)
+        offset = len(chunks) * chunk_size
+        if offset:
+            logger.info("COPY_RESUME | %s | desde offset=%d de %d", dst, offset, st.st_size)
+
+        with open(src, "rb") as fin, open(partial, "r+b" if partial.exists() else "wb") as fout:
+            fin.seek(offset)
+            fout.seek(offset)
+            fout.truncate()
+
+            while True:
+                chunk = fin.read(chunk_size)
+                if not chunk:
+                    break
+                fout.write(chunk)
+                fout.flush()
+                os.fsync(fout.fileno())
+
+                chunks.append(hashlib.sha256(chunk).hexdigest())
+                FSOps._save_progress(progress_path, {**source, "chunks": chunks})
+
+        os.replace(partial, dst)
+        shutil.copystat(src, dst)
+        progress_path.unlink(missing_ok=True)
+        logger.debug("COPY_RESUMABLE_DONE | %s → %s", src, dst)
+
+    @staticmethod
+    def _resume_point(partial: Path, progress_path: Path, source: dict) -> list:
+        """Devuelve los hashes de los bloques ya escritos que siguen siendo válidos."""
+        if not partial.exists() or not progress_path.exists():
+            return []
+
+        try:
+            progress = json.loads(progress_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            logger.warning("Progreso de copia ilegible, se reinicia: %s", progress_path)
+            return []
+
+        # Si el origen cambió o cambió el tamaño de bloque, lo parcial no sirve
+        if any(progress.get(k) != v for k, v in source.items()):
+            logger.info("Origen cambiado desde la copia parcial, se reinicia: %s", partial)
+            return []
+
+        good = []
+        chunk_size = source["chunk_size"]
+        with open(partial, "rb") as f:
+            for expected in progress.get("chunks", []):
+                chunk = f.read(chunk_size)
+                if hashlib.sha256(chunk).hexdigest() != expected:
+                    logger.warning(
+                        "Bloque %d corrupto en %s, se reanuda desde ahí", len(good), partial
+                    )
+                    break
+                good.append(expected)
+        return good
+
+    @staticmethod
+    def _save_progress(progress_path: Path, progress: dict):
+        # Escritura atómica: nunca queda un JSON a medias
+        tmp = progress_path.with_name(progress_path.name + ".tmp")
+        tmp.write_text(json.dumps(progress), encoding="utf-8")
+        os.replace(tmp, progress_path)
+
     @staticmethod
     def move_file(src: Path, dst: Path):
         logger.debug("MOVE_FILE | %s → %s", src, dst)
@@ -70,7 +169,7 @@ class FSOps:
         except OSError as e:
             # Si falla por cross-device link (diferentes filesystems), usar copia + eliminación
             if e.errno == 18:  # EXDEV - Invalid cross-device link
-                logger.info("Cross-device link detectado, usando copia + eliminación: %s → %s", src, dst)
+                logger.debug("Cross-device link detectado, usando copia + eliminación: %s → %s", src, dst)
                 shutil.copy2(src, dst)
                 src.unlink()
             else:
@@ -92,3 +191,16 @@ class FSOps:
         except Exception:
             logger.exception("Error borrando archivo: %s", path)
             raise
+
+    @staticmethod
+    def delete_tree(path: Path):
+        if not path.exists():
+            logger.debug("DELETE_TREE ignorado (no existe): %s", path)
+            return
+
+        logger.debug("DELETE_TREE | %s", path)
+        try:
+            shutil.rmtree(path)
+        except Exception:
+            logger.exception("Error borrando carpeta: %s", path)
+            raise
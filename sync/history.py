@@ -0,0 +1,255 @@
+import argparse
+import calendar
+import logging
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+"""
+Rotación y consulta de movements_history.
+
+Cada movimiento aplicado queda en movements_history para siempre. Para que la DB
+activa no crezca sin límite, los meses ya cerrados se mueven a DBs de archivo
+(`<db>.history/AAAA-MM.db`, junto a la DB) con el mismo esquema e índices por
+ruta, init_hash y applied_time. Las consultas recorren la DB activa y solo los
+archivos mensuales que caen en el rango pedido.
+
+    python -m sync.history rotate   --db .sync/metadata.db
+    python -m sync.history query    --db .sync/metadata.db --path docs/a.txt
+    python -m sync.history query    --db .sync/metadata.db --since 2026-01-01 --until 2026-02-01
+    python -m sync.history maintain --db .sync/metadata.db
+"""
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    "id",
+    "op_type",
+    "init_hash",
+    "rel_path",
+    "new_rel_path",
+    "content_hash",
+    "size_bytes",
+    "last_op_time",
+    "machine_name",
+    "applied_time",
+)
+_COLS = ", ".join(COLUMNS)
+
+# Mismo esquema que movements_history en schema.sql (sin AUTOINCREMENT: el id
+# viene de la DB activa)
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {schema}.movements_history (
+    id              INTEGER PRIMARY KEY,
+    op_type         TEXT NOT NULL,
+    init_hash       TEXT NOT NULL,
+    rel_path        TEXT,
+    new_rel_path    TEXT,
+    content_hash    TEXT,
+    size_bytes      INTEGER NOT NULL,
+    last_op_time    INTEGER NOT NULL,
+    machine_name    TEXT NOT NULL,
+    applied_time    INTEGER
+);
+CREATE INDEX IF NOT EXISTS {schema}.idx_history_rel_path ON movements_history(rel_path);
+CREATE INDEX IF NOT EXISTS {schema}.idx_history_new_rel_path ON movements_history(new_rel_path);
+CREATE INDEX IF NOT EXISTS {schema}.idx_history_init_hash ON movements_history(init_hash);
+CREATE INDEX IF NOT EXISTS {schema}.idx_history_applied_time ON movements_history(applied_time);
+"""
+
+
+def archive_dir(db_path: Path) -> Path:
+    return db_path.with_name(db_path.name + ".history")
+
+
+def _month_start(year: int, month: int) -> int:
+    return calendar.timegm((year, month, 1, 0, 0, 0))
+
+
+def _month_bounds(key: str):
+    year, month = (int(part) for part in key.split("-"))
+    start = _month_start(year, month)
+    end = _month_start(year + month // 12, month % 12 + 1)
+    return start, end
+
+
+# <======================================= ROTACIÓN =======================================>
+def rotate(conn, db_path: Path, now: float | None = None) -> dict:
+    """
+    Mueve a `<db>.history/AAAA-MM.db` las filas de meses ya cerrados (UTC).
+    Cada mes se mueve en una transacción que abarca ambas DBs: si se corta,
+    no queda nada duplicado ni perdido. Devuelve {mes: filas movidas}.
+    """
+    conn.commit()  # ATTACH no puede ir dentro de una transacción
+    now = time.time() if now is None else now
+    current = time.gmtime(now)
+    cutoff = _month_start(current.tm_year, current.tm_mon)
+
+    months = [
+        row[0]
+        for row in conn.execute(
+            """
+            SELECT DISTINCT strftime('%Y-%m', applied_time, 'unixepoch')
+            FROM movements_history
+            WHERE applied_time < ?
+            """,
+            (cutoff,),
+        )
+    ]
+    if not months:
+        return {}
+
+    target_dir = archive_dir(db_path)
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    moved = {}
+    for month in sorted(months):
+        start, end = _month_bounds(month)
+        conn.execute("ATTACH DATABASE ? AS archive", (str(target_dir / f"{month}.db"),))
+        try:
+            conn.executescript(ARCHIVE_SCHEMA.format(schema="archive"))
+            conn.execute("BEGIN")
+            conn.execute(
+                f"""
+                INSERT OR IGNORE INTO archive.movements_history ({_COLS})
+                SELECT {_COLS} FROM main.movements_history
+                WHERE applied_time >= ? AND applied_time < ?
+                """,
+                (start, end),
+            )
+            cursor = conn.execute(
+                "DELETE FROM main.movements_history WHERE applied_time >= ? AND applied_time < ?",
+                (start, end),
+            )
+            conn.commit()
+            moved[month] = cursor.rowcount
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE archive")
+
+        logger.info("Historial rotado | mes=%s | filas=%d", month, moved[month])
+
+    return moved
+
+
+def maintain(conn):
+    """ANALYZE (estadísticas para el planner) y VACUUM (devuelve espacio al disco)."""
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.execute("VACUUM")
+
+
+# <======================================= CONSULTA =======================================>
+def _sources(db_path: Path, since, until):
+    """DB activa + archivos mensuales que se solapan con [since, until)."""
+    yield db_path
+    for path in sorted(archive_dir(db_path).glob("*-*.db"), reverse=True):
+        start, end = _month_bounds(path.stem)
+        if since is not None and end <= since:
+            continue
+        if until is not None and start >= until:
+            continue
+        yield path
+
+
+def query(
+    db_path: Path,
+    rel_path: str | None = None,
+    init_hash: str | None = None,
+    since: int | None = None,
+    until: int | None = None,
+    limit: int = 100,
+) -> list:
+    """Movimientos aplicados que coinciden, del más reciente al más viejo."""
+    where, params = [], []
+    if rel_path is not None:
+        where.append("(rel_path = ? OR new_rel_path = ?)")
+        params += [rel_path, rel_path]
+    if init_hash is not None:
+        where.append("init_hash = ?")
+        params.append(init_hash)
+    if since is not None:
+        where.append("applied_time >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("applied_time < ?")
+        params.append(until)
+
+    sql = f"SELECT {_COLS} FROM movements_history"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY applied_time DESC, id DESC LIMIT ?"
+
+    rows = []
+    for path in _sources(db_path, since, until):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows.extend(conn.execute(sql, (*params, limit)).fetchall())
+        except sqlite3.OperationalError:
+            # DB activa sin historial todavía
+            continue
+        finally:
+            conn.close()
+
+    rows.sort(key=lambda r: (r[9] or 0, r[0]), reverse=True)
+    return [dict(zip(COLUMNS, row)) for row in rows[:limit]]
+
+
+# <======================================= CLI =======================================>
+def _parse_date(value: str) -> int:
+    return calendar.timegm(time.strptime(value, "%Y-%m-%d"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m sync.history", description="Historial de movimientos aplicados"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (
+        ("rotate", "Mueve los meses cerrados a <db>.history/AAAA-MM.db"),
+        ("maintain", "Rota, y luego ANALYZE + VACUUM de la DB activa"),
+        ("query", "Busca movimientos por ruta, init_hash y/o rango de fechas"),
+    ):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("--db", required=True, type=Path, help="DB con movements_history")
+
+    q = sub.choices["query"]
+    q.add_argument("--path", help="rel_path (origen o destino de un MOVE)")
+    q.add_argument("--init-hash")
+    q.add_argument("--since", type=_parse_date, help="AAAA-MM-DD (UTC, inclusive)")
+    q.add_argument("--until", type=_parse_date, help="AAAA-MM-DD (UTC, exclusivo)")
+    q.add_argument("--limit", type=int, default=100)
+
+    args = parser.parse_args(argv)
+    if not args.db.exists():
+        parser.error(f"No existe la DB: {args.db}")
+
+    start = time.perf_counter()
+
+    if args.command == "query":
+        rows = query(args.db, args.path, args.init_hash, args.since, args.until, args.limit)
+        for row in rows:
+            applied = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(row["applied_time"] or 0))
+            target = f" → {row['new_rel_path']}" if row["new_rel_path"] else ""
+            print(f"{applied}  {row['op_type']:<6} {row['rel_path']}{target}  [{row['init_hash'][:12]}]")
+        print(f"{len(rows)} filas en {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+        return
+
+    conn = sqlite3.connect(str(args.db))
+    try:
+        moved = rotate(conn, args.db)
+        for month, count in moved.items():
+            print(f"{month}: {count} filas archivadas")
+        if args.command == "maintain":
+            maintain(conn)
+            print("ANALYZE + VACUUM completados")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
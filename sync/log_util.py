@@ -0,0 +1,84 @@
+import logging
+import time
+
+"""
+Utilidades de logging fuera del camino caliente:
+- Handlers detrás de una cola (QueueHandler/QueueListener) para que la escritura
+  a archivo/stdout ocurra en un hilo aparte.
+- Progreso periódico y agregado en lugar de una línea INFO por archivo.
+"""
+
+
+# <======================================= LOGGING ASÍNCRONO =======================================>
+def start_queue_logging(handlers, level=logging.INFO):
+    """
+    Reemplaza los handlers del root logger por un QueueHandler y arranca un
+    QueueListener que los atiende en un hilo propio. Devuelve el listener,
+    que debe detenerse con .stop() al terminar para vaciar la cola.
+    """
+    import queue
+    from logging.handlers import QueueHandler, QueueListener
+
+    log_queue = queue.SimpleQueue()
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener.start()
+    return listener
+
+
+# <======================================= PROGRESO AGREGADO =======================================>
+class ProgressLogger:
+    """
+    Acumula contadores por archivo y emite como máximo una línea INFO cada
+    `interval` segundos. El detalle por archivo queda en DEBUG.
+    """
+
+    def __init__(self, logger, label: str, interval: float = 5.0, clock=time.monotonic):
+        self.logger = logger
+        self.label = label
+        self.interval = interval
+        self._clock = clock
+        self._start = clock()
+        self._last_emit = self._start
+        self.counts = {}
+        self.bytes = 0
+
+    def tick(self, key: str, n: int = 1, nbytes: int = 0):
+        self.counts[key] = self.counts.get(key, 0) + n
+        self.bytes += nbytes
+
+        now = self._clock()
+        if now - self._last_emit >= self.interval:
+            self._last_emit = now
+            self._emit("progreso", now)
+
+    def summary(self):
+        self._emit("resumen", self._clock())
+
+    def _emit(self, kind: str, now: float):
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+
+        elapsed = max(now - self._start, 1e-9)
+        total = sum(self.counts.values())
+        detail = " ".join(f"{k}={v}" for k, v in sorted(self.counts.items()))
+
+        self.logger.info(
+            "%s | %s | total=%d %s| bytes=%d | %.1f items/s | %.1fs",
+            self.label,
+            kind,
+            total,
+            f"{detail} " if detail else "",
+            self.bytes,
+            total / elapsed,
+            elapsed,
+        )
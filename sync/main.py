@@ -2,12 +2,12 @@
 
 import sys
 import argparse
-import traceback
 from pathlib import Path
 import logging
 
-from sync.engine import EngineSync
-from sync.dry_run import dry_run
+# Los imports pesados (engine → sqlite3, hashlib, shutil, socket) se difieren
+# hasta que se sabe que hay trabajo que hacer: --help o un error de argumentos
+# no deberían pagar ese costo en cada arranque del cron.
 
 logger = logging.getLogger(__name__)
 
@@ -15,19 +15,33 @@ logger = logging.getLogger(__name__)
 # =========================
 # Logging
 # =========================
-def setup_logging(log_file: Path):
+def setup_logging(log_file: Path, level=logging.INFO, async_mode: bool = False):
+    """
+    Configura file + stdout. Con async_mode los handlers se atienden desde un
+    QueueListener en un hilo aparte; se devuelve el listener para detenerlo al final.
+    """
     # Asegurar que exista la carpeta del log
     log_file.parent.mkdir(parents=True, exist_ok=True)
 
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    handlers = [
+        logging.FileHandler(log_file, encoding="utf-8"),
+        logging.StreamHandler(sys.stdout),
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    if async_mode:
+        from sync.log_util import start_queue_logging
+
+        return start_queue_logging(handlers, level)
+
     logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        handlers=[
-            logging.FileHandler(log_file, encoding="utf-8"),
-            logging.StreamHandler(sys.stdout),
-        ],
+        level=level,
+        handlers=handlers,
         force=True,  # evita configuraciones previas silenciosas
     )
+    return None
 
 
 # =========================
@@ -45,10 +59,41 @@ def check_environment(pc_root, usb_root):
         raise RuntimeError(f"USB root no existe: {usb_root}")
 
 
+# =========================
+# Varios destinos USB
+# =========================
+def run_fanout(args, engine_kwargs):
+    if args.apply_plan or args.plan_out:
+        raise RuntimeError("--plan-out/--apply-plan admiten un solo --usb-root")
+
+    from sync.fanout import FanOutSync
+
+    fanout = FanOutSync(
+        args.pc_root, args.usb_root, args.db_name, lanes=args.lanes, **engine_kwargs
+    )
+
+    if args.dry_run:
+        from sync.dry_run import dry_run
+
+        for engine in fanout.engines:
+            logger.info("Ejecutando DRY-RUN | destino=%s", engine.usb_root)
+            dry_run(engine, logger.info)
+        logger.info("DRY-RUN finalizado. No se aplicaron cambios.")
+        return
+
+    fanout.run()
+
+    logger.info("===== SYNC RESUMEN =====")
+    for k, v in sorted(fanout.stats.items()):
+        logger.info("%s: %s", k, v)
+
+    logger.info("===== SYNC FINALIZADA OK =====")
+
+
 # =========================
 # MAIN
 # =========================
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Sincronización offline USB ↔ Local (maestro + delta)"
     )
@@ -63,7 +108,8 @@ def main():
         "--usb-root",
         required=True,
         type=Path,
-        help="Directorio raíz de archivos en el USB",
+        action="append",
+        help="Directorio raíz de archivos en el USB (repetible para varios destinos)",
     )
     parser.add_argument(
         "--db-name",
@@ -82,35 +128,169 @@ def main():
         action="store_true",
         help="Simula el sync sin aplicar cambios",
     )
+    parser.add_argument(
+        "--plan-out",
+        type=Path,
+        help="Con --dry-run, guarda el plan calculado (JSON) para ejecutarlo luego",
+    )
+    parser.add_argument(
+        "--apply-plan",
+        type=Path,
+        help="Ejecuta un plan guardado con --plan-out si el estado no cambió",
+    )
+    parser.add_argument(
+        "--log-level",
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="Nivel de log (DEBUG muestra el detalle por archivo)",
+    )
+    parser.add_argument(
+        "--async-log",
+        action="store_true",
+        help="Escribe los logs desde un hilo aparte (QueueHandler/QueueListener)",
+    )
+    parser.add_argument(
+        "--progress-interval",
+        default=5.0,
+        type=float,
+        help="Segundos entre líneas de progreso agregadas",
+    )
+    parser.add_argument(
+        "--batch-size",
+        default=200,
+        type=int,
+        help="Movimientos por commit en FASE 3 (checkpoint de reanudación)",
+    )
+    parser.add_argument(
+        "--lanes",
+        type=int,
+        help="Con varios --usb-root, copias en paralelo en FASE 3 (default: uno por USB)",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Guarda comprimidos en el USB los archivos que lo valen (zlib/lzma/bz2)",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Si el contenido ya está en el USB bajo otra ruta, lo clona allí (hardlink/copia local)",
+    )
+    parser.add_argument(
+        "--tombstone-retention-days",
+        default=90,
+        type=float,
+        help="Días que se conservan los tombstones no confirmados por todas las máquinas",
+    )
+    parser.add_argument(
+        "--workers",
+        default=1,
+        type=int,
+        help="Hilos para copiar/mover/borrar en FASE 3 (mismo resultado que en serie)",
+    )
+    parser.add_argument(
+        "--pack-threshold",
+        default=0,
+        type=int,
+        help="Archivos de menos de N bytes se empaquetan en <db>.pack en el USB (0 = desactivado)",
+    )
+    parser.add_argument(
+        "--reconcile",
+        action="store_true",
+        help="Al reconstruir una DB perdida, adopta sin copiar los archivos ya iguales en PC y USB",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="FASE 2 con escaneo, hashing y escritura en la DB solapados (asyncio)",
+    )
+    parser.add_argument(
+        "--hash-workers",
+        default=4,
+        type=int,
+        help="Hilos de hashing del pipeline de FASE 2",
+    )
+    parser.add_argument(
+        "--scan-workers",
+        default=1,
+        type=int,
+        help="Hilos para listar carpetas al escanear la PC (útil en discos de red)",
+    )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    setup_logging(args.log)
+    listener = setup_logging(
+        args.log,
+        level=getattr(logging, args.log_level),
+        async_mode=args.async_log,
+    )
 
     logger.info("===== INICIO SYNC =====")
 
     try:
-        check_environment(
-            args.pc_root,
-            args.usb_root,
-        )
+        for usb_root in args.usb_root:
+            check_environment(
+                args.pc_root,
+                usb_root,
+            )
+
+        engine_kwargs = {
+            "progress_interval": args.progress_interval,
+            "batch_size": args.batch_size,
+            "compress": args.compress,
+            "dedup": args.dedup,
+            "tombstone_retention_days": args.tombstone_retention_days,
+            "workers": args.workers,
+            "pack_threshold": args.pack_threshold,
+            "reconcile": args.reconcile,
+            "pipeline": args.pipeline,
+            "hash_workers": args.hash_workers,
+            "scan_workers": args.scan_workers,
+        }
+
+        # ==================================================
+        # VARIOS USB
+        # ==================================================
+        if len(args.usb_root) > 1:
+            run_fanout(args, engine_kwargs)
+            return
+
+        from sync.engine import EngineSync
 
         # Instancia de motor
         engine = EngineSync(
             pc_root=args.pc_root,
-            usb_root=args.usb_root,
+            usb_root=args.usb_root[0],
             db_name=args.db_name,
+            **engine_kwargs,
         )
 
         # ==================================================
         # DRY-RUN
         # ==================================================
         if args.dry_run:
+            from sync.dry_run import dry_run
+
             logger.info("Ejecutando DRY-RUN")
-            dry_run(engine, logger.info)
+            plan = engine.plan()
+            dry_run(engine, logger.info, plan=plan)
+            if args.plan_out:
+                plan.save(args.plan_out)
+                logger.info("Plan guardado en %s", args.plan_out)
             logger.info("DRY-RUN finalizado. No se aplicaron cambios.")
             return
 
+        # ==================================================
+        # PLAN GUARDADO
+        # ==================================================
+        if args.apply_plan:
+            from sync.plan import SyncPlan
+
+            logger.info("Ejecutando plan guardado: %s", args.apply_plan)
+            engine.apply(SyncPlan.load(args.apply_plan))
+            logger.info("===== SYNC FINALIZADA OK =====")
+            return
+
         # -------------------------
         # FASE 1
         # -------------------------
@@ -129,14 +309,24 @@ def main():
         logger.info("FASE 3: Aplicando movimientos locales → USB")
         engine.apply_movements()
 
+        logger.info("===== SYNC RESUMEN =====")
+        for k, v in sorted(engine.stats.items()):
+            logger.info("%s: %s", k, v)
+
         logger.info("===== SYNC FINALIZADA OK =====")
 
     except Exception as e:
         logging.error("SYNC FALLIDA")
         logging.error(str(e))
+        import traceback
+
         logging.debug(traceback.format_exc())
         sys.exit(1)
 
+    finally:
+        if listener is not None:
+            listener.stop()
+
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,7 @@
 import hashlib
 import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
 logger = logging.getLogger("fs.scan")
@@ -21,42 +23,103 @@ def sha256_file(path: Path, chunk_size: int = 8192) -> str:
         raise
 
 
+# <======================================= CACHE DE HASHES =======================================>
+class HashCache:
+    """
+    Hashes ya calculados, por rel_path y válidos mientras no cambien (size, mtime).
+    Permite que planificar y ejecutar (o varias fases/destinos) compartan un solo
+    pase de hashing.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, rel_path: str, size: int, mtime) -> str | None:
+        entry = self._entries.get(rel_path)
+        if entry and entry[0] == size and entry[1] == mtime:
+            return entry[2]
+        return None
+
+    def put(self, rel_path: str, size: int, mtime, digest: str):
+        self._entries[rel_path] = (size, mtime, digest)
+
+    def __len__(self):
+        return len(self._entries)
+
+
 # <======================================= GENERAR DICCIONARIO CON METADATOS =======================================>
-def walk_directory_metadata(root: Path) -> dict[str, tuple[int, float, str | None]]:
+def walk_directory_metadata(root: Path, workers: int = 1) -> dict[str, tuple[int, int, str | None]]:
     """
     Devuelve dict:
-    CLAVE: rel_path -> VALOR: (size, mtime, hash_or_none)
+    CLAVE: rel_path -> VALOR: (size, mtime_ns, hash_or_none)
     hash_or_none: solo si es necesario más tarde. Por defecto: None
+
+    Con workers > 1 las carpetas se listan en paralelo (ver _walk_parallel). El
+    resultado va siempre ordenado por rel_path: el mismo dict, en el mismo
+    orden, con cualquier cantidad de hilos y en cualquier sistema de archivos.
     """
-    logger.info("SCAN_START | root=%s", root)
+    logger.info("SCAN_START | root=%s | workers=%d", root, workers)
 
-    snapshot = {}
-    files = 0
     try:
-        for file_path in root.rglob("*"):
-            # .rglob("*") es un método recursivo que busca todos los elementos (archivos y subdirectorios). Es equivalente a glob("**/*", recursive=True), pero usando el estilo de pathlib.
-            if file_path.is_file():
-                # Excluir directorios ocultos de sincronización
-                if any(part.startswith('.') for part in file_path.parts):
-                    logger.debug("Ignorando archivo oculto: %s", file_path)
-                    continue
-                    
-                # .is_file(): Filtra solo los archivos reales (excluye directorios, enlaces simbólicos que apunten a directorios, etc.). Ignora carpetas vacías o subdirectorios.
-                rel_path = str(
-                    file_path.relative_to(root).as_posix()
-                )  # .relative_to(root) → devuelve un Path relativo (ej. sub/carpeta/archivo.txt). y .as_posix() → convierte a string usando barras / (formato POSIX), incluso en Windows. Esto asegura que el snapshot sea portable entre sistemas operativos.
-                stat = file_path.stat()  # .stat obtiene metadatos del archivo
-                snapshot[rel_path] = (
-                    stat.st_size,
-                    stat.st_mtime,
-                    None,
-                )  # hash calculado bajo demanda
-
-                files += 1
+        if workers > 1:
+            files = _walk_parallel(root, workers)
+        else:
+            files = []
+            pending = [""]
+            while pending:
+                found, subdirs = scan_directory(root, pending.pop())
+                files.extend(found)
+                pending.extend(subdirs)
     except Exception:
         logger.exception("Error escaneando directorio: %s", root)
         raise
 
-    logger.info("SCAN_DONE | root=%s | files=%d", root, files)
+    files.sort()
+    snapshot = {
+        # precisión completa del mtime (ver sync/time_util.py); hash calculado bajo demanda
+        rel_path: (size, mtime_ns, None)
+        for rel_path, size, mtime_ns in files
+    }
+
+    logger.info("SCAN_DONE | root=%s | files=%d", root, len(snapshot))
 
     return snapshot
+
+
+def _walk_parallel(root: Path, workers: int) -> list:
+    """
+    Cada carpeta es una tarea del pool: el hilo que la lista encola sus
+    subcarpetas y cualquier hilo libre toma la siguiente, así una rama ancha o
+    lenta no deja a los demás esperando. En discos de red o USB lentos lo que
+    domina es la latencia de cada scandir/stat, que se solapa entre hilos.
+    """
+    files = []
+    with ThreadPoolExecutor(workers, thread_name_prefix="scan") as pool:
+        pending = {pool.submit(scan_directory, root, "")}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                found, subdirs = future.result()
+                files.extend(found)
+                pending.update(pool.submit(scan_directory, root, d) for d in subdirs)
+    return files
+
+
+def scan_directory(root: Path, rel_dir: str = "") -> tuple[list, list]:
+    """
+    Un nivel del árbol, con las mismas reglas que walk_directory_metadata:
+    ([(rel_path, size, mtime_ns)], [rel_dir de cada subcarpeta]). Ignora lo
+    oculto y no entra en enlaces simbólicos a carpetas.
+    """
+    files, subdirs = [], []
+    prefix = f"{rel_dir}/" if rel_dir else ""
+    with os.scandir(root / rel_dir if rel_dir else root) as it:
+        for entry in it:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(prefix + entry.name)
+            elif entry.is_file():
+                stat = entry.stat()
+                files.append((prefix + entry.name, stat.st_size, stat.st_mtime_ns))
+    return files, subdirs
@@ -0,0 +1,159 @@
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from sync.fs_util import FSOps
+
+"""
+Paquete de archivos chicos en el USB.
+
+En FAT/exFAT copiar decenas de miles de archivos de pocos KB cuesta sobre todo
+las actualizaciones de directorio y de FAT de cada archivo, no los datos. En
+modo empaquetado los archivos por debajo de un umbral se guardan como BLOB en
+una DB SQLite junto a la DB del USB (`<db>.pack`), indexados por init_hash:
+
+    - Muchos archivos por transacción: una sola escritura de metadatos del FS
+      por lote en lugar de una (o varias) por archivo.
+    - Un MOVE no toca el paquete: init_hash no cambia al mover ni al renombrar.
+    - Un MODIFY reemplaza el BLOB; si el archivo crece por encima del umbral
+      pasa a ser un archivo normal y el BLOB se descarta.
+    - Un DELETE (de archivo o de carpeta) descarta los BLOB de lo que borró.
+
+La FASE 1 desempaqueta en la PC (UsbStorage.get busca el init_hash si la ruta
+no existe en el USB), aunque esta PC no tenga el modo activado.
+"""
+
+logger = logging.getLogger("fs.pack")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packed_files (
+    init_hash   TEXT PRIMARY KEY,
+    size_bytes  INTEGER NOT NULL,
+    mtime_ns    INTEGER,
+    data        BLOB NOT NULL
+);
+"""
+
+
+def pack_path(usb_db_path: Path) -> Path:
+    return usb_db_path.with_name(usb_db_path.name + ".pack")
+
+
+class PackStore:
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn = None
+        # La FASE 3 escribe desde varios hilos: una conexión compartida, en serie
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return self._conn is not None or self.path.exists()
+
+    def _connection(self, create: bool):
+        if self._conn is None:
+            if not create and not self.path.exists():
+                return None
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            # FAT/exFAT no soportan el mmap de WAL: journal clásico
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    # <======================================= ESCRITURA =======================================>
+    def put(self, init_hash: str, src: Path):
+        """Guarda el contenido de src bajo init_hash (dentro de la transacción en curso)."""
+        st = src.stat()
+        data = src.read_bytes()
+        with self._lock:
+            self._connection(create=True).execute(
+                "INSERT OR REPLACE INTO packed_files VALUES (?, ?, ?, ?)",
+                (init_hash, len(data), st.st_mtime_ns, data),
+            )
+        logger.debug("PACK | %s → %s (%d bytes)", src, init_hash, len(data))
+
+    def discard(self, init_hash: str) -> bool:
+        with self._lock:
+            conn = self._connection(create=False)
+            if conn is None:
+                return False
+            cursor = conn.execute("DELETE FROM packed_files WHERE init_hash = ?", (init_hash,))
+        return cursor.rowcount > 0
+
+    def discard_many(self, init_hashes) -> int:
+        """DELETE de carpeta: descarta los BLOB de los archivos que contenía."""
+        with self._lock:
+            conn = self._connection(create=False)
+            if conn is None:
+                return 0
+            cursor = conn.executemany(
+                "DELETE FROM packed_files WHERE init_hash = ?", [(h,) for h in init_hashes]
+            )
+        return cursor.rowcount
+
+    def flush(self):
+        """Confirma lo escrito. Va antes del commit de la DB de metadatos."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+
+    # <======================================= LECTURA =======================================>
+    def contains(self, init_hash: str) -> bool:
+        with self._lock:
+            conn = self._connection(create=False)
+            if conn is None:
+                return False
+            row = conn.execute(
+                "SELECT 1 FROM packed_files WHERE init_hash = ?", (init_hash,)
+            ).fetchone()
+        return row is not None
+
+    def read(self, init_hash: str) -> bytes | None:
+        with self._lock:
+            conn = self._connection(create=False)
+            if conn is None:
+                return None
+            row = conn.execute(
+                "SELECT data FROM packed_files WHERE init_hash = ?", (init_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get(self, init_hash: str, dst: Path) -> bool:
+        """Escribe en dst el archivo empaquetado. Devuelve False si no está."""
+        with self._lock:
+            conn = self._connection(create=False)
+            row = None
+            if conn is not None:
+                row = conn.execute(
+                    "SELECT data, mtime_ns FROM packed_files WHERE init_hash = ?", (init_hash,)
+                ).fetchone()
+        if row is None:
+            return False
+
+        data, mtime_ns = row
+        logger.debug("UNPACK | %s → %s (%d bytes)", init_hash, dst, len(data))
+        FSOps.ensure_parent(dst)
+        tmp = FSOps.temp_path(dst)
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, dst)
+            if mtime_ns is not None:
+                os.utime(dst, ns=(mtime_ns, mtime_ns))
+        except Exception:
+            logger.exception("Error desempaquetando: %s → %s", init_hash, dst)
+            tmp.unlink(missing_ok=True)
+            raise
+        return True
+
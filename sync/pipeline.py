@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from sync.meta_util import scan_directory, sha256_file
+from sync.time_util import same_mtime
+
+"""
+Pipeline asíncrono de la FASE 2: escaneo, hashing y escritura en la DB a la vez.
+
+En modo serie la FASE 2 recorre todo el árbol (latencia de stat), después
+hashea uno por uno (CPU y lectura de disco) y recién al final escribe los
+movimientos. Acá cada etapa es una tarea asyncio y las llamadas bloqueantes
+(os.scandir, hashlib, sqlite3) van a hilos:
+
+    escáner ──cola acotada──▶ N hashers ──▶ HashCache
+                                              │
+                          (árbol completo) planificación ──cola acotada──▶ escritor DB
+
+    - El escáner lista carpetas en hilos (scan_workers a la vez) y encola los
+      archivos que la FASE 2 va a tener que hashear (nuevos o con otro
+      tamaño/mtime) mientras sigue recorriendo.
+    - Los hashers consumen la cola en paralelo. Si se atrasan, la cola llena
+      frena al escáner: en memoria hay a lo sumo `queue_size` archivos en vuelo.
+    - La clasificación (MOVE, identidad por ruta, carpetas colapsadas) necesita
+      el árbol completo: corre después, con todos los hashes ya en la caché, y
+      da exactamente los mismos movimientos que en serie.
+    - Un solo escritor, con su propio hilo y su conexión, escribe los
+      movimientos en el staging por lotes.
+
+La copia al USB no se adelanta: un archivo nuevo puede terminar siendo un MOVE
+según lo que aparezca más tarde en el escaneo. La FASE 3 ya solapa sus
+operaciones de FS con --workers.
+"""
+
+logger = logging.getLogger("fs.pipeline")
+
+QUEUE_SIZE = 256
+WRITE_BATCH = 500
+
+_DONE = object()
+
+
+class Phase2Pipeline:
+    def __init__(self, engine, hashers: int = 4, queue_size: int = QUEUE_SIZE):
+        self.engine = engine
+        self.root = engine.pc_root
+        self.hashers = max(1, hashers)
+        self.queue_size = max(1, queue_size)
+
+    def run(self, master) -> int:
+        """Detecta y registra los movimientos de la PC. Devuelve cuántos escribió."""
+        return asyncio.run(self._run(master))
+
+    async def _run(self, master):
+        paths_index = {m["rel_path"]: m for m in master}
+        tree = {}
+        hash_queue = asyncio.Queue(self.queue_size)
+
+        hashers = [asyncio.create_task(self._hasher(hash_queue)) for _ in range(self.hashers)]
+        scanner = asyncio.create_task(self._scan(paths_index, tree, hash_queue))
+        await _gather_or_cancel([scanner, *hashers])
+
+        # Mismo orden para cualquier cantidad de hashers
+        tree = dict(sorted(tree.items()))
+        logger.info("PIPELINE | escaneo y hashing listos | files=%d", len(tree))
+        movements = self.engine._plan_movements(tree, master)
+        return await self._write(movements)
+
+    # <======================================= ESCÁNER =======================================>
+    async def _scan(self, paths_index, tree, hash_queue):
+        granularity = self.engine.mtime_granularity_ns
+        pending = [""]
+        # Hasta scan_workers carpetas listándose a la vez (ver walk_directory_metadata)
+        running = set()
+        try:
+            while pending or running:
+                while pending and len(running) < self.engine.scan_workers:
+                    rel_dir = pending.pop()
+                    running.add(
+                        asyncio.create_task(asyncio.to_thread(scan_directory, self.root, rel_dir))
+                    )
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    files, subdirs = task.result()
+                    pending.extend(subdirs)
+                    for rel_path, size, mtime in files:
+                        tree[rel_path] = (size, mtime, None)
+                        db_entry = paths_index.get(rel_path)
+                        if (
+                            db_entry
+                            and db_entry["size_bytes"] == size
+                            and same_mtime(db_entry["last_op_time"], mtime, granularity)
+                        ):
+                            continue
+                        # Nuevo o cambiado: la clasificación va a necesitar su hash
+                        await hash_queue.put((rel_path, size, mtime))
+        finally:
+            for task in running:
+                task.cancel()
+
+        for _ in range(self.hashers):
+            await hash_queue.put(_DONE)
+
+    # <======================================= HASHERS =======================================>
+    async def _hasher(self, hash_queue):
+        cache = self.engine.hash_cache
+        while True:
+            item = await hash_queue.get()
+            if item is _DONE:
+                return
+            rel_path, size, mtime = item
+            if cache.get(rel_path, size, mtime) is not None:
+                continue
+            digest = await asyncio.to_thread(sha256_file, self.root / rel_path)
+            cache.put(rel_path, size, mtime, digest)
+
+    # <======================================= ESCRITOR DB =======================================>
+    async def _write(self, movements):
+        """Productor (el plan) y un único escritor con su hilo y su conexión a SQLite."""
+        write_queue = asyncio.Queue(self.queue_size)
+
+        async def produce():
+            for mov in movements:
+                await write_queue.put(mov)
+            await write_queue.put(_DONE)
+
+        with ThreadPoolExecutor(1, thread_name_prefix="db-writer") as db_thread:
+            writer = asyncio.create_task(self._writer(write_queue, db_thread))
+            await _gather_or_cancel([asyncio.create_task(produce()), writer])
+        return writer.result()
+
+    async def _writer(self, write_queue, db_thread):
+        loop = asyncio.get_running_loop()
+        db = self.engine.db
+        conn = await loop.run_in_executor(db_thread, db.get_db_connection, db.temp_path)
+        written = 0
+        try:
+            batch = []
+            while True:
+                mov = await write_queue.get()
+                if mov is not _DONE:
+                    batch.append(mov)
+                if batch and (mov is _DONE or len(batch) >= WRITE_BATCH):
+                    await loop.run_in_executor(db_thread, self._write_batch, conn, batch)
+                    written += len(batch)
+                    batch = []
+                if mov is _DONE:
+                    return written
+        finally:
+            await loop.run_in_executor(db_thread, conn.close)
+
+    def _write_batch(self, conn, batch):
+        for mov in batch:
+            self.engine.db.upsert_movement(conn, mov)
+        conn.commit()
+
+
+async def _gather_or_cancel(tasks):
+    """Espera todas las tareas; si una falla, cancela el resto (nadie queda bloqueado en una cola)."""
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
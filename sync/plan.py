@@ -0,0 +1,94 @@
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+
+"""
+SyncPlan: resultado serializable de planificar una sincronización.
+
+Lo produce EngineSync.plan() con un solo escaneo + hashing, lo renderiza dry_run
+y lo puede ejecutar EngineSync.apply() después de verificar que el estado no
+cambió desde que se planificó (huella de maestros, movimientos y árbol local).
+"""
+
+PLAN_VERSION = 1
+
+# Operaciones de FASE 1 sobre la PC
+COPY_TO_PC = "COPY_TO_PC"
+UPDATE_PC = "UPDATE_PC"
+MOVE_PC = "MOVE_PC"
+DELETE_PC = "DELETE_PC"
+# La PC ya tiene el mismo contenido: solo se registra, sin copiar (--reconcile)
+ADOPT_PC = "ADOPT_PC"
+
+# Modos de FASE 1 (mismas ramas que replicate_master)
+MODE_INITIALIZE = "initialize"
+MODE_SKIP = "skip"
+MODE_INITIAL_COPY = "initial_copy"
+MODE_SYNC = "sync"
+
+
+class StalePlanError(RuntimeError):
+    """El estado de PC/USB cambió desde que se calculó el plan."""
+
+
+@dataclass
+class SyncPlan:
+    mode: str
+    # FASE 1: operaciones USB → PC
+    replication: list = field(default_factory=list)
+    # FASE 2: movimientos detectados (con hashes), listos para la FASE 3
+    movements: list = field(default_factory=list)
+    # DB donde se registran los movimientos nuevos ("pc" al inicializar, si no "temp")
+    movements_db: str = "temp"
+    # Movimientos que ya estaban pendientes en la DB y también aplicará la FASE 3
+    pending: list = field(default_factory=list)
+    fingerprint: dict = field(default_factory=dict)
+    machine_name: str = ""
+    pc_root: str = ""
+    usb_root: str = ""
+    created_at: float = field(default_factory=time.time)
+    version: int = PLAN_VERSION
+
+    # <======================================= RESUMEN =======================================>
+    def summary(self) -> Counter:
+        """Cantidad de operaciones por tipo y bytes a transferir en cada sentido."""
+        stats = Counter()
+        for op in self.replication:
+            stats[op["op_type"].lower()] += 1
+            if op["op_type"] in {COPY_TO_PC, UPDATE_PC}:
+                stats["bytes_usb_to_pc"] += op.get("size_bytes") or 0
+            elif op["op_type"] == ADOPT_PC:
+                stats["bytes_adopted"] += op.get("size_bytes") or 0
+        for mov in [*self.pending, *self.movements]:
+            stats[mov["op_type"].lower()] += 1
+            if mov["op_type"] in {"CREATE", "MODIFY"}:
+                stats["bytes_pc_to_usb"] += mov.get("size_bytes") or 0
+        return stats
+
+    def is_empty(self) -> bool:
+        return not (self.replication or self.movements or self.pending)
+
+    # <======================================= SERIALIZACIÓN =======================================>
+    def to_dict(self) -> dict:
+        data = {f.name: getattr(self, f.name) for f in fields(self)}
+        # Los records (StateRecord, MovementRecord) se guardan como dicts planos
+        for key in ("replication", "movements", "pending"):
+            data[key] = [dict(item) for item in data[key]]
+        data["fingerprint"] = dict(self.fingerprint)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SyncPlan":
+        if data.get("version") != PLAN_VERSION:
+            raise ValueError(f"Versión de plan no soportada: {data.get('version')}")
+        return cls(**data)
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=1), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> "SyncPlan":
+        return cls.from_dict(json.loads(path.read_text(encoding="utf-8")))
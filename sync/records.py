@@ -0,0 +1,142 @@
+import sys
+
+"""
+Registros compactos para filas de master_states, movements y tombstones.
+
+Con millones de filas en memoria (paths_index, hash_index, pc_index, usb_index)
+un dict por fila cuesta varios cientos de bytes. Estas clases usan __slots__ y
+mantienen el acceso por clave (row["rel_path"], row.get(...), dict(row)) para
+que el resto del código y los tests que usan dicts sigan funcionando igual.
+"""
+
+
+class _Record:
+    __slots__ = ()
+    _fields: tuple = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self._fields, values, strict=True):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_mapping(cls, data):
+        return cls(*(data.get(name) for name in cls._fields))
+
+    # ---------- acceso tipo dict ----------
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def get(self, key, default=None):
+        if key not in self._fields:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def items(self):
+        return tuple(zip(self._fields, self.values()))
+
+    def _asdict(self):
+        return dict(self.items())
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __eq__(self, other):
+        if isinstance(other, _Record):
+            return type(self) is type(other) and self.values() == other.values()
+        if isinstance(other, dict):
+            return self._asdict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        body = ", ".join(f"{k}={v!r}" for k, v in self.items())
+        return f"{type(self).__name__}({body})"
+
+
+class StateRecord(_Record):
+    __slots__ = (
+        "init_hash",
+        "rel_path",
+        "content_hash",
+        "size_bytes",
+        "last_op_time",
+        "machine_name",
+    )
+    _fields = __slots__
+
+    @classmethod
+    def from_row(cls, row):
+        init_hash, rel_path, content_hash, size_bytes, last_op_time, machine_name = row
+        # init_hash == content_hash en todo archivo que nunca se modificó:
+        # se comparte el mismo objeto str en lugar de guardar dos copias
+        if content_hash == init_hash:
+            content_hash = init_hash
+        return cls(
+            init_hash,
+            rel_path,
+            content_hash,
+            size_bytes,
+            last_op_time,
+            sys.intern(machine_name),
+        )
+
+
+class MovementRecord(_Record):
+    __slots__ = (
+        "id",
+        "op_type",
+        "init_hash",
+        "rel_path",
+        "new_rel_path",
+        "content_hash",
+        "size_bytes",
+        "last_op_time",
+        "machine_name",
+    )
+    _fields = __slots__
+
+    @classmethod
+    def from_row(cls, row):
+        values = list(row)
+        values[1] = sys.intern(values[1])  # op_type
+        values[8] = sys.intern(values[8])  # machine_name
+        return cls(*values)
+
+
+class TombstoneRecord(_Record):
+    __slots__ = (
+        "init_hash",
+        "content_hash",
+        "deleted_at",
+        "machine_name",
+        "seq",
+    )
+    _fields = __slots__
+
+    @classmethod
+    def from_row(cls, row):
+        init_hash, content_hash, deleted_at, machine_name, seq = row
+        if content_hash == init_hash:
+            content_hash = init_hash
+        return cls(init_hash, content_hash, deleted_at, sys.intern(machine_name), seq)
@@ -0,0 +1,186 @@
+import heapq
+import os
+from itertools import islice
+from pathlib import Path, PurePosixPath
+
+from sync.domain import is_dir_op
+
+"""
+Orden de E/S de las operaciones pendientes.
+
+El orden de detección (id) o el de rel_path saltan de carpeta en carpeta y de
+inodo en inodo, y en discos mecánicos / FAT cada salto cuesta un seek. IOScheduler
+reordena una ventana de operaciones por localidad:
+
+    1. Operaciones sin transferencia (MOVE / DELETE): solo metadatos
+    2. Archivos chicos, agrupados por carpeta y número de inodo de origen
+    3. Archivos grandes (streams largos), también por carpeta e inodo
+
+sin romper dependencias: dos operaciones que tocan la misma ruta (rel_path o
+new_rel_path) o el mismo init_hash conservan su orden relativo original, y lo
+mismo un archivo y otro que cuelga de una carpeta con su nombre (`docs` y
+`docs/a.txt`). Una operación de carpeta (rel_path terminado en "/") es una
+barrera: nada se adelanta ni se atrasa respecto de ella.
+
+`waves` parte la ventana en olas: cada ola solo depende de las anteriores, así
+sus operaciones no comparten ninguna ruta y pueden correr en paralelo dando el
+mismo resultado que aplicarlas en serie.
+"""
+
+SMALL_FILE_LIMIT = 1024 * 1024  # 1 MiB
+
+_TRANSFER_OPS = {"CREATE", "MODIFY", "COPY_TO_PC", "UPDATE_PC"}
+
+
+class IOScheduler:
+    def __init__(
+        self,
+        source_root: Path | None = None,
+        small_file_limit: int = SMALL_FILE_LIMIT,
+        content_dependencies: bool = False,
+    ):
+        # Raíz desde donde se leen los archivos a copiar (para el número de inodo)
+        self.source_root = source_root
+        self.small_file_limit = small_file_limit
+        # Con dedup, todo lo que toca un mismo contenido va en serie: la segunda
+        # copia se clona de la primera en lugar de viajar desde el origen, y un
+        # MOVE/DELETE del archivo que sirve de origen no se cruza con el clon
+        self.content_dependencies = content_dependencies
+
+    # <======================================= CLAVE DE LOCALIDAD =======================================>
+    def locality_key(self, op) -> tuple:
+        rel_path = op["rel_path"] or ""
+        parent = str(PurePosixPath(rel_path).parent)
+
+        if op["op_type"] not in _TRANSFER_OPS:
+            return (0, parent, 0, rel_path)
+
+        size = op.get("size_bytes") or 0
+        size_class = 1 if size < self.small_file_limit else 2
+        return (size_class, parent, self._inode(rel_path), rel_path)
+
+    def _inode(self, rel_path) -> int:
+        # El inodo aproxima la posición física en ext4/NTFS; en FAT es el cluster
+        # inicial. Si no se puede leer, el orden queda por carpeta y nombre
+        if self.source_root is None:
+            return 0
+        try:
+            return os.stat(self.source_root / rel_path).st_ino
+        except OSError:
+            return 0
+
+    # <======================================= DEPENDENCIAS =======================================>
+    def _parents(self, ops) -> list:
+        """Para cada operación, los índices de las anteriores que deben ir antes."""
+        parents_of = []
+        # Por recurso: último que lo tomó en exclusiva y los que lo comparten desde entonces
+        last_writer = {}
+        readers = {}
+        barrier = None
+        since_barrier = []
+
+        for i, op in enumerate(ops):
+            if is_dir_op(op):
+                # Depende de todo lo anterior desde la última barrera
+                parents = set(since_barrier)
+                if barrier is not None:
+                    parents.add(barrier)
+                barrier, since_barrier = i, []
+                last_writer.clear()
+                readers.clear()
+            else:
+                parents = {barrier} if barrier is not None else set()
+                for resource, exclusive in self._resources(op):
+                    prev = last_writer.get(resource)
+                    if prev is not None:
+                        parents.add(prev)
+                    if exclusive:
+                        parents.update(readers.pop(resource, ()))
+                        last_writer[resource] = i
+                    else:
+                        readers.setdefault(resource, []).append(i)
+                since_barrier.append(i)
+            parents.discard(i)
+            parents_of.append(parents)
+
+        return parents_of
+
+    def _resources(self, op):
+        """(recurso, exclusivo). Las carpetas padre se comparten: dos archivos de
+        la misma carpeta no se esperan, pero un archivo `docs` y `docs/a.txt` sí."""
+        for path in (op["rel_path"], op.get("new_rel_path")):
+            if not path:
+                continue
+            yield ("path", path), True
+            for parent in PurePosixPath(path).parents:
+                if str(parent) != ".":
+                    yield ("path", str(parent)), False
+        if op.get("init_hash"):
+            yield ("init_hash", op["init_hash"]), True
+        # Con dedup un clon lee otra ruta con el mismo contenido: va después de
+        # lo que copia ese contenido y de lo que lo mueve o lo borra
+        if self.content_dependencies and op.get("content_hash"):
+            yield ("content", op["content_hash"]), True
+
+    # <======================================= ORDEN =======================================>
+    def order(self, ops) -> list:
+        """Orden topológico (Kahn) de `ops` priorizando la clave de localidad."""
+        ops = list(ops)
+        if len(ops) < 2:
+            return ops
+
+        children = [[] for _ in ops]
+        pending_parents = [0] * len(ops)
+        for i, parents in enumerate(self._parents(ops)):
+            for p in parents:
+                children[p].append(i)
+            pending_parents[i] = len(parents)
+
+        keys = [self.locality_key(op) for op in ops]
+        ready = [(keys[i], i) for i in range(len(ops)) if pending_parents[i] == 0]
+        heapq.heapify(ready)
+
+        result = []
+        while ready:
+            _, i = heapq.heappop(ready)
+            result.append(ops[i])
+            for child in children[i]:
+                pending_parents[child] -= 1
+                if pending_parents[child] == 0:
+                    heapq.heappush(ready, (keys[child], child))
+
+        return result
+
+    def waves(self, ops) -> list:
+        """
+        Olas de operaciones independientes: una operación cae en la ola siguiente
+        a la de su dependencia más tardía. Cada ola va ordenada por localidad.
+        """
+        ops = list(ops)
+        level = []
+        for parents in self._parents(ops):
+            level.append(1 + max((level[p] for p in parents), default=-1))
+
+        waves = [[] for _ in range(max(level, default=-1) + 1)]
+        for i, op in enumerate(ops):
+            waves[level[i]].append(op)
+        return [sorted(wave, key=self.locality_key) for wave in waves]
+
+    def stream(self, ops, window: int):
+        """Reordena un iterable por ventanas de `window` operaciones (memoria acotada)."""
+        for chunk in self._windows(ops, window):
+            yield from self.order(chunk)
+
+    def stream_waves(self, ops, window: int):
+        """Como `stream`, pero entrega las olas de cada ventana."""
+        for chunk in self._windows(ops, window):
+            yield from self.waves(chunk)
+
+    @staticmethod
+    def _windows(ops, window: int):
+        it = iter(ops)
+        while True:
+            chunk = list(islice(it, max(1, window)))
+            if not chunk:
+                return
+            yield chunk
@@ -12,6 +12,8 @@ CREATE TABLE IF NOT EXISTS master_states (
     machine_name   TEXT NOT NULL
 );
 
+CREATE INDEX IF NOT EXISTS idx_master_states_content_hash ON master_states(content_hash);
+
 -- ===============================
 -- Tombstones (borrados)
 -- ===============================
@@ -19,7 +21,36 @@ CREATE TABLE IF NOT EXISTS tombstones (
     init_hash       TEXT PRIMARY KEY,
     content_hash    TEXT NOT NULL,
     deleted_at      INTEGER NOT NULL,
-    machine_name    TEXT NOT NULL
+    machine_name    TEXT NOT NULL,
+    seq             INTEGER
+);
+
+-- deleted_at (reloj de la máquina que borró) solo para la retención
+CREATE INDEX IF NOT EXISTS idx_tombstones_deleted_at ON tombstones(deleted_at);
+CREATE INDEX IF NOT EXISTS idx_tombstones_seq ON tombstones(seq);
+
+-- seq: orden de llegada a esta DB, asignado al insertar. Marcas, confirmaciones
+-- y compactación usan seq: un tombstone que llega tarde (o de una máquina con
+-- el reloj atrasado) queda después de lo ya procesado. El contador vive en
+-- sync_meta para no reutilizar números al compactar
+CREATE TRIGGER IF NOT EXISTS tombstones_seq
+AFTER INSERT ON tombstones
+WHEN NEW.seq IS NULL
+BEGIN
+    INSERT INTO sync_meta (key, value) VALUES ('tombstones_seq', 1)
+    ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1;
+    UPDATE tombstones
+    SET seq = (SELECT CAST(value AS INTEGER) FROM sync_meta WHERE key = 'tombstones_seq')
+    WHERE rowid = NEW.rowid;
+END;
+
+-- ===============================
+-- Confirmación de tombstones por máquina
+-- ===============================
+CREATE TABLE IF NOT EXISTS tombstone_acks (
+    machine_name    TEXT PRIMARY KEY,
+    last_seen       INTEGER NOT NULL,
+    acked_at        INTEGER NOT NULL
 );
 
 -- ===============================
@@ -44,6 +75,8 @@ CREATE TABLE IF NOT EXISTS movements (
     )
 );  
 
+CREATE INDEX IF NOT EXISTS idx_movements_init_hash ON movements(init_hash);
+
 -- ===============================
 -- Archivo histórico
 -- ===============================
@@ -59,3 +92,41 @@ CREATE TABLE IF NOT EXISTS movements_history (
     machine_name    TEXT NOT NULL,
     applied_time    INTEGER
 );
+
+-- Auditoría por ruta, identidad y rango de tiempo (ver sync/history.py)
+CREATE INDEX IF NOT EXISTS idx_history_rel_path ON movements_history(rel_path);
+CREATE INDEX IF NOT EXISTS idx_history_new_rel_path ON movements_history(new_rel_path);
+CREATE INDEX IF NOT EXISTS idx_history_init_hash ON movements_history(init_hash);
+CREATE INDEX IF NOT EXISTS idx_history_applied_time ON movements_history(applied_time);
+
+-- ===============================
+-- Checkpoints de FASE 3 (reanudación)
+-- ===============================
+CREATE TABLE IF NOT EXISTS sync_checkpoints (
+    name                TEXT PRIMARY KEY,
+    last_movement_id    INTEGER,
+    applied             INTEGER NOT NULL,
+    updated_at          INTEGER NOT NULL
+);
+
+-- ===============================
+-- Metadatos de la DB (id del destino USB, etc.)
+-- ===============================
+CREATE TABLE IF NOT EXISTS sync_meta (
+    key     TEXT PRIMARY KEY,
+    value   TEXT NOT NULL
+);
+
+-- ===============================
+-- Verificación por muestreo (ver sync/verify.py)
+-- ===============================
+-- Última verificación de cada archivo, por lado (usb / pc): cada corrida
+-- empieza por lo nunca verificado y lo verificado hace más tiempo
+CREATE TABLE IF NOT EXISTS verify_state (
+    side            TEXT NOT NULL,
+    rel_path        TEXT NOT NULL,
+    content_hash    TEXT,
+    verified_at     INTEGER NOT NULL,
+    ok              INTEGER NOT NULL,
+    PRIMARY KEY (side, rel_path)
+);
@@ -0,0 +1,306 @@
+import bz2
+import hashlib
+import logging
+import lzma
+import os
+import shutil
+import struct
+import zlib
+from pathlib import Path
+
+from sync.fs_util import FSOps
+
+"""
+Almacenamiento de archivos en el USB.
+
+El engine decide qué hacer; UsbStorage decide cómo quedan los bytes en el USB.
+Por defecto es una copia directa (FSOps.copy_file). En modo comprimido, los
+archivos elegibles se guardan con una cabecera propia + stream zlib/lzma/bz2,
+con el mismo nombre, así MOVE/DELETE no cambian. Al leer de vuelta (FASE 1) la
+cabecera se detecta siempre, aunque esta PC no tenga el modo activado.
+
+master_states sigue guardando el content_hash y el tamaño lógicos (del archivo
+sin comprimir), así la detección de cambios no se ve afectada.
+
+Con un PackStore y un umbral, los archivos chicos van empaquetados (ver
+sync/pack_store.py) en lugar de como archivos sueltos.
+"""
+
+logger = logging.getLogger("fs.storage")
+
+# MAGIC + codec (1 byte) + nivel (1 byte) + tamaño lógico (8 bytes)
+MAGIC = b"SYNCZ\x01"
+HEADER = struct.Struct(">6scBQ")
+
+CODEC_ZLIB = b"z"
+CODEC_LZMA = b"x"
+CODEC_BZ2 = b"b"
+
+# Codec y nivel por extensión. Lo no listado usa DEFAULT_CODEC (si pasa la sonda).
+CODEC_BY_EXTENSION = {
+    ".txt": (CODEC_ZLIB, 6),
+    ".csv": (CODEC_ZLIB, 6),
+    ".tsv": (CODEC_ZLIB, 6),
+    ".log": (CODEC_ZLIB, 6),
+    ".md": (CODEC_ZLIB, 6),
+    ".py": (CODEC_ZLIB, 6),
+    ".html": (CODEC_ZLIB, 6),
+    ".json": (CODEC_LZMA, 1),
+    ".xml": (CODEC_LZMA, 1),
+    ".sql": (CODEC_LZMA, 1),
+    ".svg": (CODEC_BZ2, 9),
+}
+DEFAULT_CODEC = (CODEC_ZLIB, 3)
+
+# Formatos que ya vienen comprimidos: ni se prueba
+SKIP_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".xz", ".bz2", ".7z", ".rar", ".zst", ".lz4",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".mp4", ".mkv", ".avi", ".mov", ".ogg", ".flac", ".m4a",
+    ".pdf", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".jar", ".apk",
+}
+
+MIN_COMPRESS_SIZE = 512  # por debajo, la cabecera no compensa
+PROBE_SIZE = 64 * 1024
+PROBE_MAX_RATIO = 0.9  # si la muestra no baja de 90 %, no vale la pena
+STREAM_CHUNK = 1024 * 1024
+
+
+def _compressor(codec: bytes, level: int):
+    if codec == CODEC_ZLIB:
+        return zlib.compressobj(level)
+    if codec == CODEC_LZMA:
+        return lzma.LZMACompressor(preset=level)
+    if codec == CODEC_BZ2:
+        return bz2.BZ2Compressor(level)
+    raise ValueError(f"Codec desconocido: {codec!r}")
+
+
+def _decompressor(codec: bytes):
+    if codec == CODEC_ZLIB:
+        return zlib.decompressobj()
+    if codec == CODEC_LZMA:
+        return lzma.LZMADecompressor()
+    if codec == CODEC_BZ2:
+        return bz2.BZ2Decompressor()
+    raise ValueError(f"Codec desconocido: {codec!r}")
+
+
+def read_header(path: Path):
+    """Devuelve (codec, nivel, tamaño lógico) si el archivo está comprimido, si no None."""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(raw) < HEADER.size or not raw.startswith(MAGIC):
+        return None
+    _, codec, level, size = HEADER.unpack(raw)
+    return codec, level, size
+
+
+def choose_codec(path: Path, size: int):
+    """Codec/nivel para `path`, o None si no conviene comprimirlo."""
+    if size < MIN_COMPRESS_SIZE:
+        return None
+
+    ext = path.suffix.lower()
+    if ext in SKIP_EXTENSIONS:
+        return None
+
+    # Sonda de entropía: si una muestra no comprime, el archivo tampoco
+    with open(path, "rb") as f:
+        sample = f.read(PROBE_SIZE)
+    if len(zlib.compress(sample, 1)) > len(sample) * PROBE_MAX_RATIO:
+        logger.debug("Sonda: no comprimible | %s", path)
+        return None
+
+    return CODEC_BY_EXTENSION.get(ext, DEFAULT_CODEC)
+
+
+def iter_logical_chunks(path: Path, chunk_size: int = STREAM_CHUNK):
+    """Bytes lógicos de un archivo del USB, esté o no comprimido."""
+    header = read_header(path)
+    with open(path, "rb") as f:
+        if header is None:
+            yield from iter(lambda: f.read(chunk_size), b"")
+            return
+
+        f.seek(HEADER.size)
+        decomp = _decompressor(header[0])
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            data = decomp.decompress(chunk)
+            if data:
+                yield data
+        if hasattr(decomp, "flush"):
+            tail = decomp.flush()
+            if tail:
+                yield tail
+
+
+class UsbStorage:
+    def __init__(self, compress: bool = False, pack=None, pack_threshold: int = 0):
+        self.compress = compress
+        # PackStore del USB (se lee siempre que exista) y tamaño por debajo del
+        # cual se empaqueta al escribir (0 = no se empaqueta)
+        self.pack = pack
+        self.pack_threshold = pack_threshold
+
+    # <======================================= PC → USB =======================================>
+    def pack_small(self, src: Path, dst: Path, init_hash: str | None) -> bool:
+        """Empaqueta src si está por debajo del umbral. Devuelve True si lo hizo."""
+        if self.pack is None or not self.pack_threshold or not init_hash:
+            return False
+        if src.stat().st_size >= self.pack_threshold:
+            return False
+
+        self.pack.put(init_hash, src)
+        # Si antes era un archivo suelto, deja de serlo: una sola copia válida
+        dst.unlink(missing_ok=True)
+        return True
+
+    def put(self, src: Path, dst: Path, init_hash: str | None = None) -> int:
+        """Guarda src (PC) en dst (USB). Devuelve los bytes ahorrados (0 si va sin comprimir)."""
+        self._break_link(dst)
+        self._unpack(init_hash)
+
+        codec = None
+        if self.compress and src.exists():
+            codec = choose_codec(src, src.stat().st_size)
+
+        if codec is None:
+            FSOps.copy_file(src, dst)
+            return 0
+
+        return self._put_compressed(src, dst, *codec)
+
+    def _put_compressed(self, src: Path, dst: Path, codec: bytes, level: int) -> int:
+        logger.debug("COMPRESS | %s → %s | codec=%s nivel=%d", src, dst, codec, level)
+        FSOps.ensure_parent(dst)
+        tmp = FSOps.temp_path(dst)
+
+        size = src.stat().st_size
+        comp = _compressor(codec, level)
+        try:
+            with open(src, "rb") as fin, open(tmp, "wb") as fout:
+                fout.write(HEADER.pack(MAGIC, codec, level, size))
+                for chunk in iter(lambda: fin.read(STREAM_CHUNK), b""):
+                    fout.write(comp.compress(chunk))
+                fout.write(comp.flush())
+            os.replace(tmp, dst)
+            shutil.copystat(src, dst)
+        except Exception:
+            logger.exception("Error comprimiendo archivo: %s → %s", src, dst)
+            tmp.unlink(missing_ok=True)
+            raise
+
+        return max(size - dst.stat().st_size, 0)
+
+    # <======================================= DEDUP =======================================>
+    def holds_content(self, path: Path, size: int) -> bool:
+        """True si `path` existe en el USB y su tamaño lógico es `size`."""
+        header = read_header(path)
+        if header is not None:
+            return header[2] == size
+        try:
+            return path.stat().st_size == size
+        except OSError:
+            return False
+
+    def clone(self, existing: Path, dst: Path, init_hash: str | None = None) -> str:
+        """
+        Crea dst con el mismo contenido que `existing`, sin leer nada de la PC:
+        hardlink si el sistema de archivos lo permite, si no copia dentro del USB.
+        """
+        FSOps.ensure_parent(dst)
+        self._unpack(init_hash)
+        try:
+            dst.unlink(missing_ok=True)
+            os.link(existing, dst)
+            return "link"
+        except OSError:
+            # FAT/exFAT no tienen hardlinks
+            FSOps.copy_file(existing, dst)
+            return "copy"
+
+    @staticmethod
+    def _break_link(dst: Path):
+        # Un archivo con hardlinks no se sobrescribe en el lugar: cambiaría
+        # también el contenido de las otras rutas que apuntan al mismo inodo
+        try:
+            if dst.stat().st_nlink > 1:
+                dst.unlink()
+        except OSError:
+            pass
+
+    # <======================================= PAQUETE =======================================>
+    def is_packed(self, init_hash: str | None) -> bool:
+        return self.pack is not None and bool(init_hash) and self.pack.contains(init_hash)
+
+    def has_packs(self) -> bool:
+        return self.pack is not None and self.pack.exists()
+
+    def discard(self, init_hash: str | None):
+        """DELETE de un archivo: descarta su BLOB si estaba empaquetado."""
+        self._unpack(init_hash)
+
+    def discard_many(self, init_hashes) -> int:
+        """DELETE de carpeta: descarta los BLOB de los archivos que contenía."""
+        return self.pack.discard_many(init_hashes) if self.has_packs() else 0
+
+    def _unpack(self, init_hash):
+        # El archivo pasa a guardarse suelto (o se borra): el BLOB queda obsoleto
+        if init_hash and self.pack is not None:
+            self.pack.discard(init_hash)
+
+    def flush(self):
+        """Confirma el paquete. Va antes del commit de la DB de metadatos."""
+        if self.pack is not None:
+            self.pack.flush()
+
+    def close(self):
+        if self.pack is not None:
+            self.pack.close()
+
+    # <======================================= CONTENIDO =======================================>
+    def logical_hash(self, path: Path, init_hash: str | None = None) -> str | None:
+        """sha256 del contenido lógico (descomprimido o desempaquetado), None si no está."""
+        h = hashlib.sha256()
+        if path.exists():
+            for chunk in iter_logical_chunks(path):
+                h.update(chunk)
+            return h.hexdigest()
+
+        data = self.pack.read(init_hash) if self.pack is not None and init_hash else None
+        if data is None:
+            return None
+        h.update(data)
+        return h.hexdigest()
+
+    # <======================================= USB → PC =======================================>
+    def get(self, src: Path, dst: Path, init_hash: str | None = None):
+        """
+        Trae src (USB) a dst (PC), descomprimiendo si tiene cabecera. Si src no
+        existe pero init_hash está empaquetado, lo desempaqueta.
+        """
+        if not src.exists() and self.pack is not None and init_hash:
+            if self.pack.get(init_hash, dst):
+                return
+
+        if read_header(src) is None:
+            FSOps.copy_file(src, dst)
+            return
+
+        logger.debug("DECOMPRESS | %s → %s", src, dst)
+        FSOps.ensure_parent(dst)
+        tmp = FSOps.temp_path(dst)
+        try:
+            with open(tmp, "wb") as fout:
+                for chunk in iter_logical_chunks(src):
+                    fout.write(chunk)
+            os.replace(tmp, dst)
+            shutil.copystat(src, dst)
+        except Exception:
+            logger.exception("Error descomprimiendo archivo: %s → %s", src, dst)
+            tmp.unlink(missing_ok=True)
+            raise
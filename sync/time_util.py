@@ -0,0 +1,103 @@
+import logging
+import os
+from functools import lru_cache
+from pathlib import Path
+
+"""
+Marcas de tiempo de archivos en nanosegundos y resolución por sistema de archivos.
+
+last_op_time guarda st_mtime_ns (entero). Las filas escritas antes guardaban
+st_mtime en segundos (float); se distinguen por magnitud, así no hace falta
+migrar la tabla: un mtime en segundos ronda 1.7e9 y en ns 1.7e18.
+
+Cada sistema de archivos redondea el mtime a su propia resolución (FAT: 2 s,
+exFAT: 10 ms, NTFS: 100 ns, ext4/xfs/btrfs: 1 ns). Dos mtimes que difieren menos
+que esa resolución son el mismo.
+"""
+
+logger = logging.getLogger("fs.time")
+
+NS_PER_SECOND = 1_000_000_000
+
+# Por debajo de esto el valor está en segundos (año ~5138 en segundos, 1973 en ns)
+_SECONDS_LIMIT = 10**11
+
+# Un float de segundos (~1.7e9) solo conserva ~0.2 µs de precisión
+LEGACY_SECONDS_TOLERANCE_NS = 1_000
+
+GRANULARITY_NS_BY_FSTYPE = {
+    "vfat": 2 * NS_PER_SECOND,
+    "msdos": 2 * NS_PER_SECOND,
+    "fat": 2 * NS_PER_SECOND,
+    "exfat": 10_000_000,
+    "ntfs": 100,
+    "ntfs3": 100,
+    "fuseblk": 100,  # ntfs-3g
+    "hfsplus": NS_PER_SECOND,
+    "iso9660": NS_PER_SECOND,
+}
+DEFAULT_GRANULARITY_NS = 1
+
+
+def to_ns(value) -> int | None:
+    """Normaliza un last_op_time (segundos legados o ns) a ns enteros."""
+    if value is None:
+        return None
+    if abs(value) < _SECONDS_LIMIT:
+        return round(value * NS_PER_SECOND)
+    return int(value)
+
+
+def is_legacy_seconds(value) -> bool:
+    return value is not None and abs(value) < _SECONDS_LIMIT
+
+
+def same_mtime(stored, mtime_ns, granularity_ns: int) -> bool:
+    """True si el mtime guardado y el actual son el mismo a la resolución dada."""
+    if stored is None or mtime_ns is None:
+        return False
+    tolerance = granularity_ns
+    if is_legacy_seconds(stored) or is_legacy_seconds(mtime_ns):
+        tolerance = max(tolerance, LEGACY_SECONDS_TOLERANCE_NS)
+    return abs(to_ns(stored) - to_ns(mtime_ns)) < tolerance
+
+
+# <======================================= RESOLUCIÓN POR MONTAJE =======================================>
+def _read_mounts(mounts_file: str = "/proc/mounts") -> list:
+    """[(punto de montaje, fstype)] de mayor a menor longitud (Linux)."""
+    try:
+        with open(mounts_file, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+
+    mounts = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 3:
+            # Los espacios en el punto de montaje vienen como \040
+            mounts.append((parts[1].replace("\\040", " "), parts[2]))
+    mounts.sort(key=lambda m: len(m[0]), reverse=True)
+    return mounts
+
+
+def filesystem_type(path: Path, mounts=None) -> str | None:
+    mounts = _read_mounts() if mounts is None else mounts
+    target = os.path.realpath(path)
+    for mount_point, fstype in mounts:
+        if target == mount_point or target.startswith(mount_point.rstrip("/") + "/"):
+            return fstype
+    return None
+
+
+@lru_cache(maxsize=None)
+def mtime_granularity_ns(path: Path) -> int:
+    """
+    Resolución de mtime del sistema de archivos que contiene `path`. Donde no
+    hay /proc/mounts (Windows, macOS) se asume resolución fina: en el peor caso
+    se re-hashea un archivo, nunca se pierde un cambio.
+    """
+    fstype = filesystem_type(path)
+    granularity = GRANULARITY_NS_BY_FSTYPE.get(fstype, DEFAULT_GRANULARITY_NS)
+    logger.debug("Resolución de mtime | %s | fs=%s | %d ns", path, fstype, granularity)
+    return granularity
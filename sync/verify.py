@@ -0,0 +1,318 @@
+import argparse
+import hashlib
+import logging
+import socket
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from sync.database import DB
+from sync.pack_store import PackStore, pack_path
+from sync.storage import UsbStorage
+from sync.time_util import mtime_granularity_ns, same_mtime
+
+"""
+Verificación de integridad por muestreo, con presupuesto de tiempo y de bytes.
+
+Compara el contenido real de los archivos (USB y/o PC) con el content_hash del
+maestro. Hashear todo el USB lleva horas, así que cada corrida verifica lo que
+entra en el presupuesto, empezando por lo nunca verificado y lo verificado hace
+más tiempo (tabla verify_state de la DB de la PC): en N corridas se cubre todo.
+
+    python -m sync.verify --pc-root C:/data --usb-root E:/data --time-budget 600
+    python -m sync.verify --pc-root C:/data --usb-root E:/data --side both --byte-budget 2048 --repair
+
+Un archivo del USB distinto o faltante es un MODIFY de reparación (se vuelve a
+copiar desde la PC en la próxima FASE 3; con --repair queda encolado). Un
+archivo de la PC con el mismo tamaño y mtime que el maestro pero otro contenido
+(corrupción silenciosa, la FASE 2 no lo ve) se reporta como UPDATE_PC.
+"""
+
+logger = logging.getLogger(__name__)
+
+SIDE_USB = "usb"
+SIDE_PC = "pc"
+
+HASH_CHUNK = 1024 * 1024
+COMMIT_EVERY = 200
+
+# Resultado de hashear un archivo
+MISSING = "missing"
+CHANGED = "changed"  # PC: cambió desde el maestro, lo ve la FASE 2
+
+
+@dataclass
+class VerifyReport:
+    side: str
+    total: int = 0
+    checked: int = 0
+    bytes_hashed: int = 0
+    # Pendientes de la FASE 2 (solo PC): no se verifican
+    changed: int = 0
+    # [{"rel_path", "expected", "actual"}]; actual None = falta el archivo
+    mismatches: list = field(default_factory=list)
+    # Movimientos (USB) u operaciones de FASE 1 (PC) que lo repararían
+    repairs: list = field(default_factory=list)
+    never_verified: int = 0
+    elapsed: float = 0.0
+    # "time" / "bytes" si cortó el presupuesto, None si cubrió todo
+    stopped_by: str | None = None
+
+
+class Verifier:
+    def __init__(
+        self,
+        pc_root: Path,
+        usb_root: Path,
+        db_name: str,
+        workers: int = 4,
+        time_budget: float | None = None,
+        byte_budget: int | None = None,
+    ):
+        self.db = DB(pc_root, usb_root, db_name)
+        self.pc_root = self.db.pc_root
+        self.usb_root = self.db.usb_root
+        self.storage = UsbStorage(pack=PackStore(pack_path(self.db.usb_path)))
+        self.workers = max(1, workers)
+        self.time_budget = time_budget
+        self.byte_budget = byte_budget
+        self.granularity_ns = mtime_granularity_ns(self.pc_root)
+
+    # <======================================= MAESTRO =======================================>
+    def _read_master(self):
+        with self.db.get_db_connection(self.db.pc_path) as conn:
+            return self.db.read_states(conn)
+
+    def _read_verified(self, conn, side):
+        rows = conn.execute(
+            "SELECT rel_path, content_hash, verified_at FROM verify_state WHERE side = ?", (side,)
+        )
+        return {row["rel_path"]: (row["content_hash"], row["verified_at"]) for row in rows}
+
+    @staticmethod
+    def rotation_order(master, verified) -> list:
+        """Nunca verificado (o cambiado desde entonces) primero, luego el más viejo."""
+
+        def key(entry):
+            content_hash, verified_at = verified.get(entry["rel_path"], (None, 0))
+            if content_hash != entry["content_hash"]:
+                verified_at = 0
+            return (verified_at, entry["rel_path"])
+
+        return sorted(master, key=key)
+
+    # <======================================= HASH =======================================>
+    def _hash_usb(self, entry):
+        digest = self.storage.logical_hash(self.usb_root / entry["rel_path"], entry["init_hash"])
+        return MISSING if digest is None else digest
+
+    def _hash_pc(self, entry):
+        path = self.pc_root / entry["rel_path"]
+        try:
+            st = path.stat()
+        except OSError:
+            return MISSING
+        if st.st_size != entry["size_bytes"] or not same_mtime(
+            entry["last_op_time"], st.st_mtime_ns, self.granularity_ns
+        ):
+            return CHANGED
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    # <======================================= PRESUPUESTO =======================================>
+    def _hash_within_budget(self, entries, hash_fn, report):
+        """
+        Hashea en paralelo en el orden dado hasta agotar el presupuesto. Los bytes
+        se reservan al despachar (el tamaño del maestro), así no se pasa de largo
+        por lo que ya estaba en vuelo. Entrega (entry, resultado) en orden.
+        """
+        start = time.monotonic()
+        reserved = 0
+        pending = deque()
+        it = iter(entries)
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            while True:
+                while report.stopped_by is None and len(pending) < self.workers * 2:
+                    entry = next(it, None)
+                    if entry is None:
+                        break
+                    size = entry["size_bytes"] or 0
+                    if self.time_budget is not None and time.monotonic() - start >= self.time_budget:
+                        report.stopped_by = "time"
+                        break
+                    # Siempre entra al menos un archivo, aunque sea más grande que el presupuesto
+                    if self.byte_budget is not None and reserved and reserved + size > self.byte_budget:
+                        report.stopped_by = "bytes"
+                        break
+                    reserved += size
+                    pending.append((entry, pool.submit(hash_fn, entry)))
+
+                if not pending:
+                    break
+                entry, future = pending.popleft()
+                yield entry, future.result()
+
+        report.elapsed = time.monotonic() - start
+
+    # <======================================= VERIFICA =======================================>
+    def run(self, side: str = SIDE_USB, repair: bool = False) -> VerifyReport:
+        report = VerifyReport(side=side)
+        master = self._read_master()
+        report.total = len(master)
+        hash_fn = self._hash_usb if side == SIDE_USB else self._hash_pc
+        machine_name = socket.gethostname()
+
+        with self.db.get_db_connection(self.db.pc_path) as conn:
+            verified = self._read_verified(conn, side)
+            live = {m["rel_path"] for m in master}
+            # Lo que ya no está en el maestro no se vuelve a verificar
+            conn.executemany(
+                "DELETE FROM verify_state WHERE side = ? AND rel_path = ?",
+                [(side, p) for p in verified if p not in live],
+            )
+            ordered = self.rotation_order(master, verified)
+            done = 0
+
+            for entry, actual in self._hash_within_budget(ordered, hash_fn, report):
+                if actual == CHANGED:
+                    report.changed += 1
+                    continue
+
+                report.checked += 1
+                ok = actual == entry["content_hash"]
+                if actual != MISSING:
+                    report.bytes_hashed += entry["size_bytes"] or 0
+                if not ok:
+                    self._record_mismatch(report, entry, actual, side, machine_name)
+
+                conn.execute(
+                    "INSERT OR REPLACE INTO verify_state VALUES (?, ?, ?, ?, ?)",
+                    (side, entry["rel_path"], entry["content_hash"], int(time.time()), int(ok)),
+                )
+                done += 1
+                if done % COMMIT_EVERY == 0:
+                    conn.commit()
+
+            conn.commit()
+            verified = self._read_verified(conn, side)
+            report.never_verified = sum(
+                1 for m in master if verified.get(m["rel_path"], (None, 0))[0] != m["content_hash"]
+            )
+        self.storage.close()
+
+        if repair and side == SIDE_USB and report.repairs:
+            self._enqueue_repairs(report.repairs)
+
+        logger.info(
+            "VERIFY | lado=%s | verificados=%d/%d | bytes=%d | errores=%d | corte=%s | %.1f s",
+            side,
+            report.checked,
+            report.total,
+            report.bytes_hashed,
+            len(report.mismatches),
+            report.stopped_by or "-",
+            report.elapsed,
+        )
+        return report
+
+    def _record_mismatch(self, report, entry, actual, side, machine_name):
+        rel_path = entry["rel_path"]
+        actual = None if actual == MISSING else actual
+        report.mismatches.append(
+            {"rel_path": rel_path, "expected": entry["content_hash"], "actual": actual}
+        )
+        logger.warning(
+            "VERIFY | %s | %s | esperado=%s | real=%s",
+            side,
+            rel_path,
+            entry["content_hash"],
+            actual or "FALTA",
+        )
+
+        if side == SIDE_PC:
+            # Se corrige desde el USB (FASE 1), no con un movimiento
+            report.repairs.append({"op_type": "UPDATE_PC", "rel_path": rel_path})
+            return
+
+        # El USB se repara volviendo a copiar desde la PC, si la PC lo tiene
+        if not (self.pc_root / rel_path).is_file():
+            logger.warning("VERIFY | %s no está en la PC: no se puede reparar", rel_path)
+            return
+        report.repairs.append(
+            {
+                "op_type": "MODIFY",
+                "init_hash": entry["init_hash"],
+                "rel_path": rel_path,
+                "new_rel_path": None,
+                "content_hash": entry["content_hash"],
+                "size_bytes": entry["size_bytes"],
+                "last_op_time": entry["last_op_time"],
+                "machine_name": machine_name,
+            }
+        )
+
+    def _enqueue_repairs(self, repairs):
+        """Encola los MODIFY en el staging de la FASE 2: los aplica la próxima FASE 3."""
+        with self.db.get_db_connection(self.db.temp_path) as conn:
+            for mov in repairs:
+                self.db.upsert_movement(conn, mov)
+            conn.commit()
+        logger.info("VERIFY | %d movimientos de reparación encolados", len(repairs))
+
+
+# <======================================= CLI =======================================>
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m sync.verify", description="Verificación de integridad por muestreo"
+    )
+    parser.add_argument("--pc-root", required=True, type=Path)
+    parser.add_argument("--usb-root", required=True, type=Path)
+    parser.add_argument("--db-name", default="metadata.db")
+    parser.add_argument("--side", choices=[SIDE_USB, SIDE_PC, "both"], default=SIDE_USB)
+    parser.add_argument("--time-budget", type=float, help="Segundos por lado")
+    parser.add_argument("--byte-budget", type=float, help="MiB a hashear por lado")
+    parser.add_argument("--workers", type=int, default=4, help="Hilos de hashing")
+    parser.add_argument(
+        "--repair", action="store_true", help="Encola MODIFY para los archivos dañados del USB"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    verifier = Verifier(
+        args.pc_root,
+        args.usb_root,
+        args.db_name,
+        workers=args.workers,
+        time_budget=args.time_budget,
+        byte_budget=int(args.byte_budget * 1024 * 1024) if args.byte_budget else None,
+    )
+    sides = [SIDE_USB, SIDE_PC] if args.side == "both" else [args.side]
+
+    failed = False
+    for side in sides:
+        report = verifier.run(side, repair=args.repair)
+        print(
+            f"{side}: {report.checked}/{report.total} verificados "
+            f"({report.bytes_hashed / 1024 / 1024:.1f} MiB, {report.elapsed:.1f} s), "
+            f"{report.never_verified} sin verificar todavía"
+        )
+        for m in report.mismatches:
+            print(f"  DISTINTO  {m['rel_path']}  esperado={m['expected'][:12]}  real={(m['actual'] or 'FALTA')[:12]}")
+        for r in report.repairs:
+            print(f"  REPARA    {r['op_type']:<9} {r['rel_path']}")
+        failed = failed or bool(report.mismatches)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -58,12 +58,15 @@ class FakeDB:
     def read_states(self, *_):
         return self._states_for_current_path()
 
-    def read_tombstones(self, *_):
+    def read_tombstones(self, *_, **__):
         return self.tombstones
 
     def read_movements(self, *_):
         return self.movements
 
+    def iter_movements(self, *_, **__):
+        return iter(list(self.movements))
+
     def upsert_movement(self, _, mov):
         self.movements.append(mov)
 
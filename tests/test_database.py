@@ -182,3 +182,180 @@ def test_archive_and_delete_movement(db, conn):
     hist = conn.execute("SELECT * FROM movements_history WHERE id='1'").fetchone()
 
     assert hist is not None
+
+
+def test_iter_movements_streams_in_id_order_while_archiving(db, conn):
+    for i, path in enumerate(["c.txt", "a.txt", "b.txt"], start=1):
+        db.upsert_movement(
+            conn,
+            {
+                "op_type": "CREATE",
+                "init_hash": f"h{i}",
+                "rel_path": path,
+                "new_rel_path": None,
+                "content_hash": f"c{i}",
+                "size_bytes": i,
+                "last_op_time": 100 + i,
+                "machine_name": "pc1",
+            },
+        )
+
+    seen = []
+    # batch_size=1 obliga a paginar mientras se archiva cada movimiento
+    for mov in db.iter_movements(conn, batch_size=1):
+        seen.append(mov["rel_path"])
+        db.archive_and_delete_movement(conn, mov)
+
+    assert seen == ["c.txt", "a.txt", "b.txt"]
+    assert db.table_is_empty(conn, "movements")
+    assert conn.execute("SELECT COUNT(*) FROM movements_history").fetchone()[0] == 3
+
+
+def test_compact_movements_folds_chains(db, conn):
+    def mov(op, rel, content, size, init_hash="h1"):
+        return {
+            "op_type": op,
+            "init_hash": init_hash,
+            "rel_path": rel,
+            "new_rel_path": None,
+            "content_hash": content,
+            "size_bytes": size,
+            "last_op_time": 100,
+            "machine_name": "pc1",
+        }
+
+    db.upsert_movement(conn, mov("CREATE", "a.txt", "c1", 10))
+    db.upsert_movement(conn, mov("CREATE", "x.txt", "cx", 5, init_hash="h2"))
+    db.upsert_movement(conn, mov("MODIFY", "a.txt", "c2", 20))
+    db.upsert_movement(conn, mov("CREATE", "tmp.txt", "ct", 7, init_hash="h3"))
+    db.upsert_movement(conn, mov("DELETE", "tmp.txt", "ct", 7, init_hash="h3"))
+
+    saved_ops, saved_bytes = db.compact_movements(conn)
+
+    assert saved_ops == 3
+    assert saved_bytes == 10 + 7
+    rows = db.read_movements(conn)
+    assert [(m["op_type"], m["rel_path"], m["content_hash"]) for m in rows] == [
+        ("CREATE", "a.txt", "c2"),
+        ("CREATE", "x.txt", "cx"),
+    ]
+    # Se conserva la posición (id) del primer movimiento de la cadena
+    assert [m["id"] for m in db.iter_movements(conn)] == [1, 2]
+
+
+def test_tombstones_since_ack_and_gc(db, conn):
+    db.merge_tombstones(
+        conn,
+        [
+            {"init_hash": "t1", "content_hash": "c1", "deleted_at": 100, "machine_name": "pc1"},
+            {"init_hash": "t2", "content_hash": "c2", "deleted_at": 200, "machine_name": "pc1"},
+            {"init_hash": "t3", "content_hash": "c3", "deleted_at": 300, "machine_name": "pc2"},
+        ],
+    )
+
+    # seq: orden de llegada, asignado por la DB
+    assert [t["seq"] for t in db.read_tombstones(conn)] == [1, 2, 3]
+    assert [t["init_hash"] for t in db.read_tombstones(conn, since=1)] == ["t2", "t3"]
+
+    # Sin confirmaciones solo se borra lo que pasó el horizonte
+    assert db.gc_tombstones(conn, retention_seconds=1000, now=1150) == 1
+
+    db.ack_tombstones(conn, "pc1", 3)
+    db.ack_tombstones(conn, "pc2", 2)
+    db.ack_tombstones(conn, "pc2", 1)  # nunca retrocede
+    assert db.gc_tombstones(conn, retention_seconds=1000, now=1150) == 1
+
+    assert [t["init_hash"] for t in db.read_tombstones(conn)] == ["t3"]
+
+    # Compactar no reutiliza números: lo que llega después sigue por encima
+    db.merge_tombstones(
+        conn, [{"init_hash": "t4", "content_hash": "c4", "deleted_at": 50, "machine_name": "pc3"}]
+    )
+    assert [t["init_hash"] for t in db.read_tombstones(conn, since=3)] == ["t4"]
+
+
+def test_archive_movements_moves_ids_in_chunks(db, conn):
+    for i in range(1, 8):
+        db.upsert_movement(
+            conn,
+            {
+                "op_type": "CREATE",
+                "init_hash": f"h{i}",
+                "rel_path": f"f{i}.txt",
+                "new_rel_path": None,
+                "content_hash": f"c{i}",
+                "size_bytes": i,
+                "last_op_time": 100 + i,
+                "machine_name": "pc1",
+            },
+        )
+    ids = [row["id"] for row in conn.execute("SELECT id FROM movements ORDER BY id")]
+
+    db.ARCHIVE_CHUNK = 2
+    assert db.archive_movements(conn, ids[:5], applied_time=999) == 5
+
+    remaining = [row["id"] for row in conn.execute("SELECT id FROM movements ORDER BY id")]
+    assert remaining == ids[5:]
+    hist = conn.execute("SELECT id, rel_path, applied_time FROM movements_history ORDER BY id").fetchall()
+    assert [tuple(r) for r in hist] == [(ids[i], f"f{i + 1}.txt", 999) for i in range(5)]
+
+
+def test_stage_movements_moves_queue_from_temp_db(db):
+    def mov(i):
+        return {
+            "op_type": "CREATE",
+            "init_hash": f"h{i}",
+            "rel_path": f"f{i}.txt",
+            "new_rel_path": None,
+            "content_hash": f"c{i}",
+            "size_bytes": i,
+            "last_op_time": 100 + i,
+            "machine_name": "pc1",
+        }
+
+    with db.get_db_connection(db.temp_path) as temp:
+        for i in (3, 1, 2):
+            db.upsert_movement(temp, mov(i))
+        temp.commit()
+
+    with db.get_db_connection(db.pc_path) as pc:
+        db.upsert_movement(pc, mov(0))  # pendiente de una ejecución cortada
+        pc.commit()
+        assert db.stage_movements(pc, db.temp_path) == 3
+        staged = [r["rel_path"] for r in pc.execute("SELECT rel_path FROM movements ORDER BY id")]
+
+    assert staged == ["f0.txt", "f3.txt", "f1.txt", "f2.txt"]
+    with db.get_db_connection(db.temp_path) as temp:
+        assert db.table_is_empty(temp, "movements")
+
+
+def test_usb_working_copy_publishes_only_when_changed(db):
+    row = ("h1", "a.txt", "c1", 3, 10, "otra")
+    with db.get_db_connection(db.usb_path) as usb:
+        usb.execute("INSERT INTO master_states VALUES (?, ?, ?, ?, ?, ?)", row)
+        usb.commit()
+    usb.close()
+
+    # Solo lectura: el USB no se reescribe
+    with db.usb_connection() as work:
+        assert [s["init_hash"] for s in db.read_states(work)] == ["h1"]
+    work.close()
+    before = db.usb_path.stat().st_mtime_ns
+    assert db.publish_usb() is False
+    assert db.usb_path.stat().st_mtime_ns == before
+
+    # Escritura en la copia local: el USB no la ve hasta publicar
+    with db.usb_connection() as work:
+        db.ack_tombstones(work, "pc1", 123.0)
+        work.commit()
+    work.close()
+    with db.get_db_connection(db.usb_path) as usb:
+        assert usb.execute("SELECT COUNT(*) FROM tombstone_acks").fetchone()[0] == 0
+    usb.close()
+
+    assert db.publish_usb() is True
+    assert not db.usb_path.with_name(db.usb_path.name + ".partial").exists()
+    with db.get_db_connection(db.usb_path) as usb:
+        assert usb.execute("SELECT COUNT(*) FROM tombstone_acks").fetchone()[0] == 1
+        assert [s["init_hash"] for s in db.read_states(usb)] == ["h1"]
+    usb.close()
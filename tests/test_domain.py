@@ -1,5 +1,5 @@
 import pytest
-from sync.domain import MovementRules, CurrentState
+from sync.domain import MovementRules, CurrentState, MovementCoalescer, DirectoryCollapser
 
 # ------------------ FIXTURE DE ESTADO INICIAL ------------------
 
@@ -80,3 +80,157 @@ def test_can_apply_unknown(initial_state):
     mov = {"op_type": "UNKNOWN", "rel_path": "file1.txt"}
     # operación desconocida → False
     assert MovementRules.can_apply(mov, initial_state._paths) is False
+
+
+# ------------------ TESTS PARA COALESCE ------------------
+
+
+def _mov(id_, op, rel, new_rel=None, content="c", size=10):
+    return {
+        "id": id_,
+        "op_type": op,
+        "init_hash": "h1",
+        "rel_path": rel,
+        "new_rel_path": new_rel,
+        "content_hash": content,
+        "size_bytes": size,
+        "last_op_time": 100 + id_,
+        "machine_name": "pc1",
+    }
+
+
+def test_coalesce_create_modify_modify_move():
+    chain = [
+        _mov(1, "CREATE", "a.txt", content="c1", size=10),
+        _mov(2, "MODIFY", "a.txt", content="c2", size=20),
+        _mov(3, "MODIFY", "a.txt", content="c3", size=30),
+        _mov(4, "MOVE", "a.txt", "b.txt", content="c3", size=30),
+    ]
+
+    result, saved_ops, saved_bytes = MovementCoalescer.coalesce(chain)
+
+    assert len(result) == 1
+    assert result[0]["id"] == 1
+    assert result[0]["op_type"] == "CREATE"
+    assert result[0]["rel_path"] == "b.txt"
+    assert result[0]["new_rel_path"] is None
+    assert result[0]["content_hash"] == "c3"
+    assert saved_ops == 3
+    assert saved_bytes == 10 + 20
+
+
+def test_coalesce_create_delete_is_nothing():
+    chain = [_mov(1, "CREATE", "a.txt", size=50), _mov(2, "DELETE", "a.txt", size=50)]
+
+    result, saved_ops, saved_bytes = MovementCoalescer.coalesce(chain)
+
+    assert result == []
+    assert saved_ops == 2
+    assert saved_bytes == 50
+
+
+def test_coalesce_move_move():
+    chain = [_mov(1, "MOVE", "a.txt", "b.txt"), _mov(2, "MOVE", "b.txt", "c.txt")]
+    result, saved_ops, _ = MovementCoalescer.coalesce(chain)
+    assert [(m["rel_path"], m["new_rel_path"]) for m in result] == [("a.txt", "c.txt")]
+    assert saved_ops == 1
+
+    back = [_mov(1, "MOVE", "a.txt", "b.txt"), _mov(2, "MOVE", "b.txt", "a.txt")]
+    assert MovementCoalescer.coalesce(back)[0] == []
+
+
+def test_coalesce_keeps_unrelated_pairs():
+    chain = [_mov(1, "MOVE", "a.txt", "b.txt"), _mov(2, "MODIFY", "b.txt")]
+
+    result, saved_ops, saved_bytes = MovementCoalescer.coalesce(chain)
+
+    assert result == chain
+    assert saved_ops == 0
+    assert saved_bytes == 0
+
+
+def _file_mov(op, rel, new=None):
+    return {
+        "op_type": op,
+        "init_hash": f"h-{rel}",
+        "rel_path": rel,
+        "new_rel_path": new,
+        "content_hash": f"c-{rel}",
+        "size_bytes": 10,
+        "last_op_time": 100,
+        "machine_name": "pc1",
+    }
+
+
+def test_directory_collapser_folds_folder_rename():
+    master = ["docs/a.txt", "docs/sub/b.txt", "docs/sub/c.txt", "otro.txt"]
+    tree = ["papers/a.txt", "papers/sub/b.txt", "papers/sub/c.txt", "otro.txt", "papers/new.txt"]
+    movements = [
+        _file_mov("MOVE", "docs/a.txt", "papers/a.txt"),
+        _file_mov("CREATE", "papers/new.txt"),
+        _file_mov("MOVE", "docs/sub/b.txt", "papers/sub/b.txt"),
+        _file_mov("MOVE", "docs/sub/c.txt", "papers/sub/c.txt"),
+    ]
+
+    result, saved = DirectoryCollapser.collapse(movements, master, tree)
+
+    assert saved == 2
+    # La operación de carpeta va primero, antes del CREATE dentro de la carpeta destino
+    assert [(m["op_type"], m["rel_path"], m["new_rel_path"]) for m in result] == [
+        ("MOVE", "docs/", "papers/"),
+        ("CREATE", "papers/new.txt", None),
+    ]
+
+
+def test_directory_collapser_keeps_partial_moves_per_file():
+    # docs/c.txt sigue en docs/: no se puede renombrar la carpeta completa
+    master = ["docs/a.txt", "docs/b.txt", "docs/c.txt"]
+    tree = ["papers/a.txt", "papers/b.txt", "docs/c.txt"]
+    movements = [
+        _file_mov("MOVE", "docs/a.txt", "papers/a.txt"),
+        _file_mov("MOVE", "docs/b.txt", "papers/b.txt"),
+    ]
+
+    result, saved = DirectoryCollapser.collapse(movements, master, tree)
+
+    assert saved == 0
+    assert result == movements
+
+
+def test_directory_collapser_folds_subtree_delete_and_moved_subfolder():
+    master = ["viejo/a.txt", "viejo/x/b.txt", "fotos/2020/1.jpg", "fotos/2020/2.jpg", "fotos/3.jpg"]
+    # fotos/2020 se movió dentro de archivo/ (que ya no existe en el maestro)
+    tree = ["archivo/2020/1.jpg", "archivo/2020/2.jpg", "fotos/3.jpg"]
+    movements = [
+        _file_mov("DELETE", "viejo/a.txt"),
+        _file_mov("DELETE", "viejo/x/b.txt"),
+        _file_mov("MOVE", "fotos/2020/1.jpg", "archivo/2020/1.jpg"),
+        _file_mov("MOVE", "fotos/2020/2.jpg", "archivo/2020/2.jpg"),
+    ]
+
+    result, saved = DirectoryCollapser.collapse(movements, master, tree)
+
+    ops = sorted((m["op_type"], m["rel_path"], m["new_rel_path"]) for m in result)
+    assert ops == [("DELETE", "viejo/", None), ("MOVE", "fotos/2020/", "archivo/2020/")]
+    assert saved == 2
+    assert MovementRules.can_apply(result[0], set(master))
+
+
+# ------------------ TEST PARA CURRENT STATE ------------------
+
+
+def test_current_state_apply_follows_movements(initial_state):
+    initial_state.apply({"op_type": "MOVE", "rel_path": "file1.txt", "new_rel_path": "x.txt"})
+    initial_state.apply({"op_type": "CREATE", "rel_path": "file1.txt"})
+    initial_state.apply({"op_type": "DELETE", "rel_path": "file2.txt"})
+
+    assert initial_state._paths == {"file1.txt", "x.txt"}
+
+
+def test_current_state_apply_directory_operations():
+    state = CurrentState({"docs/a.txt", "docs/sub/b.txt", "tmp/1.log", "otro.txt"})
+
+    state.apply({"op_type": "MOVE", "rel_path": "docs/", "new_rel_path": "papers/"})
+    state.apply({"op_type": "DELETE", "rel_path": "tmp/"})
+
+    assert state._paths == {"papers/a.txt", "papers/sub/b.txt", "otro.txt"}
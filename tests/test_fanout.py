@@ -0,0 +1,48 @@
+from unittest.mock import patch
+
+from sync.fanout import FanOutSync
+from sync.meta_util import sha256_file
+
+
+def test_fanout_syncs_every_target_hashing_once(tmp_path):
+    pc = tmp_path / "pc"
+    usbs = [tmp_path / f"usb{i}" for i in range(3)]
+    for d in (pc, *usbs):
+        d.mkdir()
+    (pc / "a.txt").write_bytes(b"uno")
+    (pc / "sub").mkdir()
+    (pc / "sub" / "b.txt").write_bytes(b"dos")
+
+    fanout = FanOutSync(pc, usbs, "test.db")
+    fanout.run()  # inicializa: CREATE de todo hacia cada USB
+
+    for usb in usbs:
+        assert (usb / "a.txt").read_bytes() == b"uno"
+        assert (usb / "sub" / "b.txt").read_bytes() == b"dos"
+
+    # Cada destino tiene su propia DB en la PC
+    pc_dbs = {e.db.pc_path for e in fanout.engines}
+    assert len(pc_dbs) == 3
+
+    # Segunda ejecución con un cambio: se hashea una sola vez para los 3 USB
+    (pc / "c.txt").write_bytes(b"tres")
+    fanout = FanOutSync(pc, usbs, "test.db")
+    with patch("sync.engine.sha256_file", side_effect=sha256_file) as hash_mock:
+        fanout.run()
+
+    assert hash_mock.call_count == 1
+    for usb in usbs:
+        assert (usb / "c.txt").read_bytes() == b"tres"
+
+
+def test_fanout_reuses_target_id_across_runs(tmp_path):
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    other = tmp_path / "other"
+    for d in (pc, usb, other):
+        d.mkdir()
+
+    first = FanOutSync(pc, [usb, other], "test.db")
+    second = FanOutSync(pc, [usb, other], "test.db")
+
+    assert [e.db.pc_path for e in first.engines] == [e.db.pc_path for e in second.engines]
@@ -134,3 +134,67 @@ def test_delete_file_does_not_delete_directory(tmp_path):
         FSOps.delete_file(dir_path)
 
     assert dir_path.exists()
+
+
+def test_copy_file_resumable_resumes_after_interruption(tmp_path, monkeypatch):
+    src = tmp_path / "big.bin"
+    dst = tmp_path / "usb" / "big.bin"
+    content = bytes(range(256)) * 4  # 1024 bytes → 16 bloques de 64
+    src.write_bytes(content)
+
+    real_save = FSOps._save_progress
+    calls = {"n": 0}
+
+    def save_then_die(path, progress):
+        calls["n"] += 1
+        real_save(path, progress)
+        if calls["n"] == 5:
+            raise KeyboardInterrupt  # corte tras 5 bloques
+
+    monkeypatch.setattr(FSOps, "_save_progress", staticmethod(save_then_die))
+    with pytest.raises(KeyboardInterrupt):
+        FSOps.copy_file_resumable(src, dst, chunk_size=64)
+
+    assert not dst.exists()
+    assert (tmp_path / "usb" / ".big.bin.partial").exists()
+
+    monkeypatch.setattr(FSOps, "_save_progress", staticmethod(real_save))
+    written = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: written.append(fd) or real_fsync(fd))
+
+    FSOps.copy_file_resumable(src, dst, chunk_size=64)
+
+    assert dst.read_bytes() == content
+    assert len(written) == 16 - 5  # solo se escribieron los bloques que faltaban
+    assert not (tmp_path / "usb" / ".big.bin.partial").exists()
+    assert not (tmp_path / "usb" / ".big.bin.partial.json").exists()
+
+
+def test_copy_file_resumable_rewrites_corrupt_chunks(tmp_path, monkeypatch):
+    src = tmp_path / "big.bin"
+    dst = tmp_path / "big_copy.bin"
+    content = os.urandom(512)
+    src.write_bytes(content)
+
+    real_save = FSOps._save_progress
+
+    def save_then_die(path, progress):
+        real_save(path, progress)
+        if len(progress["chunks"]) == 4:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(FSOps, "_save_progress", staticmethod(save_then_die))
+    with pytest.raises(KeyboardInterrupt):
+        FSOps.copy_file_resumable(src, dst, chunk_size=64)
+    monkeypatch.undo()
+
+    # Se corrompe el segundo bloque ya escrito
+    partial = tmp_path / ".big_copy.bin.partial"
+    data = bytearray(partial.read_bytes())
+    data[70] ^= 0xFF
+    partial.write_bytes(bytes(data))
+
+    FSOps.copy_file_resumable(src, dst, chunk_size=64)
+
+    assert dst.read_bytes() == content
@@ -0,0 +1,70 @@
+import calendar
+import sqlite3
+
+import pytest
+
+from sync import history
+from sync.database import DB
+
+
+def ts(year, month, day=15):
+    return calendar.timegm((year, month, day, 12, 0, 0))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db = DB(tmp_path, tmp_path, "test.db")
+    with db.get_db_connection(db.pc_path) as conn:
+        rows = [
+            (1, "CREATE", "h1", "a.txt", None, "c1", 1, 1, "pc1", ts(2026, 1)),
+            (2, "MOVE", "h1", "a.txt", "b.txt", "c1", 1, 1, "pc1", ts(2026, 2)),
+            (3, "CREATE", "h2", "c.txt", None, "c2", 1, 1, "pc1", ts(2026, 2, 20)),
+            (4, "MODIFY", "h1", "b.txt", None, "c3", 1, 1, "pc1", ts(2026, 3)),
+        ]
+        conn.executemany(
+            "INSERT INTO movements_history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        conn.commit()
+    return db.pc_path
+
+
+def test_rotate_moves_closed_months_to_archives(db_path):
+    conn = sqlite3.connect(str(db_path))
+    moved = history.rotate(conn, db_path, now=ts(2026, 3, 20))
+    history.maintain(conn)
+
+    assert moved == {"2026-01": 1, "2026-02": 2}
+    assert conn.execute("SELECT id FROM movements_history").fetchall() == [(4,)]
+    conn.close()
+
+    archives = sorted(p.name for p in history.archive_dir(db_path).iterdir())
+    assert archives == ["2026-01.db", "2026-02.db"]
+
+    # Rotar de nuevo no duplica ni mueve nada
+    conn = sqlite3.connect(str(db_path))
+    assert history.rotate(conn, db_path, now=ts(2026, 3, 20)) == {}
+    conn.close()
+
+
+def test_query_spans_active_db_and_archives(db_path):
+    conn = sqlite3.connect(str(db_path))
+    history.rotate(conn, db_path, now=ts(2026, 3, 20))
+    conn.close()
+
+    by_hash = history.query(db_path, init_hash="h1")
+    assert [r["id"] for r in by_hash] == [4, 2, 1]
+
+    # Una ruta aparece como origen o destino de un MOVE
+    assert [r["id"] for r in history.query(db_path, rel_path="b.txt")] == [4, 2]
+
+    february = history.query(db_path, since=ts(2026, 2, 1), until=ts(2026, 3, 1))
+    assert [r["id"] for r in february] == [3, 2]
+    assert [r["id"] for r in history.query(db_path, limit=1)] == [4]
+
+
+def test_history_cli_query(db_path, capsys):
+    history.main(["query", "--db", str(db_path), "--path", "a.txt"])
+
+    out = capsys.readouterr().out
+    assert "MOVE   a.txt → b.txt" in out
+    assert "CREATE a.txt" in out
@@ -0,0 +1,58 @@
+import logging
+
+from sync.log_util import ProgressLogger, start_queue_logging
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_progress_logger_is_rate_limited(caplog):
+    clock = FakeClock()
+    logger = logging.getLogger("test.progress")
+    progress = ProgressLogger(logger, "FASE 3", interval=5.0, clock=clock)
+
+    with caplog.at_level(logging.INFO, logger="test.progress"):
+        for _ in range(1000):
+            progress.tick("create", nbytes=10)
+        # Ninguna línea antes de cumplir el intervalo
+        assert caplog.records == []
+
+        clock.now = 6.0
+        progress.tick("create", nbytes=10)
+        progress.summary()
+
+    messages = [r.getMessage() for r in caplog.records]
+    assert len(messages) == 2
+    assert "progreso" in messages[0]
+    assert "resumen" in messages[1]
+    assert "create=1001" in messages[1]
+    assert progress.bytes == 10010
+
+
+def test_start_queue_logging_writes_through_listener(tmp_path):
+    log_file = tmp_path / "sync.log"
+    handler = logging.FileHandler(log_file, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+
+    root = logging.getLogger()
+    previous_handlers = list(root.handlers)
+    previous_level = root.level
+
+    listener = start_queue_logging([handler])
+    try:
+        logging.getLogger("test.queue").info("hola desde la cola")
+    finally:
+        listener.stop()
+        handler.close()
+        for h in list(root.handlers):
+            root.removeHandler(h)
+        for h in previous_handlers:
+            root.addHandler(h)
+        root.setLevel(previous_level)
+
+    assert "hola desde la cola" in log_file.read_text(encoding="utf-8")
@@ -39,3 +39,51 @@ def test_walk_directory_metadata_single_file(tmp_path: Path):
     snapshot = walk_directory_metadata(tmp_path)
     rel_path = "file1.txt"
     assert rel_path in snapshot
+
+
+def test_walk_directory_metadata_parallel_matches_serial_and_is_sorted(tmp_path: Path):
+    for d in range(6):
+        for s in range(3):
+            sub = tmp_path / f"d{d}" / f"s{s}"
+            sub.mkdir(parents=True)
+            for i in range(4):
+                (sub / f"f{i}.txt").write_bytes(b"x" * i)
+    (tmp_path / "raiz.txt").write_bytes(b"r")
+    (tmp_path / ".sync").mkdir()
+    (tmp_path / ".sync" / "metadata.db").write_bytes(b"db")
+    (tmp_path / "d0" / ".oculto.txt").write_bytes(b"o")
+
+    serial = walk_directory_metadata(tmp_path)
+    parallel = walk_directory_metadata(tmp_path, workers=4)
+
+    assert list(parallel.items()) == list(serial.items())
+    assert list(serial) == sorted(serial)
+    assert len(serial) == 6 * 3 * 4 + 1
+    assert not any(part.startswith(".") for p in serial for part in p.split("/"))
+
+
+def test_walk_ignores_leftovers_of_an_interrupted_copy(tmp_path: Path, monkeypatch):
+    from sync.fs_util import FSOps
+
+    usb = tmp_path / "usb"
+    pc = tmp_path / "pc"
+    (usb / "videos").mkdir(parents=True)
+    (pc / "videos").mkdir(parents=True)
+    (usb / "videos" / "big.bin").write_bytes(b"x" * 512)
+    (pc / "nota.txt").write_bytes(b"n")
+
+    real_save = FSOps._save_progress
+
+    def save_then_die(path, progress):
+        real_save(path, progress)
+        if len(progress["chunks"]) == 3:
+            raise KeyboardInterrupt  # corte a mitad de la copia USB → PC
+
+    monkeypatch.setattr(FSOps, "_save_progress", staticmethod(save_then_die))
+    with pytest.raises(KeyboardInterrupt):
+        FSOps.copy_file_resumable(usb / "videos" / "big.bin", pc / "videos" / "big.bin", chunk_size=64)
+
+    # El parcial y su progreso quedan en el árbol de la PC, pero no se escanean
+    assert len(list((pc / "videos").iterdir())) == 2
+    assert list(walk_directory_metadata(pc)) == ["nota.txt"]
+    assert list(walk_directory_metadata(pc, workers=4)) == ["nota.txt"]
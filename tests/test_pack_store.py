@@ -0,0 +1,138 @@
+from sync.engine import EngineSync
+from sync.pack_store import PackStore, pack_path
+from sync.storage import UsbStorage
+
+
+def test_put_get_and_discard(tmp_path):
+    src = tmp_path / "a.txt"
+    src.write_bytes(b"chico")
+    store = PackStore(tmp_path / "usb" / "metadata.db.pack")
+    assert not store.exists()
+
+    store.put("h1", src)
+    store.put("h2", src)
+    store.flush()
+    assert store.contains("h1")
+
+    dst = tmp_path / "pc" / "sub" / "a.txt"
+    assert store.get("h1", dst)
+    assert dst.read_bytes() == b"chico"
+    assert dst.stat().st_mtime_ns == src.stat().st_mtime_ns
+
+    assert store.discard("h1")
+    assert not store.get("h1", dst)
+    assert store.discard_many(["h2", "otro"]) == 1
+    assert not store.contains("h2")
+    store.close()
+
+
+def test_storage_packs_below_threshold_and_unpacks_on_get(tmp_path):
+    usb = tmp_path / "usb"
+    small = tmp_path / "small.txt"
+    big = tmp_path / "big.txt"
+    small.write_bytes(b"x" * 10)
+    big.write_bytes(b"y" * 100)
+    storage = UsbStorage(pack=PackStore(usb / "db.pack"), pack_threshold=50)
+
+    assert storage.pack_small(small, usb / "small.txt", "h-small")
+    assert not storage.pack_small(big, usb / "big.txt", "h-big")
+    assert not (usb / "small.txt").exists()
+
+    # Sin archivo suelto en el USB, get lo desempaqueta por init_hash
+    storage.get(usb / "small.txt", tmp_path / "pc" / "small.txt", "h-small")
+    assert (tmp_path / "pc" / "small.txt").read_bytes() == b"x" * 10
+
+    # Si crece y pasa a ir suelto, el BLOB se descarta
+    storage.put(big, usb / "small.txt", "h-small")
+    assert not storage.is_packed("h-small")
+    storage.close()
+
+
+def test_phase3_packs_small_files_and_moves_are_free(tmp_path):
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    (pc / "notas").mkdir(parents=True)
+    usb.mkdir()
+    for i in range(5):
+        (pc / "notas" / f"{i}.txt").write_text(f"nota {i}")
+    (pc / "grande.bin").write_bytes(b"z" * 8192)
+
+    engine = EngineSync(pc, usb, "test.db", pack_threshold=4096)
+    engine.replicate_master()
+    engine.apply_movements()
+
+    assert engine.stats["packed_files"] == 5
+    assert not (usb / "notas").exists()
+    assert (usb / "grande.bin").exists()
+
+    (pc / "notas" / "0.txt").rename(pc / "notas" / "cero.txt")
+    engine = EngineSync(pc, usb, "test.db", pack_threshold=4096)
+    engine.replicate_master()
+    engine.get_movements()
+    engine.apply_movements()
+
+    store = PackStore(pack_path(engine.db.usb_path))
+    with engine.db.get_db_connection(engine.db.pc_path) as conn:
+        master = {m["rel_path"]: m["init_hash"] for m in engine.db.read_states(conn)}
+    assert "notas/cero.txt" in master
+    assert all(store.contains(master[f"notas/{n}.txt"]) for n in ("cero", 1, 2, 3, 4))
+    store.close()
+
+
+def _packed_hashes(engine):
+    with engine.db.get_db_connection(engine.db.pc_path) as conn:
+        return {m["rel_path"]: m["init_hash"] for m in engine.db.read_states(conn)}
+
+
+def test_pack_keeps_files_of_other_machines(tmp_path):
+    usb = tmp_path / "usb"
+    usb.mkdir()
+    pc_a = tmp_path / "pc_a"
+    pc_b = tmp_path / "pc_b"
+    pc_a.mkdir()
+    pc_b.mkdir()
+    (pc_a / "fromA.txt").write_text("de A")
+    (pc_b / "fromB.txt").write_text("de B")
+
+    engine_a = EngineSync(pc_a, usb, "test.db", pack_threshold=4096)
+    engine_a.replicate_master()
+    engine_a.apply_movements()
+
+    # B no tiene fromA.txt en su maestro: eso no lo autoriza a borrar el BLOB de A
+    engine_b = EngineSync(pc_b, usb, "test.db", pack_threshold=4096)
+    engine_b.replicate_master()
+    engine_b.apply_movements()
+
+    store = PackStore(pack_path(engine_b.db.usb_path))
+    assert store.contains(_packed_hashes(engine_a)["fromA.txt"])
+    assert store.contains(_packed_hashes(engine_b)["fromB.txt"])
+    store.close()
+
+
+def test_phase3_folder_delete_discards_its_packed_files(tmp_path):
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    (pc / "notas").mkdir(parents=True)
+    usb.mkdir()
+    for i in range(3):
+        (pc / "notas" / f"{i}.txt").write_text(f"nota {i}")
+    (pc / "queda.txt").write_text("queda")
+
+    engine = EngineSync(pc, usb, "test.db", pack_threshold=4096)
+    engine.replicate_master()
+    engine.apply_movements()
+    hashes = _packed_hashes(engine)
+
+    for i in range(3):
+        (pc / "notas" / f"{i}.txt").unlink()
+    (pc / "notas").rmdir()
+    engine = EngineSync(pc, usb, "test.db", pack_threshold=4096)
+    engine.replicate_master()
+    engine.get_movements()
+    engine.apply_movements()
+
+    assert engine.stats["pack_discarded"] == 3
+    store = PackStore(pack_path(engine.db.usb_path))
+    assert not any(store.contains(hashes[f"notas/{i}.txt"]) for i in range(3))
+    assert store.contains(hashes["queda.txt"])
+    store.close()
@@ -1,3 +1,4 @@
+import time
 from unittest.mock import MagicMock, patch
 from sync.engine import EngineSync
 
@@ -25,3 +26,179 @@ def test_phase1_copy_from_usb(tmp_path):
         engine.replicate_master()
 
     copy_mock.assert_called_once()
+
+
+def test_phase1_tombstones_are_merged_acked_and_read_incrementally(tmp_path):
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    pc.mkdir()
+    usb.mkdir()
+    (usb / "a.txt").write_bytes(b"aaa")
+    (pc / "a.txt").write_bytes(b"aaa")
+    (pc / "b.txt").write_bytes(b"bbb")
+
+    deleted_at = int(time.time()) - 60
+    engine = EngineSync(pc, usb, "test.db")
+    row_a = ("h1", "a.txt", "c1", 3, 10, "otra")
+    with engine.db.get_db_connection(engine.db.usb_path) as conn:
+        conn.execute("INSERT INTO master_states VALUES (?, ?, ?, ?, ?, ?)", row_a)
+        conn.execute("INSERT INTO tombstones (init_hash, content_hash, deleted_at, machine_name) VALUES (?, ?, ?, ?)", ("h2", "c2", deleted_at, "otra"))
+        conn.commit()
+    with engine.db.get_db_connection(engine.db.pc_path) as conn:
+        conn.execute("INSERT INTO master_states VALUES (?, ?, ?, ?, ?, ?)", row_a)
+        conn.execute(
+            "INSERT INTO master_states VALUES (?, ?, ?, ?, ?, ?)",
+            ("h2", "b.txt", "c2", 3, 10, "otra"),
+        )
+        conn.commit()
+
+    engine.replicate_master()
+
+    # El tombstone borró b.txt en la PC y quedó guardado allí
+    assert not (pc / "b.txt").exists()
+    with engine.db.get_db_connection(engine.db.pc_path) as conn:
+        assert [t["init_hash"] for t in engine.db.read_tombstones(conn)] == ["h2"]
+        assert int(engine.db.get_meta(conn, EngineSync.TOMBSTONES_SEEN_KEY)) == 1
+
+    # El USB registra la confirmación y, al ser la única máquina, lo compacta
+    with engine.db.get_db_connection(engine.db.usb_path) as conn:
+        ack = conn.execute("SELECT last_seen FROM tombstone_acks").fetchone()
+        assert ack["last_seen"] == 1
+        assert engine.db.read_tombstones(conn) == []
+
+    # La siguiente ejecución solo pide tombstones nuevos
+    read_spy = MagicMock(wraps=engine.db.read_tombstones)
+    engine.db.read_tombstones = read_spy
+    engine.replicate_master()
+    assert read_spy.call_args.kwargs["since"] == 1
+
+
+def test_tombstone_is_kept_until_every_known_machine_acked(tmp_path):
+    usb = tmp_path / "usb"
+    usb.mkdir()
+    (usb / "a.txt").write_bytes(b"aaa")
+    row_a = ("h1", "a.txt", "c1", 3, 10, "pc-a")
+
+    def machine(name):
+        pc = tmp_path / name
+        pc.mkdir(exist_ok=True)
+        engine = EngineSync(pc, usb, "test.db")
+        engine.machine_name = name
+        return engine
+
+    b = machine("pc-b")
+    with b.db.get_db_connection(b.db.usb_path) as conn:
+        conn.execute("INSERT INTO master_states VALUES (?, ?, ?, ?, ?, ?)", row_a)
+        conn.commit()
+
+    # B sincroniza cuando todavía no hay tombstones: queda registrada igual
+    b.replicate_master()
+    assert (tmp_path / "pc-b" / "a.txt").exists()
+
+    # A borra a.txt (su tombstone llega al USB) y lo confirma
+    deleted_at = int(time.time()) - 60
+    with b.db.get_db_connection(b.db.usb_path) as conn:
+        conn.execute("DELETE FROM master_states")
+        conn.execute("INSERT INTO master_states VALUES (?, ?, ?, ?, ?, ?)", ("h9", "otro.txt", "c9", 3, 10, "pc-a"))
+        conn.execute("INSERT INTO tombstones (init_hash, content_hash, deleted_at, machine_name) VALUES (?, ?, ?, ?)", ("h1", "c1", deleted_at, "pc-a"))
+        conn.commit()
+    (usb / "otro.txt").write_bytes(b"zzz")
+    machine("pc-a").replicate_master()
+
+    # Solo A confirmó: el tombstone sigue en el USB para B
+    with b.db.get_db_connection(b.db.usb_path) as conn:
+        acks = dict(conn.execute("SELECT machine_name, last_seen FROM tombstone_acks").fetchall())
+        assert acks == {"pc-a": 1, "pc-b": 0}
+        assert [t["init_hash"] for t in b.db.read_tombstones(conn)] == ["h1"]
+
+    b = machine("pc-b")
+    b.replicate_master()
+
+    assert not (tmp_path / "pc-b" / "a.txt").exists()
+    with b.db.get_db_connection(b.db.usb_path) as conn:
+        assert b.db.read_tombstones(conn) == []
+
+
+def test_late_tombstone_with_old_deleted_at_is_not_skipped(tmp_path):
+    usb = tmp_path / "usb"
+    usb.mkdir()
+    for name in ("a.txt", "b.txt"):
+        (usb / name).write_bytes(b"xyz")
+    insert = "INSERT INTO tombstones (init_hash, content_hash, deleted_at, machine_name) VALUES (?, ?, ?, ?)"
+    now = int(time.time())
+
+    def machine(name):
+        pc = tmp_path / name
+        pc.mkdir(exist_ok=True)
+        engine = EngineSync(pc, usb, "test.db")
+        engine.machine_name = name
+        return engine
+
+    a = machine("pc-a")
+    with a.db.get_db_connection(a.db.usb_path) as conn:
+        for i, name in enumerate(("a.txt", "b.txt")):
+            conn.execute(
+                "INSERT INTO master_states VALUES (?, ?, ?, ?, ?, ?)",
+                (f"h{i}", name, f"c{i}", 3, 10, "pc-c"),
+            )
+        conn.execute(insert, ("h9", "c9", now - 60, "pc-c"))
+        conn.commit()
+    a.replicate_master()
+    b = machine("pc-b")
+    b.replicate_master()
+    assert (tmp_path / "pc-b" / "b.txt").exists()
+
+    # Llega al USB el borrado de b.txt de una máquina con el reloj atrasado:
+    # su deleted_at es anterior a todo lo que A y B ya procesaron
+    with a.db.get_db_connection(a.db.usb_path) as conn:
+        conn.execute("DELETE FROM master_states WHERE rel_path = 'b.txt'")
+        conn.execute(insert, ("h1", "c1", now - 3600, "pc-c"))
+        conn.commit()
+
+    b = machine("pc-b")
+    b.replicate_master()
+
+    assert not (tmp_path / "pc-b" / "b.txt").exists()
+    with b.db.get_db_connection(b.db.pc_path) as conn:
+        assert "h1" in {t["init_hash"] for t in b.db.read_tombstones(conn)}
+    # A todavía no lo procesó: sigue en el USB
+    with a.db.get_db_connection(a.db.usb_path) as conn:
+        assert [t["init_hash"] for t in a.db.read_tombstones(conn)] == ["h1"]
+
+
+def test_reconcile_adopts_identical_pc_files_after_losing_pc_db(tmp_path):
+    import hashlib
+
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    pc.mkdir()
+    usb.mkdir()
+    contents = {"a.txt": b"igual", "b.txt": b"tambien igual", "c.txt": b"en el usb"}
+    engine = EngineSync(pc, usb, "test.db")
+    with engine.db.get_db_connection(engine.db.usb_path) as conn:
+        for rel, data in contents.items():
+            (usb / rel).write_bytes(data)
+            digest = hashlib.sha256(data).hexdigest()
+            conn.execute(
+                "INSERT INTO master_states VALUES (?, ?, ?, ?, ?, ?)",
+                (f"i-{rel}", rel, digest, len(data), 1_700_000_000_000_000_000, "otra"),
+            )
+        conn.commit()
+
+    # La PC perdió su DB pero conserva a y b; c difiere con el mismo tamaño
+    (pc / "a.txt").write_bytes(b"igual")
+    (pc / "b.txt").write_bytes(b"tambien igual")
+    (pc / "c.txt").write_bytes(b"EN EL USB")
+
+    engine = EngineSync(pc, usb, "test.db", reconcile=True)
+    from sync.fs_util import FSOps
+
+    with patch("sync.engine.FSOps.copy_file", side_effect=FSOps.copy_file) as copy_mock:
+        engine.replicate_master()
+
+    assert [c.args[0].name for c in copy_mock.call_args_list] == ["c.txt"]
+    assert (pc / "c.txt").read_bytes() == b"en el usb"
+    assert engine.stats["adopted_files"] == 2
+    # El mtime queda el del maestro: la FASE 2 no los vuelve a hashear
+    assert (pc / "a.txt").stat().st_mtime_ns == 1_700_000_000_000_000_000
+    assert len(engine._read_pc_master()) == 3
@@ -1,5 +1,7 @@
+from hashlib import sha256
 from unittest.mock import MagicMock, patch
 from sync.engine import EngineSync
+from sync.pipeline import Phase2Pipeline
 
 
 def test_phase2_detect_create(tmp_path):
@@ -20,3 +22,58 @@ def test_phase2_detect_create(tmp_path):
 
     upsert_mock.assert_called_once()
     assert upsert_mock.call_args[0][1]["op_type"] == "CREATE"
+
+
+def _staged_movements(engine):
+    with engine.db.get_db_connection(engine.db.temp_path) as conn:
+        rows = engine.db.read_movements(conn)
+        conn.execute("DELETE FROM movements")
+        conn.commit()
+    return sorted(
+        (m["op_type"], m["init_hash"], m["rel_path"], m["new_rel_path"], m["content_hash"])
+        for m in rows
+    )
+
+
+def test_phase2_pipeline_matches_serial_scan(tmp_path):
+    pc = tmp_path / "pc"
+    (pc / "docs" / "sub").mkdir(parents=True)
+    (pc / ".oculto").mkdir()
+    (pc / "igual.txt").write_bytes(b"igual")
+    (pc / "docs" / "cambiado.txt").write_bytes(b"contenido nuevo")
+    (pc / "docs" / "sub" / "movido.txt").write_bytes(b"movido")
+    for i in range(20):
+        (pc / "docs" / f"nuevo{i}.txt").write_bytes(f"nuevo {i}".encode())
+    # Mismo contenido que otro nuevo: su init_hash depende del orden del escaneo
+    (pc / "docs" / "copia.txt").write_bytes(b"nuevo 1")
+    (pc / ".oculto" / "x.txt").write_bytes(b"x")
+
+    def state(init_hash, rel_path, data):
+        return (init_hash, rel_path, sha256(data).hexdigest(), len(data), 10, "otra")
+
+    igual = pc / "igual.txt"
+    master = [
+        (*state("h1", "igual.txt", b"igual")[:4], igual.stat().st_mtime_ns, "otra"),
+        state("h2", "docs/cambiado.txt", b"viejo"),
+        state("h3", "antes/movido.txt", b"movido"),
+        state("h4", "borrado.txt", b"borrado"),
+    ]
+    serial = EngineSync(pc, tmp_path / "usb", "test.db")
+    with serial.db.get_db_connection(serial.db.pc_path) as conn:
+        conn.executemany("INSERT INTO master_states VALUES (?, ?, ?, ?, ?, ?)", master)
+        conn.commit()
+
+    serial.get_movements()
+    expected = _staged_movements(serial)
+
+    piped = EngineSync(pc, tmp_path / "usb", "test.db", pipeline=True)
+    piped.get_movements()
+    assert _staged_movements(piped) == expected
+
+    # Colas mínimas: la contrapresión no cambia el resultado
+    with piped.db.get_db_connection(piped.db.pc_path) as conn:
+        master_rows = piped.db.read_states(conn)
+    assert Phase2Pipeline(piped, hashers=3, queue_size=1).run(master_rows) == len(expected)
+    assert _staged_movements(piped) == expected
+    assert {m[0] for m in expected} == {"CREATE", "MODIFY", "MOVE", "DELETE"}
+    assert all(not m[2].startswith(".") for m in expected)
@@ -6,18 +6,19 @@ def test_phase3_apply_modify(tmp_path):
     engine = EngineSync(tmp_path, tmp_path, "test.db")
 
     mov = {
+        "id": 1,
         "op_type": "MODIFY",
         "rel_path": "file.txt",
         "init_hash": "abc",
     }
 
-    engine.db.read_movements = MagicMock(return_value=[mov])
+    engine.db.iter_movements = MagicMock(return_value=iter([mov]))
     engine.db.read_states = MagicMock(return_value=[{"rel_path": "file.txt"}])
     engine.db.table_is_empty = MagicMock(return_value=False)
 
     # Mock DB writes
     engine.db.update_state = MagicMock()
-    engine.db.archive_and_delete_movement = MagicMock()
+    engine.db.archive_movements = MagicMock()
 
     with (
         patch("sync.engine.FSOps.copy_file") as copy_mock,
@@ -27,4 +28,234 @@ def test_phase3_apply_modify(tmp_path):
 
     copy_mock.assert_called_once()
     engine.db.update_state.assert_called_once()
-    engine.db.archive_and_delete_movement.assert_called_once()
+    engine.db.archive_movements.assert_called_once()
+    assert engine.db.archive_movements.call_args.args[1] == [1]
+
+
+def test_phase3_resumes_from_committed_batches(tmp_path):
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    pc.mkdir()
+    usb.mkdir()
+    for i in range(5):
+        (pc / f"f{i}.txt").write_bytes(f"contenido {i}".encode())
+
+    engine = EngineSync(pc, usb, "test.db", batch_size=2)
+    engine.replicate_master()  # sin maestros: genera CREATE en la DB de PC
+
+    from sync.fs_util import FSOps
+
+    real_copy = FSOps.copy_file
+    calls = {"n": 0}
+
+    def copy_then_die(src, dst):
+        calls["n"] += 1
+        if calls["n"] == 4:
+            raise KeyboardInterrupt  # simula un corte (USB retirado, kill)
+        real_copy(src, dst)
+
+    with patch("sync.engine.FSOps.copy_file", side_effect=copy_then_die):
+        try:
+            engine.apply_movements()
+        except KeyboardInterrupt:
+            pass
+
+    with engine.db.get_db_connection(engine.db.pc_path) as conn:
+        # Solo el primer lote (2 movimientos) quedó confirmado
+        assert len(engine.db.read_movements(conn)) == 3
+        checkpoint = engine.db.read_checkpoint(conn, EngineSync.CHECKPOINT_NAME)
+        assert checkpoint["applied"] == 2
+
+    with patch("sync.engine.FSOps.copy_file", side_effect=real_copy) as copy_mock:
+        engine.apply_movements()
+
+    # La reanudación solo copia lo pendiente
+    assert copy_mock.call_count == 3
+    assert sorted(p.name for p in usb.glob("f*.txt")) == [f"f{i}.txt" for i in range(5)]
+    with engine.db.get_db_connection(engine.db.pc_path) as conn:
+        assert engine.db.table_is_empty(conn, "movements")
+        assert engine.db.read_checkpoint(conn, EngineSync.CHECKPOINT_NAME) is None
+
+
+def test_phase3_dedup_clones_existing_content_on_usb(tmp_path):
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    (pc / "copias").mkdir(parents=True)
+    usb.mkdir()
+    content = b"mismo contenido " * 100
+    (pc / "a.txt").write_bytes(content)
+    (pc / "copias" / "b.txt").write_bytes(content)
+    (pc / "copias" / "c.txt").write_bytes(content)
+    (pc / "otro.txt").write_bytes(b"distinto")
+
+    engine = EngineSync(pc, usb, "test.db", dedup=True)
+    engine.replicate_master()
+
+    from sync.fs_util import FSOps
+
+    with patch("sync.engine.FSOps.copy_file", side_effect=FSOps.copy_file) as copy_mock:
+        engine.apply_movements()
+
+    # Desde la PC solo viajan el primer ejemplar y el archivo distinto
+    copied_from_pc = [c.args[0] for c in copy_mock.call_args_list if pc in c.args[0].parents]
+    assert len(copied_from_pc) == 2
+    assert engine.stats["dedup_files"] == 2
+    assert engine.stats["dedup_bytes"] == 2 * len(content)
+    for rel in ("a.txt", "copias/b.txt", "copias/c.txt"):
+        assert (usb / rel).read_bytes() == content
+
+
+def test_folder_rename_and_delete_are_single_operations(tmp_path):
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    (pc / "docs" / "sub").mkdir(parents=True)
+    (pc / "tmp").mkdir()
+    usb.mkdir()
+    for rel in ("docs/a.txt", "docs/b.txt", "docs/sub/c.txt", "tmp/1.log", "tmp/2.log"):
+        (pc / rel).write_text(rel)
+
+    engine = EngineSync(pc, usb, "test.db")
+    engine.replicate_master()
+    engine.apply_movements()
+
+    (pc / "docs").rename(pc / "papers")
+    import shutil
+
+    shutil.rmtree(pc / "tmp")
+
+    engine = EngineSync(pc, usb, "test.db")
+    engine.replicate_master()
+    engine.get_movements()
+    with engine.db.get_db_connection(engine.db.temp_path) as conn:
+        ops = sorted((m["op_type"], m["rel_path"]) for m in engine.db.read_movements(conn))
+    assert ops == [("DELETE", "tmp/"), ("MOVE", "docs/")]
+
+    engine.apply_movements()
+
+    assert sorted(p.relative_to(usb).as_posix() for p in usb.rglob("*.*") if p.suffix != ".db") == [
+        "papers/a.txt",
+        "papers/b.txt",
+        "papers/sub/c.txt",
+    ]
+    with engine.db.get_db_connection(engine.db.pc_path) as conn:
+        assert sorted(m["rel_path"] for m in engine.db.read_states(conn)) == [
+            "papers/a.txt",
+            "papers/b.txt",
+            "papers/sub/c.txt",
+        ]
+        assert len(engine.db.read_tombstones(conn)) == 2
+
+
+def test_dedup_does_not_clone_from_a_source_moved_in_the_same_run(tmp_path):
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    pc.mkdir()
+    usb.mkdir()
+    content = b"contenido compartido " * 50
+    (pc / "a.txt").write_bytes(content)
+
+    engine = EngineSync(pc, usb, "test.db", dedup=True)
+    engine.replicate_master()
+    engine.apply_movements()
+
+    # a.txt se renombra y aparece otro archivo con el mismo contenido: uno es
+    # MOVE y el otro CREATE, que no puede clonarse de a.txt si el MOVE va antes
+    (pc / "a.txt").rename(pc / "z.txt")
+    (pc / "b.txt").write_bytes(content)
+
+    engine = EngineSync(pc, usb, "test.db", dedup=True)
+    engine.replicate_master()
+    engine.get_movements()
+    engine.apply_movements()
+
+    assert not (usb / "a.txt").exists()
+    assert (usb / "z.txt").read_bytes() == content
+    assert (usb / "b.txt").read_bytes() == content
+    with engine.db.get_db_connection(engine.db.pc_path) as conn:
+        assert engine.db.table_is_empty(conn, "movements")
+        assert sorted(m["rel_path"] for m in engine.db.read_states(conn)) == ["b.txt", "z.txt"]
+
+
+def _freed_path_scenario(tmp_path, workers):
+    pc = tmp_path / f"pc{workers}"
+    usb = tmp_path / f"usb{workers}"
+    pc.mkdir()
+    usb.mkdir()
+    for i in range(3):
+        (pc / f"f{i}.txt").write_text(f"viejo {i}")
+
+    engine = EngineSync(pc, usb, "test.db")
+    engine.replicate_master()
+    engine.apply_movements()
+
+    # En la PC: f0 se renombró a g0 y se creó un f0 nuevo, más archivos sueltos
+    (pc / "f0.txt").rename(pc / "g0.txt")
+    (pc / "f0.txt").write_text("nuevo")
+    for i in range(6):
+        (pc / "n" / f"{i}.txt").parent.mkdir(exist_ok=True)
+        (pc / "n" / f"{i}.txt").write_text(f"n {i}")
+
+    engine = EngineSync(pc, usb, "test.db", workers=workers)
+    engine.replicate_master()
+    with engine.db.get_db_connection(engine.db.pc_path) as conn:
+        old = next(m for m in engine.db.read_states(conn) if m["rel_path"] == "f0.txt")
+    with engine.db.get_db_connection(engine.db.temp_path) as conn:
+        base = {"content_hash": "c", "size_bytes": 5, "last_op_time": 1, "machine_name": "pc1"}
+        movs = [
+            {**base, "op_type": "MOVE", "init_hash": old["init_hash"], "rel_path": "f0.txt", "new_rel_path": "g0.txt"},
+            {**base, "op_type": "CREATE", "init_hash": "nuevo", "rel_path": "f0.txt", "new_rel_path": None},
+        ]
+        movs += [
+            {**base, "op_type": "CREATE", "init_hash": f"n{i}", "rel_path": f"n/{i}.txt", "new_rel_path": None}
+            for i in range(6)
+        ]
+        # El CREATE de f0 depende del MOVE que libera la ruta: van en olas distintas
+        for i, mov in enumerate(movs, start=1):
+            engine.db.upsert_movement(conn, {**mov, "id": i})
+        conn.commit()
+
+    engine.apply_movements()
+
+    files = sorted((p.relative_to(usb).as_posix(), p.read_text()) for p in usb.rglob("*.txt"))
+    with engine.db.get_db_connection(engine.db.pc_path) as conn:
+        master = sorted((m["rel_path"], m["init_hash"]) for m in engine.db.read_states(conn))
+    return files, master
+
+
+def test_create_on_path_freed_by_move_and_parallel_matches_serial(tmp_path):
+    serial = _freed_path_scenario(tmp_path, workers=1)
+    parallel = _freed_path_scenario(tmp_path, workers=4)
+
+    files, master = serial
+    assert ("f0.txt", "nuevo") in files
+    assert ("g0.txt", "viejo 0") in files
+    assert ("f0.txt", "nuevo") in master
+    assert len(files) == 10
+    assert parallel == serial
+
+
+def test_reconcile_initialize_skips_files_already_on_usb(tmp_path):
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    pc.mkdir()
+    usb.mkdir()
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (pc / name).write_text(f"contenido {name}")
+    # Restos de un USB cuya DB se perdió: a igual, b distinto, c falta
+    (usb / "a.txt").write_text("contenido a.txt")
+    (usb / "b.txt").write_text("CONTENIDO b.txt")
+
+    engine = EngineSync(pc, usb, "test.db", reconcile=True)
+    engine.replicate_master()
+
+    from sync.fs_util import FSOps
+
+    with patch("sync.engine.FSOps.copy_file", side_effect=FSOps.copy_file) as copy_mock:
+        engine.apply_movements()
+
+    assert sorted(c.args[0].name for c in copy_mock.call_args_list) == ["b.txt", "c.txt"]
+    assert engine.stats["adopted_files"] == 1
+    for name in ("a.txt", "b.txt", "c.txt"):
+        assert (usb / name).read_bytes() == (pc / name).read_bytes()
+    with engine.db.get_db_connection(engine.db.pc_path) as conn:
+        assert len(engine.db.read_states(conn)) == 3
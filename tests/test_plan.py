@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from sync.dry_run import dry_run
+from sync.engine import EngineSync
+from sync.meta_util import sha256_file
+from sync.plan import MODE_SYNC, StalePlanError, SyncPlan
+
+
+@pytest.fixture
+def synced(tmp_path):
+    """PC y USB ya sincronizados con dos archivos, maestro en ambas DB."""
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    pc.mkdir()
+    usb.mkdir()
+    for name, content in (("a.txt", b"aaaa"), ("b.txt", b"bbbb")):
+        (pc / name).write_bytes(content)
+        (usb / name).write_bytes(content)
+
+    engine = EngineSync(pc, usb, "test.db")
+    for path in (engine.db.usb_path, engine.db.pc_path):
+        with engine.db.get_db_connection(path) as conn:
+            for name in ("a.txt", "b.txt"):
+                st = (pc / name).stat()
+                h = sha256_file(pc / name)
+                conn.execute(
+                    "INSERT INTO master_states VALUES (?, ?, ?, ?, ?, ?)",
+                    (h, name, h, st.st_size, st.st_mtime, "pc1"),
+                )
+            conn.commit()
+    return engine
+
+
+def _touch_later(path, content):
+    st = path.stat()
+    path.write_bytes(content)
+    os.utime(path, (st.st_atime + 100, st.st_mtime + 100))
+
+
+def test_plan_detects_modify_by_hash_and_serializes(synced, tmp_path):
+    engine = synced
+    _touch_later(engine.pc_root / "a.txt", b"AAAA")  # mismo tamaño
+    (engine.pc_root / "c.txt").write_bytes(b"nuevo")
+
+    plan = engine.plan()
+
+    assert plan.mode == MODE_SYNC
+    ops = sorted((m["op_type"], m["rel_path"]) for m in plan.movements)
+    assert ops == [("CREATE", "c.txt"), ("MODIFY", "a.txt")]
+    modify = next(m for m in plan.movements if m["op_type"] == "MODIFY")
+    assert modify["content_hash"] == sha256_file(engine.pc_root / "a.txt")
+    assert plan.summary()["bytes_pc_to_usb"] == 4 + 5
+
+    path = tmp_path / "plan.json"
+    plan.save(path)
+    assert SyncPlan.load(path).to_dict() == plan.to_dict()
+
+
+def test_apply_runs_plan_without_rehashing(synced, monkeypatch):
+    engine = synced
+    _touch_later(engine.pc_root / "a.txt", b"AAAA")
+    (engine.pc_root / "c.txt").write_bytes(b"nuevo")
+
+    plan = engine.plan()
+
+    def no_hash(path):
+        raise AssertionError(f"apply no debería hashear: {path}")
+
+    monkeypatch.setattr("sync.engine.sha256_file", no_hash)
+    engine.apply(plan)
+
+    assert (engine.usb_root / "a.txt").read_bytes() == b"AAAA"
+    assert (engine.usb_root / "c.txt").read_bytes() == b"nuevo"
+
+
+def test_apply_rejects_stale_plan(synced):
+    engine = synced
+    plan = engine.plan()
+
+    (engine.pc_root / "late.txt").write_bytes(b"creado despues del plan")
+
+    with pytest.raises(StalePlanError):
+        engine.apply(plan)
+
+
+def test_dry_run_renders_plan_modify(synced):
+    engine = synced
+    _touch_later(engine.pc_root / "b.txt", b"BBBB")
+
+    stats = dry_run(engine, lambda *_: None)
+
+    assert stats["modify_local"] == 1
+    assert stats["modify_usb"] == 1
+    assert (engine.usb_root / "b.txt").read_bytes() == b"bbbb"
@@ -0,0 +1,110 @@
+import hashlib
+import sqlite3
+import tracemalloc
+
+import pytest
+
+from sync.database import DB
+from sync.records import MovementRecord, StateRecord, TombstoneRecord
+
+
+@pytest.fixture
+def db(tmp_path):
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    pc.mkdir()
+    usb.mkdir()
+    return DB(pc_root=pc, usb_root=usb, db_name="test.db")
+
+
+@pytest.fixture
+def conn(db):
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    db.create_schema(conn)
+    yield conn
+    conn.close()
+
+
+def _fill_states(conn, n):
+    rows = []
+    for i in range(n):
+        h = hashlib.sha256(str(i).encode()).hexdigest()
+        rows.append((h, f"dir{i % 50}/file_{i}.txt", h, i, 1_700_000_000 + i, "pc1"))
+    conn.executemany("INSERT INTO master_states VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+
+def test_state_record_keeps_key_access():
+    rec = StateRecord("h1", "a.txt", "h1", 10, 100, "pc1")
+
+    assert rec["rel_path"] == "a.txt"
+    assert rec.get("size_bytes") == 10
+    assert rec.get("no_existe", "x") == "x"
+    assert dict(rec) == {
+        "init_hash": "h1",
+        "rel_path": "a.txt",
+        "content_hash": "h1",
+        "size_bytes": 10,
+        "last_op_time": 100,
+        "machine_name": "pc1",
+    }
+    with pytest.raises(KeyError):
+        rec["no_existe"]
+    with pytest.raises(AttributeError):
+        rec.extra = 1  # __slots__: sin __dict__ por instancia
+
+
+def test_read_functions_return_records(db, conn):
+    _fill_states(conn, 3)
+    conn.execute(
+        "INSERT INTO tombstones (init_hash, content_hash, deleted_at, machine_name) VALUES (?, ?, ?, ?)", ("t1", "c1", 100, "pc1")
+    )
+    db.upsert_movement(
+        conn,
+        {
+            "op_type": "CREATE",
+            "init_hash": "h1",
+            "rel_path": "a.txt",
+            "new_rel_path": None,
+            "content_hash": "c1",
+            "size_bytes": 10,
+            "last_op_time": 100,
+            "machine_name": "pc1",
+        },
+    )
+
+    states = db.read_states(conn)
+    movements = db.read_movements(conn)
+    tombstones = db.read_tombstones(conn)
+
+    assert all(isinstance(s, StateRecord) for s in states)
+    assert isinstance(movements[0], MovementRecord)
+    assert movements[0]["op_type"] == "CREATE"
+    assert "id" in movements[0]
+    assert isinstance(tombstones[0], TombstoneRecord)
+    assert tombstones[0]["init_hash"] == "t1"
+
+    # Archivar acepta el record directamente
+    db.archive_and_delete_movement(conn, movements[0])
+    assert db.table_is_empty(conn, "movements")
+
+
+def test_records_use_much_less_memory_than_dicts(db, conn):
+    n = 20_000
+    _fill_states(conn, n)
+
+    def peak(build):
+        tracemalloc.start()
+        rows = build()
+        index = {r["rel_path"]: r for r in rows}
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del rows, index
+        return peak_bytes
+
+    dict_peak = peak(
+        lambda: [dict(r) for r in conn.execute("SELECT * FROM master_states")]
+    )
+    record_peak = peak(lambda: db.read_states(conn))
+
+    assert dict_peak / record_peak >= 1.5
@@ -0,0 +1,126 @@
+from sync.scheduler import IOScheduler
+
+
+def mov(op_type, rel_path, new_rel_path=None, size=10, init_hash=None):
+    return {
+        "op_type": op_type,
+        "init_hash": init_hash or f"h-{op_type}-{rel_path}",
+        "rel_path": rel_path,
+        "new_rel_path": new_rel_path,
+        "size_bytes": size,
+    }
+
+
+def test_order_groups_by_directory_and_size_class():
+    ops = [
+        mov("CREATE", "b/1.txt"),
+        mov("CREATE", "a/big.iso", size=10 * 1024 * 1024),
+        mov("CREATE", "a/1.txt"),
+        mov("DELETE", "c/old.txt"),
+        mov("CREATE", "b/2.txt"),
+        mov("CREATE", "a/2.txt"),
+    ]
+
+    ordered = [m["rel_path"] for m in IOScheduler().order(ops)]
+
+    assert ordered == ["c/old.txt", "a/1.txt", "a/2.txt", "b/1.txt", "b/2.txt", "a/big.iso"]
+
+
+def test_order_keeps_dependencies_on_the_same_path():
+    ops = [
+        mov("MOVE", "z/x.txt", new_rel_path="z/y.txt", init_hash="h1"),
+        mov("CREATE", "a/x.txt", init_hash="h2"),
+        # Reutiliza la ruta liberada por el MOVE: debe ir después
+        mov("CREATE", "z/x.txt", init_hash="h3"),
+        mov("MODIFY", "z/y.txt", init_hash="h1"),
+        mov("DELETE", "a/x.txt", init_hash="h2"),
+    ]
+
+    ordered = IOScheduler().order(ops)
+    pos = {(m["op_type"], m["rel_path"]): i for i, m in enumerate(ordered)}
+
+    assert pos[("MOVE", "z/x.txt")] < pos[("CREATE", "z/x.txt")]
+    assert pos[("MOVE", "z/x.txt")] < pos[("MODIFY", "z/y.txt")]
+    assert pos[("CREATE", "a/x.txt")] < pos[("DELETE", "a/x.txt")]
+    assert len(ordered) == len(ops)
+
+
+def test_order_uses_source_inode_within_a_directory(tmp_path):
+    (tmp_path / "d").mkdir()
+    names = ["c.txt", "a.txt", "b.txt"]
+    for name in names:
+        (tmp_path / "d" / name).write_bytes(b"x")
+    by_inode = sorted(names, key=lambda n: (tmp_path / "d" / n).stat().st_ino)
+
+    ops = [mov("CREATE", f"d/{n}") for n in sorted(names)]
+    ordered = [m["rel_path"] for m in IOScheduler(tmp_path).order(ops)]
+
+    assert ordered == [f"d/{n}" for n in by_inode]
+
+
+def test_stream_reorders_only_within_windows():
+    ops = [mov("CREATE", f"{d}/{i}.txt") for i in range(3) for d in ("b", "a")]
+
+    ordered = [m["rel_path"] for m in IOScheduler().stream(ops, window=3)]
+
+    assert ordered[:3] == ["a/0.txt", "b/0.txt", "b/1.txt"]
+    assert sorted(ordered[3:]) == sorted(m["rel_path"] for m in ops[3:])
+
+
+def test_directory_operation_is_a_barrier():
+    ops = [
+        mov("CREATE", "z/1.txt"),
+        mov("MOVE", "docs/", new_rel_path="papers/"),
+        mov("CREATE", "a/1.txt"),
+        mov("CREATE", "papers/nuevo.txt"),
+    ]
+
+    ordered = [m["rel_path"] for m in IOScheduler().order(ops)]
+
+    assert ordered == ["z/1.txt", "docs/", "a/1.txt", "papers/nuevo.txt"]
+
+
+def test_waves_only_group_independent_operations():
+    ops = [
+        mov("MOVE", "a/x.txt", new_rel_path="a/y.txt", init_hash="h1"),
+        mov("CREATE", "b/1.txt", init_hash="h2"),
+        # Reusa la ruta que libera el MOVE
+        mov("CREATE", "a/x.txt", init_hash="h3"),
+        mov("DELETE", "b/1.txt", init_hash="h2"),
+        mov("CREATE", "c/1.txt", init_hash="h4"),
+    ]
+
+    waves = [[(m["op_type"], m["rel_path"]) for m in w] for w in IOScheduler().waves(ops)]
+
+    assert waves == [
+        [("MOVE", "a/x.txt"), ("CREATE", "b/1.txt"), ("CREATE", "c/1.txt")],
+        [("DELETE", "b/1.txt"), ("CREATE", "a/x.txt")],
+    ]
+
+
+def test_content_dependencies_serialize_same_content():
+    ops = [
+        {**mov("CREATE", "a.txt"), "content_hash": "c1"},
+        {**mov("CREATE", "b.txt"), "content_hash": "c1"},
+    ]
+
+    assert len(IOScheduler().waves(ops)) == 1
+    assert len(IOScheduler(content_dependencies=True).waves(ops)) == 2
+
+
+def test_file_replaced_by_folder_is_ordered_but_siblings_stay_parallel():
+    ops = [
+        mov("DELETE", "docs"),
+        mov("CREATE", "docs/a.txt"),
+        mov("CREATE", "docs/b.txt"),
+        # Al revés: la carpeta se vacía y en su lugar queda un archivo
+        mov("DELETE", "img/x.png"),
+        mov("CREATE", "img"),
+    ]
+
+    waves = [sorted(f"{m['op_type']}:{m['rel_path']}" for m in w) for w in IOScheduler().waves(ops)]
+
+    assert waves == [
+        ["DELETE:docs", "DELETE:img/x.png"],
+        ["CREATE:docs/a.txt", "CREATE:docs/b.txt", "CREATE:img"],
+    ]
@@ -0,0 +1,67 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# Presupuesto de tiempo (segundos) para una ejecución sin cambios completa,
+# incluyendo el arranque del intérprete. Holgado para máquinas de CI lentas.
+NO_CHANGE_BUDGET = 2.0
+
+HEAVY_MODULES = ("sqlite3", "hashlib", "shutil", "socket")
+
+
+def _run_sync(pc_root, usb_root, log_file):
+    return subprocess.run(
+        [
+            sys.executable,
+            str(ROOT / "run_sync.py"),
+            "--pc-root",
+            str(pc_root),
+            "--usb-root",
+            str(usb_root),
+            "--log",
+            str(log_file),
+        ],
+        capture_output=True,
+        text=True,
+    )
+
+
+def test_import_sync_main_defers_heavy_modules():
+    code = (
+        "import sys, sync, sync.main; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
+
+def test_launcher_runs_in_process_and_propagates_exit_code(tmp_path):
+    result = _run_sync(tmp_path / "no_existe", tmp_path, tmp_path / "sync.log")
+
+    assert result.returncode == 1
+
+
+def test_no_change_run_within_budget(tmp_path):
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    pc.mkdir()
+    usb.mkdir()
+    (pc / "a.txt").write_bytes(b"contenido")
+    log_file = tmp_path / "sync.log"
+
+    # Primera ejecución: inicializa y copia al USB
+    assert _run_sync(pc, usb, log_file).returncode == 0
+
+    start = time.perf_counter()
+    result = _run_sync(pc, usb, log_file)
+    elapsed = time.perf_counter() - start
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert elapsed < NO_CHANGE_BUDGET
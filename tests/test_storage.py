@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+from sync.storage import (
+    CODEC_BZ2,
+    CODEC_LZMA,
+    CODEC_ZLIB,
+    MAGIC,
+    UsbStorage,
+    choose_codec,
+    read_header,
+)
+
+
+def test_put_compresses_text_and_get_restores_it(tmp_path):
+    src = tmp_path / "pc" / "notas.csv"
+    src.parent.mkdir()
+    content = b"fecha,valor\n" + b"2026-01-01,123\n" * 5000
+    src.write_bytes(content)
+    os.utime(src, (1_700_000_000, 1_700_000_000))
+
+    usb = tmp_path / "usb" / "notas.csv"
+    saved = UsbStorage(compress=True).put(src, usb)
+
+    assert saved > 0
+    assert usb.read_bytes().startswith(MAGIC)
+    assert read_header(usb) == (CODEC_ZLIB, 6, len(content))
+
+    back = tmp_path / "pc2" / "notas.csv"
+    # La lectura detecta la cabecera aunque el modo no esté activado
+    UsbStorage().get(usb, back)
+
+    assert back.read_bytes() == content
+    assert int(back.stat().st_mtime) == 1_700_000_000
+
+
+@pytest.mark.parametrize(
+    "name, codec",
+    [("datos.json", CODEC_LZMA), ("icono.svg", CODEC_BZ2), ("otro.dat", CODEC_ZLIB)],
+)
+def test_codec_by_extension_roundtrip(tmp_path, name, codec):
+    src = tmp_path / name
+    content = b"<a>repetido</a>\n" * 2000
+    src.write_bytes(content)
+    usb = tmp_path / "usb" / name
+
+    UsbStorage(compress=True).put(src, usb)
+
+    assert read_header(usb)[0] == codec
+    back = tmp_path / "back" / name
+    UsbStorage().get(usb, back)
+    assert back.read_bytes() == content
+
+
+def test_incompressible_and_small_files_are_stored_plain(tmp_path):
+    random_file = tmp_path / "blob.bin"
+    random_file.write_bytes(os.urandom(200_000))
+    small = tmp_path / "small.txt"
+    small.write_bytes(b"hola")
+    already = tmp_path / "foto.jpg"
+    already.write_bytes(b"a" * 10_000)
+
+    assert choose_codec(random_file, random_file.stat().st_size) is None
+    assert choose_codec(small, small.stat().st_size) is None
+    assert choose_codec(already, already.stat().st_size) is None
+
+    usb = tmp_path / "usb" / "blob.bin"
+    assert UsbStorage(compress=True).put(random_file, usb) == 0
+    assert usb.read_bytes() == random_file.read_bytes()
+
+
+def test_compress_disabled_copies_plain(tmp_path):
+    src = tmp_path / "a.txt"
+    src.write_bytes(b"texto " * 1000)
+    usb = tmp_path / "usb" / "a.txt"
+
+    assert UsbStorage().put(src, usb) == 0
+    assert read_header(usb) is None
+    assert usb.read_bytes() == src.read_bytes()
+
+
+def test_clone_then_put_does_not_touch_the_other_path(tmp_path):
+    original = tmp_path / "usb" / "a.txt"
+    original.parent.mkdir()
+    original.write_bytes(b"compartido")
+    clone = tmp_path / "usb" / "b.txt"
+
+    storage = UsbStorage()
+    storage.clone(original, clone)
+    assert storage.holds_content(clone, len(b"compartido"))
+
+    # MODIFY de b.txt: si es un hardlink, se rompe antes de escribir
+    new = tmp_path / "nuevo.txt"
+    new.write_bytes(b"modificado")
+    storage.put(new, clone)
+
+    assert clone.read_bytes() == b"modificado"
+    assert original.read_bytes() == b"compartido"
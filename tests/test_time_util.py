@@ -0,0 +1,89 @@
+import os
+
+from sync.time_util import (
+    GRANULARITY_NS_BY_FSTYPE,
+    filesystem_type,
+    same_mtime,
+    to_ns,
+)
+
+
+def test_to_ns_normalizes_legacy_seconds():
+    assert to_ns(1_700_000_000) == 1_700_000_000 * 10**9
+    assert to_ns(1_700_000_000.5) == 1_700_000_000_500_000_000
+    assert to_ns(1_700_000_000_123_456_789) == 1_700_000_000_123_456_789
+    assert to_ns(None) is None
+
+
+def test_same_mtime_respects_granularity():
+    base = 1_700_000_000_000_000_000
+    # ext4: 1 ms de diferencia es un cambio real
+    assert not same_mtime(base, base + 1_000_000, 1)
+    assert same_mtime(base, base, 1)
+    # FAT: dentro de los 2 s de resolución es el mismo mtime
+    fat = GRANULARITY_NS_BY_FSTYPE["vfat"]
+    assert same_mtime(base, base + 1_999_999_999, fat)
+    assert not same_mtime(base, base + 2 * 10**9, fat)
+    # Fila antigua en segundos (float): tolera la pérdida de precisión del float
+    assert same_mtime(1_700_000_000.123456, 1_700_000_000_123_456_100, 1)
+
+
+def test_filesystem_type_uses_longest_mount_prefix():
+    mounts = [("/media/usb stick", "vfat"), ("/media", "ext4"), ("/", "xfs")]
+    mounts.sort(key=lambda m: len(m[0]), reverse=True)
+
+    assert filesystem_type("/media/usb stick/data", mounts) == "vfat"
+    assert filesystem_type("/media/usb sticker", mounts) == "ext4"
+    assert filesystem_type("/home", mounts) == "xfs"
+
+
+def test_phase2_detects_same_size_edit_within_two_seconds(tmp_path):
+    from sync.engine import EngineSync
+    from sync.meta_util import sha256_file, walk_directory_metadata
+
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"uno")
+    st = path.stat()
+    master = [
+        {
+            "init_hash": "h1",
+            "rel_path": "a.txt",
+            "content_hash": sha256_file(path),
+            "size_bytes": st.st_size,
+            "last_op_time": st.st_mtime_ns,
+            "machine_name": "pc1",
+        }
+    ]
+
+    engine = EngineSync(tmp_path, tmp_path, "test.db")
+    engine.mtime_granularity_ns = 1  # ext4/xfs
+
+    assert engine._plan_movements(walk_directory_metadata(tmp_path), master) == []
+
+    # Edición del mismo tamaño 1 ms después: antes quedaba oculta por la tolerancia de 2 s
+    path.write_bytes(b"dos")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+    movements = engine._plan_movements(walk_directory_metadata(tmp_path), master)
+    assert [m["op_type"] for m in movements] == ["MODIFY"]
+    assert movements[0]["last_op_time"] == st.st_mtime_ns + 1_000_000
+
+
+def test_phase1_copy_restores_full_precision_mtime(tmp_path):
+    from sync.engine import EngineSync
+    from sync.plan import COPY_TO_PC
+
+    pc, usb = tmp_path / "pc", tmp_path / "usb"
+    pc.mkdir()
+    usb.mkdir()
+    (usb / "a.txt").write_bytes(b"abc")
+    # En FAT el mtime del USB quedó redondeado; el maestro tiene el original
+    os.utime(usb / "a.txt", ns=(0, 1_700_000_000_000_000_000))
+    original_ns = 1_700_000_001_234_567_891
+
+    engine = EngineSync(pc, usb, "test.db")
+    engine._apply_replication_op(
+        {"op_type": COPY_TO_PC, "rel_path": "a.txt", "size_bytes": 3, "last_op_time": original_ns}
+    )
+
+    assert (pc / "a.txt").stat().st_mtime_ns == original_ns
@@ -0,0 +1,74 @@
+from sync.engine import EngineSync
+from sync.verify import SIDE_PC, SIDE_USB, Verifier
+
+
+def synced(tmp_path, n=6):
+    pc = tmp_path / "pc"
+    usb = tmp_path / "usb"
+    pc.mkdir()
+    usb.mkdir()
+    for i in range(n):
+        (pc / f"f{i}.txt").write_bytes(f"contenido {i}".encode() * 10)
+    engine = EngineSync(pc, usb, "test.db")
+    engine.replicate_master()
+    engine.apply_movements()
+    return pc, usb
+
+
+def test_budget_rotates_until_full_coverage(tmp_path):
+    pc, usb = synced(tmp_path)
+    size = (pc / "f0.txt").stat().st_size
+
+    for run in range(3):
+        verifier = Verifier(pc, usb, "test.db", workers=2, byte_budget=2 * size)
+        report = verifier.run(SIDE_USB)
+        assert report.checked == 2
+        assert report.stopped_by == "bytes"
+        assert report.never_verified == 6 - 2 * (run + 1)
+
+    # Sin presupuesto cubre todo en una corrida
+    report = Verifier(pc, usb, "test.db").run(SIDE_USB)
+    assert report.checked == 6
+    assert report.stopped_by is None
+
+    with verifier.db.get_db_connection(verifier.db.pc_path) as conn:
+        seen = {r["rel_path"] for r in conn.execute("SELECT rel_path FROM verify_state WHERE ok = 1")}
+    assert seen == {f"f{i}.txt" for i in range(6)}
+
+
+def test_usb_corruption_becomes_repair_movement(tmp_path):
+    pc, usb = synced(tmp_path, n=3)
+    (usb / "f1.txt").write_bytes(b"bit rot")
+    (usb / "f2.txt").unlink()
+
+    verifier = Verifier(pc, usb, "test.db")
+    report = verifier.run(SIDE_USB, repair=True)
+
+    assert sorted(m["rel_path"] for m in report.mismatches) == ["f1.txt", "f2.txt"]
+    assert [m["actual"] for m in report.mismatches if m["rel_path"] == "f2.txt"] == [None]
+    with verifier.db.get_db_connection(verifier.db.temp_path) as conn:
+        queued = sorted((m["op_type"], m["rel_path"]) for m in verifier.db.read_movements(conn))
+    assert queued == [("MODIFY", "f1.txt"), ("MODIFY", "f2.txt")]
+
+    engine = EngineSync(pc, usb, "test.db")
+    engine.apply_movements()
+    assert (usb / "f1.txt").read_bytes() == (pc / "f1.txt").read_bytes()
+    assert (usb / "f2.txt").read_bytes() == (pc / "f2.txt").read_bytes()
+
+
+def test_pc_side_reports_silent_corruption_but_not_pending_changes(tmp_path):
+    import os
+
+    pc, usb = synced(tmp_path, n=3)
+    # Mismo tamaño y mtime que el maestro, otro contenido
+    st = (pc / "f0.txt").stat()
+    (pc / "f0.txt").write_bytes(b"X" * st.st_size)
+    os.utime(pc / "f0.txt", ns=(st.st_atime_ns, st.st_mtime_ns))
+    # Cambio normal: lo detecta la FASE 2, no es corrupción
+    (pc / "f1.txt").write_bytes(b"editado")
+
+    report = Verifier(pc, usb, "test.db").run(SIDE_PC)
+
+    assert [m["rel_path"] for m in report.mismatches] == ["f0.txt"]
+    assert report.repairs == [{"op_type": "UPDATE_PC", "rel_path": "f0.txt"}]
+    assert report.changed == 1